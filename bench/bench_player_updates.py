@@ -0,0 +1,53 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+import argparse
+import time
+
+def measure(update_fps: int, seconds: float, tick_interval: int, idle: bool = False):
+  from widget.player import Player
+  player = Player(update_fps=update_fps)
+  player.show()
+  state = {"position": 0}
+
+  def tick():
+    # what a busy backend does: position and buffer reports every tick
+    state["position"] += tick_interval
+    if idle:
+      return
+    player.positionChanged(state["position"])
+    player.engine.bufferingProgress(state["position"] // tick_interval % 100)
+
+  timer = QtCore.QTimer()
+  timer.setTimerType(QtCore.Qt.PreciseTimer)
+  timer.setInterval(tick_interval)
+  timer.timeout.connect(tick)
+
+  loop = QtCore.QEventLoop()
+  QtCore.QTimer.singleShot(int(seconds * 1000), loop.quit)
+  cpu_begin = time.process_time()
+  timer.start()
+  loop.exec_()
+  timer.stop()
+  cpu = time.process_time() - cpu_begin
+  ticks = state["position"] // tick_interval
+  player.close()
+  player.deleteLater()
+  return cpu, ticks
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--seconds", type=float, default=5.0)
+  parser.add_argument("--tick-interval", type=int, default=1, help="ms between simulated reports")
+  args = parser.parse_args()
+
+  app = QtWidgets.QApplication([])
+  # idle only runs the timer, what the event loop costs with no updates
+  for label, fps, idle in (("idle", 30, True), ("direct", 0, False), ("coalesced 30fps", 30, False)):
+    cpu, ticks = measure(fps, args.seconds, args.tick_interval, idle)
+    print("{:16s} {:6.3f} s cpu for {} ticks ({:.1f} us/tick, {:.1f}% of a core)".format(
+      label, cpu, ticks, cpu / max(ticks, 1) * 1e6, cpu / args.seconds * 100))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,78 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+from model.playlist_store import PlaylistStore
+from model.playlist_model import PlaylistModel
+import argparse
+import random
+import time
+import gc
+
+def residentBytes() -> int:
+  # linux only, good enough to compare the C++ heap of QMediaPlaylist
+  # with the python side arrays of PlaylistStore
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except OSError:
+    return 0
+
+def makeUrls(count: int):
+  return [QtCore.QUrl.fromLocalFile("/media/library/album_{:05d}/track_{:07d}.mp3".format(i // 100, i))
+          for i in range(count)]
+
+def measureStore(urls, lookups):
+  gc.collect()
+  before = residentBytes()
+  store = PlaylistStore()
+  store.addMedia(urls)
+  memory = residentBytes() - before
+
+  model = PlaylistModel(None)
+  model.setPlaylist(store)
+  model.fetchUpTo(store.mediaCount() - 1)
+  indexes = [model.index(row, 0) for row in lookups]
+  begin = time.perf_counter()
+  for index in indexes:
+    model.data(index, QtCore.Qt.DisplayRole)
+  elapsed = time.perf_counter() - begin
+  print("PlaylistStore footprint: {:.1f} KiB".format(store.memoryFootprint() / 1024))
+  return memory, elapsed
+
+def measureQMediaPlaylist(urls, lookups):
+  from PyQt5 import QtMultimedia
+  gc.collect()
+  before = residentBytes()
+  playlist = QtMultimedia.QMediaPlaylist()
+  for url in urls:
+    playlist.addMedia(QtMultimedia.QMediaContent(url))
+  memory = residentBytes() - before
+
+  begin = time.perf_counter()
+  for row in lookups:
+    location = playlist.media(row).canonicalUrl()
+    QtCore.QFileInfo(location.path()).fileName()
+  elapsed = time.perf_counter() - begin
+  return memory, elapsed
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--rows", type=int, default=100000)
+  parser.add_argument("--lookups", type=int, default=100000)
+  args = parser.parse_args()
+
+  app = QtWidgets.QApplication([])
+  urls = makeUrls(args.rows)
+  lookups = [random.randrange(args.rows) for _ in range(args.lookups)]
+
+  memory, elapsed = measureStore(urls, lookups)
+  print("PlaylistStore:  {:8.1f} KiB rss  {:7.3f} us/lookup".format(memory / 1024, elapsed / len(lookups) * 1e6))
+  try:
+    memory, elapsed = measureQMediaPlaylist(urls, lookups)
+    print("QMediaPlaylist: {:8.1f} KiB rss  {:7.3f} us/lookup".format(memory / 1024, elapsed / len(lookups) * 1e6))
+  except ImportError as e:
+    print("QMediaPlaylist: skipped ({})".format(e))
+
+if __name__ == "__main__":
+  main()
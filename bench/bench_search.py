@@ -0,0 +1,92 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore
+from model.playlist_index import PlaylistSearchIndex
+from model.playlist_model import PlaylistModel
+from model.playlist_filter_model import PlaylistFilterModel
+import argparse
+import random
+import statistics
+import time
+
+LETTERS = "etaoinshrdlucmfwypvbgkqjxz"
+
+def makeVocabulary(rng: random.Random, count: int):
+  # zipf-ish letter frequencies, so common trigrams are really common
+  weights = [1.0 / (i + 1) for i in range(len(LETTERS))]
+  return ["".join(rng.choices(LETTERS, weights, k=rng.randint(3, 9))) for _ in range(count)]
+
+def makeEntries(count: int, seed: int = 1):
+  rng = random.Random(seed)
+  vocabulary = makeVocabulary(rng, 20000)
+  artists = [" ".join(rng.choices(vocabulary, k=2)).title() for _ in range(2000)]
+  urls = []
+  titles = []
+  for i in range(count):
+    artist = artists[i // 250 % len(artists)]
+    title = " ".join(rng.choices(vocabulary, k=rng.randint(1, 4))).title()
+    urls.append("file:///music/{}/album_{:03d}/{:02d} {}.mp3".format(artist, i // 12 % 1000, i % 12, title))
+    titles.append("{} - {}".format(artist, title))
+  return urls, titles
+
+def typeWords(titles, rng: random.Random, count: int, search):
+  # type a word found in some title one key at a time, timings per
+  # query length
+  timings = {}
+  for _ in range(count):
+    word = titles[rng.randrange(len(titles))].split(" - ")[1].split()[0].lower()
+    for length in range(1, len(word) + 1):
+      begin = time.perf_counter()
+      search(word[:length])
+      timings.setdefault(min(length, 5), []).append((time.perf_counter() - begin) * 1000)
+  for length, values in sorted(timings.items()):
+    print("  query length {}{}: median {:.2f} ms, p95 {:.2f} ms".format(
+      length, "+" if length == 5 else " ", statistics.median(values),
+      sorted(values)[int(len(values) * 0.95) - 1]))
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--rows", type=int, default=500000)
+  parser.add_argument("--queries", type=int, default=30)
+  args = parser.parse_args()
+
+  app = QtCore.QCoreApplication([])
+  urls, titles = makeEntries(args.rows)
+  store = PlaylistStore()
+  store.addMedia(urls[:1], titles[:1])
+
+  begin = time.perf_counter()
+  index = PlaylistSearchIndex(store)
+  for start in range(1, args.rows, 5000):
+    store.addMedia(urls[start:start + 5000], titles[start:start + 5000])
+  queued = time.perf_counter() - begin
+  index.wait()
+  build = time.perf_counter() - begin
+  print("gui thread time to queue all inserts: {:.2f} s".format(queued))
+  print("index build: {:.2f} s for {} rows ({:.1f} us/row), {:.1f} MiB postings".format(
+    build, args.rows, build / args.rows * 1e6, index.memoryFootprint() / 1024 / 1024))
+
+  print("search index:")
+  typeWords(titles, random.Random(7), args.queries, index.search)
+  # what the playlist view waits for per keystroke, the proxy resets
+  # and maps its rows through the playlist model
+  model = PlaylistModel(None)
+  model.setPlaylist(store)
+  filter_model = PlaylistFilterModel(index)
+  filter_model.setSourceModel(model)
+  print("filter model:")
+  typeWords(titles, random.Random(7), args.queries, filter_model.setQuery)
+
+  begin = time.perf_counter()
+  store.removeMedia(1000, 1999)
+  index.wait()
+  print("remove 1000 rows: {:.1f} ms".format((time.perf_counter() - begin) * 1000))
+  # the rows after them were renumbered in the postings
+  app.processEvents()
+  print("filter model after the remove:")
+  typeWords(titles, random.Random(7), args.queries, filter_model.setQuery)
+
+if __name__ == "__main__":
+  main()
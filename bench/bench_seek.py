@@ -0,0 +1,71 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+from bench.synthetic_media import makeVideoFile, makeWavFile
+import argparse
+import tempfile
+
+def measure(path: str, seek_interval: int, drag_ms: int, move_interval_ms: int):
+  # drags the slider across the file like a user would: one move every
+  # move_interval_ms, then a release
+  from widget.player import Player
+  player = Player(seek_interval=seek_interval)
+  loop = QtCore.QEventLoop()
+  player.play_list.addMedia([QtCore.QUrl.fromLocalFile(path)])
+  player.jump(player.play_list_model.index(0, 0))
+  player.engine.keyframe_index.request(player.play_list.url(0))
+  player.engine.keyframe_index.wait()
+
+  def loaded():
+    if player.engine.player.duration() <= 0:
+      QtCore.QTimer.singleShot(50, loaded)
+      return
+    moves = drag_ms // move_interval_ms
+    positions = [player.engine.player.duration() * i // (moves + 1) for i in range(1, moves + 1)]
+
+    def move():
+      if len(positions) != 0:
+        player.slider.setSliderDown(True)
+        player.slider.setSliderPosition(positions.pop(0))
+        QtCore.QTimer.singleShot(move_interval_ms, move)
+      else:
+        player.slider.setSliderDown(False)
+        QtCore.QTimer.singleShot(2000, loop.quit)
+    move()
+
+  QtCore.QTimer.singleShot(500, loaded)
+  QtCore.QTimer.singleShot(120000, loop.quit)
+  loop.exec_()
+  report = player.engine.seek_controller.latencyReport()
+  player.close()
+  player.deleteLater()
+  return report
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--seconds", type=int, default=600)
+  parser.add_argument("--drag-ms", type=int, default=3000)
+  parser.add_argument("--move-interval-ms", type=int, default=10)
+  args = parser.parse_args()
+
+  app = QtWidgets.QApplication([])
+  directory = os.path.join(tempfile.gettempdir(), "player_bench_seek")
+  os.makedirs(directory, exist_ok=True)
+  path = os.path.join(directory, "seek_{}.mp4".format(args.seconds))
+  if not makeVideoFile(path, args.seconds):
+    # no ffmpeg, no keyframes to snap to, only the debouncing is measured
+    path = os.path.join(directory, "seek_{}.wav".format(args.seconds))
+    if not os.path.exists(path):
+      makeWavFile(path, args.seconds)
+  for seek_interval in (0, 150):
+    report = measure(path, seek_interval, args.drag_ms, args.move_interval_ms)
+    print("seek interval {:3d} ms: {} seeks ({} previews)".format(seek_interval, report["seeks"], report["previews"]))
+    for kind in ("preview", "exact"):
+      summary = report[kind]
+      if summary["count"] != 0:
+        print("  {:7s} p50 {:.1f} ms, p95 {:.1f} ms, max {:.1f} ms over {}".format(
+          kind, summary["p50_ms"], summary["p95_ms"], summary["max_ms"], summary["count"]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,51 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+from bench.synthetic_media import makeWavFiles
+import argparse
+import statistics
+import tempfile
+
+def measure(paths, preload_horizon: int, play_ms: int):
+  from widget.player import Player
+  player = Player(preload_horizon=preload_horizon)
+  latencies = []
+  loop = QtCore.QEventLoop()
+
+  def switched(elapsed: float, preloaded: bool):
+    latencies.append(elapsed)
+    if len(latencies) >= len(paths) - 1:
+      loop.quit()
+    else:
+      QtCore.QTimer.singleShot(play_ms, player.play_list.next)
+
+  player.engine.trackSwitched.connect(switched)
+  player.play_list.addMedia([QtCore.QUrl.fromLocalFile(path) for path in paths])
+  player.jump(player.play_list_model.index(0, 0))
+  QtCore.QTimer.singleShot(play_ms, player.play_list.next)
+  QtCore.QTimer.singleShot(60000, loop.quit)
+  loop.exec_()
+  player.close()
+  player.deleteLater()
+  # the first entry is the initial cold load of item 0
+  return latencies[1:]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--tracks", type=int, default=20)
+  parser.add_argument("--play-ms", type=int, default=300)
+  args = parser.parse_args()
+
+  app = QtWidgets.QApplication([])
+  paths = makeWavFiles(os.path.join(tempfile.gettempdir(), "player_bench_wav"), args.tracks, 2.0)
+  for horizon in (0, 1):
+    latencies = measure(paths, horizon, args.play_ms)
+    if len(latencies) == 0:
+      print("preload={}: no switches measured".format(horizon))
+      continue
+    print("preload={}: median {:.1f} ms, max {:.1f} ms over {} switches".format(
+      horizon, statistics.median(latencies), max(latencies), len(latencies)))
+
+if __name__ == "__main__":
+  main()
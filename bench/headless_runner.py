@@ -0,0 +1,164 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+import typing
+
+def percentile(values: typing.List[float], fraction: float) -> typing.Optional[float]:
+  if len(values) == 0:
+    return None
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def runEngines(worker: int, count: int, media: typing.List[str], seconds: float, switch_ms: int,
+               seek_ms: int, preload: int, seed: int, frame_stats: bool = False) -> typing.Dict[str, typing.Any]:
+  # runs in a pool process: `count` engines sharing one event loop,
+  # each with its own playlist and media players
+  from PyQt5 import QtCore, QtGui
+  from engine.player_engine import PlayerEngine, loadMultimedia
+  from widget.slot_profiler import SlotProfiler
+  import resource
+
+  app = QtGui.QGuiApplication(sys.argv[:1])
+  try:
+    loadMultimedia()
+  except ImportError as e:
+    return {"worker": worker, "error": "QtMultimedia unavailable: {}".format(e), "engines": []}
+
+  rng = random.Random(seed + worker)
+  # one profiler for the process, it times every engine slot and the
+  # event loop lag they all share
+  profiler = SlotProfiler(None, True)
+  engines = []
+  stats = []
+  timers = []
+  urls = [QtCore.QUrl.fromUserInput(path, os.getcwd()) for path in media]
+
+  for i in range(count):
+    engine = PlayerEngine(preload_horizon=preload, profiler=profiler)
+    if frame_stats:
+      # frames go to a surface nothing draws, which still counts them
+      from engine.frame_stats import FrameStatsSurface
+      engine.setVideoOutput(FrameStatsSurface(engine))
+    stat = {"switches": [], "errors": [], "first_frame_ms": None, "positions": 0, "seeks": 0}
+    engine.trackSwitched.connect(lambda elapsed, preloaded, stat=stat: stat["switches"].append(elapsed))
+    engine.errorOccurred.connect(lambda message, stat=stat: stat["errors"].append(message))
+    engine.firstFrame.connect(lambda elapsed, stat=stat: stat.__setitem__("first_frame_ms", elapsed))
+    engine.positionChanged.connect(lambda position, stat=stat: stat.__setitem__("positions", stat["positions"] + 1))
+
+    def loaded(engine=engine):
+      # every engine starts somewhere else in the playlist
+      if engine.play_list.mediaCount() != 0:
+        engine.jump(rng.randrange(engine.play_list.mediaCount()))
+    engine.playlist_loader.finished.connect(loaded)
+    engine.start()
+    engine.addToPlaylist(urls)
+
+    if switch_ms > 0:
+      timer = QtCore.QTimer()
+      timer.timeout.connect(engine.next)
+      timer.start(switch_ms + rng.randrange(max(1, switch_ms // 4)))
+      timers.append(timer)
+    if seek_ms > 0:
+      def seek(engine=engine, stat=stat):
+        if engine.duration() > 0:
+          stat["seeks"] += 1
+          engine.seek(rng.randrange(engine.duration()))
+      timer = QtCore.QTimer()
+      timer.timeout.connect(seek)
+      timer.start(seek_ms + rng.randrange(max(1, seek_ms // 4)))
+      timers.append(timer)
+    engines.append(engine)
+    stats.append(stat)
+
+  cpu_begin = time.process_time()
+  QtCore.QTimer.singleShot(int(seconds * 1000), app.quit)
+  app.exec_()
+  cpu = time.process_time() - cpu_begin
+  for timer in timers:
+    timer.stop()
+  for engine, stat in zip(engines, stats):
+    stat["position_ms"] = engine.position()
+    stat["seek_latency"] = engine.seek_controller.latencyReport()
+    if frame_stats:
+      stat["frames"] = engine.video_output.summary()
+    engine.stop()
+    engine.shutdown()
+  return {
+    "worker": worker,
+    "cpu_s": cpu,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "lag": profiler.lagSummary(),
+    "engines": stats,
+  }
+
+def summarize(results: typing.List[typing.Dict[str, typing.Any]], seconds: float) -> typing.Dict[str, typing.Any]:
+  engines = [stat for result in results for stat in result["engines"]]
+  switches = [elapsed for stat in engines for elapsed in stat["switches"]]
+  first_frames = [stat["first_frame_ms"] for stat in engines if stat["first_frame_ms"] is not None]
+  lags = [result["lag"] for result in results if "lag" in result]
+  frames = [stat["frames"] for stat in engines if "frames" in stat]
+  return {
+    "engines": len(engines),
+    "failed_workers": [result["error"] for result in results if "error" in result],
+    "playing": len(first_frames),
+    "errors": sum(len(stat["errors"]) for stat in engines),
+    "switches": len(switches),
+    "switch_p50_ms": percentile(switches, 0.5),
+    "switch_p95_ms": percentile(switches, 0.95),
+    "first_frame_p95_ms": percentile(first_frames, 0.95),
+    "lag_max_ms": max((lag.get("max_ms", 0) for lag in lags), default=None),
+    "cpu_per_engine": sum(result.get("cpu_s", 0) for result in results) / max(len(engines), 1) / seconds,
+    "frames_presented": sum(stat["presented"] for stat in frames) if len(frames) != 0 else None,
+    "frames_late": sum(stat["late"] for stat in frames) if len(frames) != 0 else None,
+    "frames_dropped": sum(stat["dropped"] for stat in frames) if len(frames) != 0 else None,
+    "frame_stalls": sum(stat["stalls"] for stat in frames) if len(frames) != 0 else None,
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description="run many headless PlayerEngines across processes")
+  parser.add_argument("media", nargs="*",
+                      help="files, folders or playlists every engine plays, synthetic wav files when empty")
+  parser.add_argument("--engines", type=int, default=8, help="engines in total")
+  parser.add_argument("--processes", type=int, default=None, help="pool size, one per core by default")
+  parser.add_argument("--seconds", type=float, default=30.0)
+  parser.add_argument("--switch-ms", type=int, default=5000, help="ms between track switches, 0 never switches")
+  parser.add_argument("--seek-ms", type=int, default=0, help="ms between random seeks, 0 never seeks")
+  parser.add_argument("--preload", type=int, default=1)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--frame-stats", action="store_true",
+                      help="send video to a frame statistics surface and report late and dropped frames")
+  parser.add_argument("--output", default=None, help="write every engine's numbers as json to this file")
+  args = parser.parse_args()
+
+  media = args.media
+  if len(media) == 0:
+    from bench.synthetic_media import makeWavFiles
+    media = makeWavFiles(os.path.join(tempfile.gettempdir(), "player_bench_wav"), 20, 10.0)
+  processes = max(1, min(args.processes or os.cpu_count() or 1, args.engines))
+  counts = [args.engines // processes + (1 if i < args.engines % processes else 0) for i in range(processes)]
+
+  # spawn, a forked child would inherit Qt and media state it can't use
+  context = multiprocessing.get_context("spawn")
+  with concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+    futures = [pool.submit(runEngines, worker, count, media, args.seconds, args.switch_ms, args.seek_ms,
+                           args.preload, args.seed, args.frame_stats)
+               for worker, count in enumerate(counts) if count != 0]
+    results = [future.result() for future in futures]
+
+  summary = summarize(results, args.seconds)
+  print(json.dumps(summary, indent=2))
+  if args.output is not None:
+    with open(args.output, "w") as f:
+      json.dump({"summary": summary, "workers": results}, f, indent=2)
+  exit(1 if len(summary["failed_workers"]) != 0 or summary["errors"] != 0 else 0)
+
+if __name__ == "__main__":
+  main()
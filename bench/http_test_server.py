@@ -0,0 +1,157 @@
+import argparse
+import email.utils
+import http.server
+import os
+import re
+import threading
+import time
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 16 * 1024
+
+class MediaRequestHandler(http.server.BaseHTTPRequestHandler):
+  # serves the files under server.directory with byte ranges. The server
+  # can throttle every response to `rate` bytes/s, cut connections after
+  # `drop_after` bytes and ignore Range headers, to see how streaming
+  # holds up
+  protocol_version = "HTTP/1.1"
+
+  def log_message(self, format: str, *args):
+    if self.server.verbose:
+      super().log_message(format, *args)
+
+  def do_HEAD(self):
+    self.respond(False)
+
+  def do_GET(self):
+    self.respond(True)
+
+  def respond(self, send_body: bool):
+    server = self.server
+    server.count("requests")
+    path = os.path.join(server.directory, self.path.split("?", 1)[0].lstrip("/"))
+    try:
+      stat = os.stat(path)
+    except OSError:
+      self.send_error(404)
+      return
+    if not os.path.isfile(path):
+      self.send_error(404)
+      return
+    size = stat.st_size
+    etag = '"{:x}-{:x}"'.format(size, stat.st_mtime_ns)
+
+    start, end = 0, size - 1
+    status = 200
+    match = RANGE.match(self.headers.get("Range", "")) if server.ranges else None
+    if match is not None and self.headers.get("If-Range", etag) == etag:
+      if match.group(1) != "":
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) != "" else size - 1
+      elif match.group(2) != "":
+        start = max(size - int(match.group(2)), 0)
+      end = min(end, size - 1)
+      if start >= size or start > end:
+        self.send_response(416)
+        self.send_header("Content-Range", "bytes */{}".format(size))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return
+      status = 206
+
+    self.send_response(status)
+    self.send_header("Content-Type", "application/octet-stream")
+    self.send_header("Content-Length", str(end - start + 1))
+    self.send_header("ETag", etag)
+    self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+    if server.ranges:
+      self.send_header("Accept-Ranges", "bytes")
+    if status == 206:
+      self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, size))
+    self.end_headers()
+    if not send_body:
+      return
+
+    sent = 0
+    began = time.perf_counter()
+    with open(path, "rb") as f:
+      f.seek(start)
+      remaining = end - start + 1
+      while remaining > 0:
+        block = f.read(min(BLOCK_SIZE, remaining))
+        if server.drop_after > 0 and sent + len(block) > server.drop_after:
+          # cut the connection mid body, the client sees a short read
+          try:
+            self.wfile.write(block[:server.drop_after - sent])
+            self.wfile.flush()
+          except OSError:
+            pass
+          server.count("bytes", server.drop_after - sent)
+          server.count("drops")
+          self.close_connection = True
+          return
+        try:
+          self.wfile.write(block)
+        except OSError:
+          # the client hung up, it got what it wanted
+          self.close_connection = True
+          return
+        sent += len(block)
+        remaining -= len(block)
+        server.count("bytes", len(block))
+        if server.rate > 0:
+          ahead = sent / server.rate - (time.perf_counter() - began)
+          if ahead > 0:
+            time.sleep(ahead)
+
+class MediaServer(http.server.ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, directory: str, port: int = 0, rate: int = 0, drop_after: int = 0,
+               ranges: bool = True, verbose: bool = False) -> None:
+    super().__init__(("127.0.0.1", port), MediaRequestHandler)
+    self.directory = directory
+    self.rate = rate
+    self.drop_after = drop_after
+    self.ranges = ranges
+    self.verbose = verbose
+    self.lock = threading.Lock()
+    self.stats = {"requests": 0, "bytes": 0, "drops": 0}
+
+  def count(self, key: str, amount: int = 1):
+    with self.lock:
+      self.stats[key] += amount
+
+  def handle_error(self, request, client_address):
+    # clients hanging up on a response is what streaming does
+    if self.verbose:
+      super().handle_error(request, client_address)
+
+  def url(self, name: str) -> str:
+    return "http://127.0.0.1:{}/{}".format(self.server_address[1], name)
+
+def startServer(directory: str, **kwargs) -> MediaServer:
+  # runs on a daemon thread until shutdown() is called
+  server = MediaServer(directory, **kwargs)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+def main():
+  parser = argparse.ArgumentParser(description="serve media with byte ranges, optionally slow and unreliable")
+  parser.add_argument("directory", nargs="?", default=".")
+  parser.add_argument("--port", type=int, default=8000)
+  parser.add_argument("--rate", type=int, default=0, help="bytes per second per response, 0 is unlimited")
+  parser.add_argument("--drop-after", type=int, default=0,
+                      help="cut every response after this many bytes, 0 never does")
+  parser.add_argument("--no-ranges", action="store_true", help="ignore Range headers and always send everything")
+  args = parser.parse_args()
+  server = MediaServer(args.directory, args.port, args.rate, args.drop_after, not args.no_ranges, verbose=True)
+  print("serving {} on {}".format(os.path.abspath(args.directory), server.url("")))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  server.server_close()
+
+if __name__ == "__main__":
+  main()
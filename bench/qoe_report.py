@@ -0,0 +1,104 @@
+import argparse
+import collections
+import json
+import os
+import time
+import typing
+
+from model.qoe_store import QoeStore, PlayRecord, defaultQoePath
+
+# what --sort accepts, all of them get worse as they grow
+SORT_KEYS = ("plays", "startup_p95_ms", "stalls_per_play", "stall_p95_ms", "rebuffer_ratio",
+             "seek_p95_ms", "error_rate")
+
+def percentile(values: typing.List[float], fraction: float) -> typing.Optional[float]:
+  if len(values) == 0:
+    return None
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def summarize(records: typing.List[PlayRecord], seeks: typing.List[float]) -> typing.Dict[str, typing.Any]:
+  startups = [record.startup_ms for record in records if record.startup_ms is not None]
+  played_ms = sum(record.played_ms for record in records)
+  waited_ms = sum(record.stall_ms + record.buffering_ms for record in records)
+  return {
+    "plays": len(records),
+    "started": len(startups),
+    "ended": sum(record.ended for record in records),
+    "startup_p50_ms": percentile(startups, 0.5),
+    "startup_p95_ms": percentile(startups, 0.95),
+    "startup_max_ms": max(startups, default=None),
+    "stalls_per_play": sum(record.stalls for record in records) / max(len(records), 1),
+    "stall_p95_ms": percentile([record.stall_ms for record in records if record.stalls != 0], 0.95),
+    # time spent waiting, buffering before the start too, against time
+    # spent playing
+    "rebuffer_ratio": waited_ms / (played_ms + waited_ms) if played_ms + waited_ms > 0 else 0.0,
+    "seeks": len(seeks),
+    "seek_p50_ms": percentile(seeks, 0.5),
+    "seek_p95_ms": percentile(seeks, 0.95),
+    "error_rate": sum(record.errors != 0 for record in records) / max(len(records), 1),
+  }
+
+def report(store: QoeStore, by: str, since: float = 0.0) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+  sessions = store.sessions()
+  latencies = store.seekLatencies()
+  groups = collections.defaultdict(lambda: ([], []))
+  for play, session, record in store.plays(since):
+    if by == "file":
+      key = record.url
+    elif by == "session":
+      key = session
+    else:
+      key = sessions.get(session, (0.0, "unknown"))[1]
+    records, seeks = groups[key]
+    records.append(record)
+    seeks.extend(latencies.get(play, []))
+  return {key: summarize(records, seeks) for key, (records, seeks) in groups.items()}
+
+def formatValue(column: str, value: typing.Any) -> str:
+  if value is None:
+    return "-"
+  if isinstance(value, float):
+    return "{:.0f}".format(value) if column.endswith("_ms") else "{:.3f}".format(value)
+  return str(value)
+
+def main():
+  parser = argparse.ArgumentParser(description="playback quality per file, session or version from the player's "
+                                               "metrics store")
+  parser.add_argument("--db", default=None, help="metrics file, the player's default when not given")
+  parser.add_argument("--by", choices=("file", "session", "version"), default="version")
+  parser.add_argument("--since-days", type=float, default=None, help="only plays from the last days")
+  parser.add_argument("--sort", choices=SORT_KEYS, default="startup_p95_ms", help="worst first by this")
+  parser.add_argument("--top", type=int, default=20, help="rows to show, 0 shows all")
+  parser.add_argument("--json", action="store_true", help="print every group as json")
+  args = parser.parse_args()
+
+  if args.db is None:
+    # the player's QApplication takes its name from widget/player.py
+    from PyQt5 import QtCore
+    QtCore.QCoreApplication.setApplicationName("player.py")
+    args.db = defaultQoePath()
+  if not os.path.exists(args.db):
+    parser.error("no metrics at {}".format(args.db))
+  store = QoeStore(args.db)
+  since = time.time() - args.since_days * 86400 if args.since_days is not None else 0.0
+  groups = report(store, args.by, since)
+  store.close()
+
+  rows = sorted(groups.items(), key=lambda item: -(item[1][args.sort] or 0))
+  if args.top > 0:
+    rows = rows[:args.top]
+  if args.json:
+    print(json.dumps(dict(rows), indent=2))
+    return
+  columns = ("plays", "startup_p50_ms", "startup_p95_ms", "stalls_per_play", "stall_p95_ms", "rebuffer_ratio",
+             "seek_p50_ms", "seek_p95_ms", "error_rate")
+  width = max([len(args.by)] + [min(len(key), 60) for key, _ in rows])
+  print("  ".join([args.by.ljust(width)] + [column.rjust(len(column)) for column in columns]))
+  for key, summary in rows:
+    # long urls keep their end, the file name
+    name = key if len(key) <= 60 else "..." + key[-57:]
+    print("  ".join([name.ljust(width)] + [formatValue(column, summary[column]).rjust(len(column)) for column in columns]))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,401 @@
+# Headless benchmarks for the player's hot paths, compared against a
+# baseline recorded on the same machine. Baselines depend on the machine,
+# so none is checked in. Record one from the commit to compare against,
+# then run again on the change:
+#
+#   python -m bench.run_benchmarks --save-baseline
+#   python -m bench.run_benchmarks
+#
+# The second run exits non-zero when a metric got slower than
+# --tolerance allows. --filter and --max-rows select the same subset for
+# both runs, --baseline points at another file.
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtWidgets
+from model.playlist_store import PlaylistStore
+from model.playlist_model import PlaylistModel
+from model.playlist_loader import PlaylistLoader
+from model.session import SessionState, saveSession, loadSession
+from bench.synthetic_media import makeWavFiles
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), "player_bench_media")
+# the add and load cases go through real, decodable clips, short so a
+# library of them stays small on disk
+CLIP_SECONDS = 0.1
+
+BENCHMARKS = []
+
+def benchmark(name: str, needs_multimedia: bool = False):
+  def register(func: typing.Callable[[argparse.Namespace], typing.Dict[str, float]]):
+    BENCHMARKS.append((name, needs_multimedia, func))
+    return func
+  return register
+
+def measure(func: typing.Callable[[], typing.Any], repeat: int = 5, number: int = 1) -> float:
+  # best of `repeat`, per call, in seconds
+  best = float("inf")
+  for _ in range(repeat):
+    begin = time.perf_counter()
+    for _ in range(number):
+      func()
+    best = min(best, (time.perf_counter() - begin) / number)
+  return best
+
+def makeStore(rows: int) -> PlaylistStore:
+  store = PlaylistStore()
+  store.addMedia(["file:///media/library/album_{:05d}/track_{:07d}.mp3".format(i // 100, i) for i in range(rows)],
+                 ["track_{:07d}.mp3".format(i) for i in range(rows)])
+  return store
+
+def waitFor(signal, timeout_ms: int = 120000):
+  loop = QtCore.QEventLoop()
+  signal.connect(loop.quit)
+  QtCore.QTimer.singleShot(timeout_ms, loop.quit)
+  loop.exec_()
+  signal.disconnect(loop.quit)
+
+def rowSizes(args: argparse.Namespace) -> typing.List[int]:
+  return [size for size in (1000, 10000, 100000, 1000000) if size <= args.max_rows]
+
+@benchmark("model")
+def benchModel(args: argparse.Namespace) -> typing.Dict[str, float]:
+  results = {}
+  lookups = 20000
+  for rows in rowSizes(args):
+    store = makeStore(rows)
+    model = PlaylistModel(None)
+    model.setPlaylist(store)
+    # every row exposed, lookups land anywhere in the playlist
+    model.fetchUpTo(rows - 1)
+    root = QtCore.QModelIndex()
+    rng = random.Random(rows)
+    picked = [rng.randrange(rows) for _ in range(lookups)]
+    indexes = [model.index(row, 0) for row in picked]
+
+    results["data[{}]".format(rows)] = measure(
+      lambda: [model.data(index, QtCore.Qt.DisplayRole) for index in indexes]) / lookups
+    # what painting does: every column of a screenful of rows, again
+    # and again while it scrolls by
+    top = rng.randrange(max(rows - 40, 1))
+    visible = [model.index(row, column) for row in range(top, min(top + 40, rows))
+               for column in range(model.columnCount(root))]
+    results["dataVisible[{}]".format(rows)] = measure(
+      lambda: [model.data(index, QtCore.Qt.DisplayRole) for _ in range(10) for index in visible]) / (10 * len(visible))
+    results["index[{}]".format(rows)] = measure(
+      lambda: [model.index(row, 0) for row in picked]) / lookups
+    results["rowCount[{}]".format(rows)] = measure(
+      lambda: [model.rowCount(root) for _ in range(lookups)]) / lookups
+    results["setPlaylist[{}]".format(rows)] = measure(lambda: model.setPlaylist(store))
+  return results
+
+@benchmark("store")
+def benchStore(args: argparse.Namespace) -> typing.Dict[str, float]:
+  rows = min(args.max_rows, 100000)
+  urls = ["file:///media/track_{:07d}.mp3".format(i) for i in range(rows)]
+  titles = ["track_{:07d}.mp3".format(i) for i in range(rows)]
+  store = PlaylistStore()
+
+  def fill():
+    store.clear()
+    store.addMedia(urls, titles)
+
+  return {
+    "addMedia[{}]".format(rows): measure(fill, repeat=3),
+    "insertMiddle[1000 into {}]".format(rows): measure(
+      lambda: store.insertMedia(rows // 2, urls[:1000], titles[:1000]), repeat=3),
+  }
+
+@benchmark("loader")
+def benchLoader(args: argparse.Namespace) -> typing.Dict[str, float]:
+  files = min(args.max_rows, 20000)
+  directory = os.path.join(MEDIA_DIR, "clips_{}".format(files))
+  makeWavFiles(directory, files, CLIP_SECONDS)
+  urls = [QtCore.QUrl.fromLocalFile(directory)]
+
+  def load():
+    store = PlaylistStore()
+    loader = PlaylistLoader(store)
+    loader.start(urls)
+    waitFor(loader.finished)
+    assert store.mediaCount() == files, store.mediaCount()
+
+  return {"folder[{}]".format(files): measure(load, repeat=3)}
+
+@benchmark("session")
+def benchSession(args: argparse.Namespace) -> typing.Dict[str, float]:
+  rows = min(args.max_rows, 200000)
+  store = makeStore(rows)
+  path = os.path.join(MEDIA_DIR, "session_{}.bin".format(rows))
+  os.makedirs(MEDIA_DIR, exist_ok=True)
+  state = SessionState(current_index=rows // 2, position=60000)
+
+  def restore():
+    session = loadSession(path)
+    restored = PlaylistModel(None)
+    restored_store = PlaylistStore()
+    restored.setPlaylist(restored_store)
+    restored_store.setColumns(session.urls, session.titles, session.durations)
+    restored_store.clear()
+    session.close()
+
+  return {
+    "save[{}]".format(rows): measure(lambda: saveSession(path, store, state), repeat=3),
+    "restore[{}]".format(rows): measure(restore, repeat=3),
+  }
+
+@benchmark("player.addToPlaylist")
+def benchAddToPlaylist(args: argparse.Namespace) -> typing.Dict[str, float]:
+  from widget.player import Player
+  files = min(args.max_rows, 20000)
+  directory = os.path.join(MEDIA_DIR, "clips_{}".format(files))
+  paths = makeWavFiles(directory, files, CLIP_SECONDS)
+  urls = [QtCore.QUrl.fromLocalFile(path) for path in paths]
+  player = Player()
+
+  def add():
+    player.play_list.clear()
+    player.addToPlaylist(urls)
+    waitFor(player.engine.playlist_loader.finished)
+
+  result = measure(add, repeat=3)
+  player.close()
+  return {"files[{}]".format(files): result}
+
+@benchmark("player.handlers")
+def benchHandlers(args: argparse.Namespace) -> typing.Dict[str, float]:
+  from widget.player import Player
+  calls = 10000
+  player = Player()
+  player.durationChanged(3 * 3600 * 1000)
+  state = {"position": 0}
+
+  def positions():
+    for _ in range(calls):
+      state["position"] += 10
+      player.positionChanged(state["position"])
+    player.update_scheduler.flush()
+
+  def durations():
+    for i in range(calls):
+      player.updateDurationInfo(i)
+
+  results = {
+    "positionChanged": measure(positions) / calls,
+    "updateDurationInfo": measure(durations) / calls,
+  }
+  player.close()
+  return results
+
+@benchmark("library")
+def benchLibrary(args: argparse.Namespace) -> typing.Dict[str, float]:
+  from model.media_library import MediaLibrary
+  files = min(args.max_rows, 100000)
+  root = os.path.join(MEDIA_DIR, "library_{}".format(files))
+  for start in range(0, files, 100):
+    makeWavFiles(os.path.join(root, "album_{:05d}".format(start // 100)), min(100, files - start), CLIP_SECONDS)
+  index_path = os.path.join(tempfile.mkdtemp(), "library.sqlite")
+
+  def walk():
+    library = MediaLibrary(index_path)
+    library.addRoot(root)
+    waitFor(library.scanFinished, 600000)
+    library.close()
+
+  def restart():
+    # nothing changed on disk, this is the stat diff alone
+    library = MediaLibrary(index_path)
+    library.start()
+    waitFor(library.scanFinished, 600000)
+    library.close()
+
+  return {"walk[{}]".format(files): measure(walk, repeat=1), "restart[{}]".format(files): measure(restart, repeat=3)}
+
+def drainStream(stream) -> bytes:
+  # reads a stream to the end the way the media backend does: whatever is
+  # there, then wait for readyRead
+  if not stream.isReady():
+    waitFor(stream.ready, 60000)
+  data = bytearray()
+  while not stream.atEnd():
+    block = stream.read(1024 * 1024)
+    if block:
+      data += block
+    else:
+      waitFor(stream.readyRead, 60000)
+  return bytes(data)
+
+@benchmark("stream")
+def benchStream(args: argparse.Namespace) -> typing.Dict[str, float]:
+  from bench.http_test_server import startServer
+  from engine.http_stream import StreamFetcher, HttpStream
+  from model.chunk_cache import ChunkCache
+  size = 32 * 1024 * 1024
+  directory = os.path.join(MEDIA_DIR, "stream")
+  path = os.path.join(directory, "stream.bin")
+  if not os.path.exists(path) or os.path.getsize(path) != size:
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+      f.write(random.Random(0).randbytes(size))
+  with open(path, "rb") as f:
+    expected = f.read()
+
+  results = {}
+  for name, options in (("clean", {}), ("dropping", {"drop_after": 3 * 1024 * 1024}),
+                        ("throttled", {"rate": 32 * 1024 * 1024}), ("no_ranges", {"ranges": False})):
+    server = startServer(directory, **options)
+    fetcher = StreamFetcher(ChunkCache(tempfile.mkdtemp(), max_bytes=2 * size))
+    url = server.url("stream.bin")
+
+    def play():
+      stream = HttpStream(url, fetcher)
+      data = drainStream(stream)
+      stream.close()
+      if data != expected:
+        raise RuntimeError("stream from {} server came back different".format(name))
+
+    def backSeek():
+      # the first half again after reading the second, served from disk
+      stream = HttpStream(url, fetcher)
+      stream.seek(size // 2)
+      drainStream(stream)
+      stream.seek(0)
+      stream.read(size // 2)
+      stream.close()
+
+    results["cold.{}".format(name)] = measure(play, repeat=1)
+    sent = server.stats["bytes"]
+    results["replay.{}".format(name)] = measure(play, repeat=3)
+    results["backSeek.{}".format(name)] = measure(backSeek, repeat=3)
+    if server.stats["bytes"] != sent:
+      raise RuntimeError("replaying from the {} server went to the network".format(name))
+    fetcher.cancel()
+    fetcher.wait()
+    server.shutdown()
+    server.server_close()
+  return results
+
+def startupReport(*args: str) -> typing.Dict[str, float]:
+  # a fresh interpreter per run, imports are part of what is measured
+  output = subprocess.run([sys.executable, "-m", "widget.player", "--startup-report", "--no-session",
+                           "--no-library"] + list(args),
+                          cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+  return json.loads(output.strip().splitlines()[-1])
+
+def measureStartup(*args: str, runs: int = 3) -> typing.Dict[str, float]:
+  reports = [startupReport(*args) for _ in range(runs)]
+  results = {}
+  for key in ("first_paint_ms", "first_frame_ms"):
+    values = [report[key] for report in reports if key in report]
+    if len(values) != 0:
+      results[key[:-3]] = min(values) / 1000
+  return results
+
+@benchmark("startup.lazy")
+def benchStartupLazy(args: argparse.Namespace) -> typing.Dict[str, float]:
+  return measureStartup()
+
+@benchmark("startup.eager", needs_multimedia=True)
+def benchStartupEager(args: argparse.Namespace) -> typing.Dict[str, float]:
+  return measureStartup("--eager")
+
+@benchmark("startup.play", needs_multimedia=True)
+def benchStartupPlay(args: argparse.Namespace) -> typing.Dict[str, float]:
+  from bench.synthetic_media import makeWavFile
+  path = os.path.join(MEDIA_DIR, "startup.wav")
+  if not os.path.exists(path):
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    makeWavFile(path, 5.0)
+  return measureStartup(path)
+
+def multimediaAvailable() -> typing.Tuple[bool, str]:
+  try:
+    from PyQt5 import QtMultimedia
+  except ImportError as e:
+    return False, str(e)
+  return True, ""
+
+def runBenchmarks(args: argparse.Namespace) -> typing.Dict[str, float]:
+  has_multimedia, reason = multimediaAvailable()
+  results = {}
+  for name, needs_multimedia, func in BENCHMARKS:
+    if args.filter and not any(pattern in name for pattern in args.filter):
+      continue
+    if needs_multimedia and not has_multimedia:
+      print("{:40s} skipped, QtMultimedia unavailable ({})".format(name, reason))
+      continue
+    for metric, value in func(args).items():
+      key = "{}.{}".format(name, metric)
+      results[key] = value
+      print("{:40s} {:12.3f} us".format(key, value * 1e6))
+  return results
+
+def compare(results: typing.Dict[str, float], baseline: typing.Dict[str, float],
+            tolerance: float) -> typing.List[str]:
+  regressions = []
+  for key, value in sorted(results.items()):
+    reference = baseline.get(key, None)
+    if reference is None or reference <= 0:
+      continue
+    ratio = value / reference
+    if ratio > 1 + tolerance:
+      regressions.append("{}: {:.3f} us -> {:.3f} us ({:+.0%})".format(
+        key, reference * 1e6, value * 1e6, ratio - 1))
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description="headless benchmarks for the player hot paths")
+  parser.add_argument("--max-rows", type=int, default=1000000)
+  parser.add_argument("--filter", action="append", help="only run benchmarks whose name contains this")
+  parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+  parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+  parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+  parser.add_argument("--output", help="also write the results as json to this file")
+  args = parser.parse_args()
+
+  app = QtWidgets.QApplication(sys.argv[:1])
+  results = runBenchmarks(args)
+  report = {"machine": platform.node(), "python": platform.python_version(), "results": results}
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+
+  if args.save_baseline:
+    baseline = {}
+    if os.path.exists(args.baseline):
+      with open(args.baseline) as f:
+        baseline = json.load(f)
+    baseline.setdefault("results", {}).update(results)
+    baseline["machine"] = report["machine"]
+    baseline["python"] = report["python"]
+    with open(args.baseline, "w") as f:
+      json.dump(baseline, f, indent=2, sort_keys=True)
+    print("baseline written to {}".format(args.baseline))
+    return 0
+
+  if not os.path.exists(args.baseline):
+    print("no baseline at {}, record one with: python -m bench.run_benchmarks --save-baseline".format(args.baseline))
+    return 0
+  with open(args.baseline) as f:
+    baseline = json.load(f)
+  if baseline.get("machine") != report["machine"]:
+    print("warning: baseline was recorded on {}, numbers may not be comparable".format(baseline.get("machine")))
+  regressions = compare(results, baseline.get("results", {}), args.tolerance)
+  for line in regressions:
+    print("REGRESSION " + line)
+  return 1 if len(regressions) != 0 else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,49 @@
+import io
+import os
+import math
+import struct
+import wave
+
+def wavBytes(seconds: float, frequency: float = 440.0, sample_rate: int = 8000) -> bytes:
+  frames = int(seconds * sample_rate)
+  samples = (int(12000 * math.sin(2 * math.pi * frequency * i / sample_rate)) for i in range(frames))
+  data = io.BytesIO()
+  with wave.open(data, "wb") as f:
+    f.setnchannels(1)
+    f.setsampwidth(2)
+    f.setframerate(sample_rate)
+    f.writeframes(b"".join(struct.pack("<h", sample) for sample in samples))
+  return data.getvalue()
+
+def makeWavFile(path: str, seconds: float, frequency: float = 440.0, sample_rate: int = 8000):
+  with open(path, "wb") as f:
+    f.write(wavBytes(seconds, frequency, sample_rate))
+
+def makeWavFiles(directory: str, count: int, seconds: float = 1.0):
+  # decodable tones in 20 pitches, each pitch is synthesized once
+  os.makedirs(directory, exist_ok=True)
+  clips = {}
+  paths = []
+  for i in range(count):
+    path = os.path.join(directory, "track_{:05d}.wav".format(i))
+    if not os.path.exists(path):
+      frequency = 220.0 + 20 * (i % 20)
+      if frequency not in clips:
+        clips[frequency] = wavBytes(seconds, frequency)
+      with open(path, "wb") as f:
+        f.write(clips[frequency])
+    paths.append(path)
+  return paths
+
+def makeVideoFile(path: str, seconds: float, gop: int = 250) -> bool:
+  # ffmpeg test pattern with a keyframe every `gop` frames, False when
+  # ffmpeg isn't installed
+  import shutil, subprocess
+  ffmpeg = shutil.which("ffmpeg")
+  if ffmpeg is None:
+    return False
+  if not os.path.exists(path):
+    subprocess.run([ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i",
+                    "testsrc=duration={}:size=640x360:rate=25".format(seconds),
+                    "-g", str(gop), "-pix_fmt", "yuv420p", path], check=True)
+  return True
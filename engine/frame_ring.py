@@ -0,0 +1,289 @@
+from PyQt5 import QtCore, QtGui
+import typing
+import bisect
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# QMediaPlayer.PlayingState and QAbstractVideoBuffer.ReadOnly, without
+# loading QtMultimedia for them
+PLAYING_STATE = 1
+READ_ONLY = 1
+
+class RingFrame(typing.NamedTuple):
+  pts: int
+  duration: int
+  image: QtGui.QImage
+
+class FrameRing:
+  # recently decoded frames as QImages, the oldest decoded go first once
+  # max_bytes is hit. Lookups go by timestamp, two frames count as
+  # adjacent when nothing could fit between them, so stepping or looping
+  # never skips frames that were not decoded
+  def __init__(self, max_bytes: int) -> None:
+    self.max_bytes = max_bytes
+    self.used_bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self.order = collections.deque()
+    self.pts = []
+    self.frames = {}
+
+  def __len__(self) -> int:
+    return len(self.frames)
+
+  def isEnabled(self) -> bool:
+    return self.max_bytes > 0
+
+  def add(self, pts: int, duration: int, image: QtGui.QImage):
+    if not self.isEnabled():
+      return
+    old = self.frames.get(pts, None)
+    if old is not None:
+      # decoded again, only its place in the eviction order changes
+      self.used_bytes -= old.image.sizeInBytes()
+      self.order.remove(pts)
+    else:
+      bisect.insort(self.pts, pts)
+    self.frames[pts] = RingFrame(pts, max(duration, 1), image)
+    self.order.append(pts)
+    self.used_bytes += image.sizeInBytes()
+    while self.used_bytes > self.max_bytes and len(self.order) > 1:
+      evicted = self.order.popleft()
+      self.used_bytes -= self.frames.pop(evicted).image.sizeInBytes()
+      del self.pts[bisect.bisect_left(self.pts, evicted)]
+
+  def clear(self):
+    self.order.clear()
+    self.pts.clear()
+    self.frames.clear()
+    self.used_bytes = 0
+
+  def frameAt(self, position: int) -> typing.Optional[RingFrame]:
+    # the frame on screen at `position`
+    i = bisect.bisect_right(self.pts, position) - 1
+    if i < 0:
+      return None
+    frame = self.frames[self.pts[i]]
+    return frame if position < frame.pts + frame.duration else None
+
+  def neighbor(self, frame: RingFrame, direction: int) -> typing.Optional[RingFrame]:
+    i = bisect.bisect_left(self.pts, frame.pts) + (1 if direction > 0 else -1)
+    if i < 0 or i >= len(self.pts):
+      return None
+    other = self.frames[self.pts[i]]
+    first, second = (frame, other) if direction > 0 else (other, frame)
+    # a gap of more than half a frame means frames were never decoded
+    return other if second.pts - first.pts <= first.duration * 3 // 2 else None
+
+  def lookup(self, frame: typing.Optional[RingFrame]) -> typing.Optional[RingFrame]:
+    # counts whether a step or loop could be served from memory
+    if frame is not None:
+      self.hits += 1
+    else:
+      self.misses += 1
+    return frame
+
+  def stats(self) -> typing.Dict[str, int]:
+    return {"frames": len(self.frames), "used_bytes": self.used_bytes, "max_bytes": self.max_bytes,
+            "hits": self.hits, "misses": self.misses}
+
+class FrameStepper(QtCore.QObject):
+  # frame stepping and A/B loops over a PlayerEngine. With a video surface
+  # and a ring budget every decoded frame is kept in a FrameRing: steps
+  # are then shown from memory while the player stays paused, a step back
+  # past the ring decodes the second before it with sound off so the next
+  # steps are in memory too. Loops always seek back at B so the sound
+  # loops as well, the ring only shows frame A while that seek lands.
+  # Without them steps are exact seeks
+  frameShown = QtCore.pyqtSignal(object, int)
+  loopChanged = QtCore.pyqtSignal(int, int)
+
+  def __init__(self, engine, max_bytes: int = 0, backfill_ms: int = 1000) -> None:
+    super().__init__(parent=engine)
+    self.engine = engine
+    self.ring = FrameRing(max_bytes)
+    self.backfill_ms = backfill_ms
+    self.surface = None
+    self.frame_duration = 40
+    # the frame shown from memory, None while the player's output is live
+    self.shown = None
+    self.loop_a = -1
+    self.loop_b = -1
+    # frame A from memory until the seek back to it lands
+    self.loop_frame = None
+    self.backfill_target = None
+
+    # a backfill that never reaches its frame gives up after this
+    self.backfill_timer = QtCore.QTimer(self)
+    self.backfill_timer.setSingleShot(True)
+    self.backfill_timer.timeout.connect(self.finishBackfill)
+    engine.positionChanged.connect(self.positionChanged)
+
+  def setSurface(self, surface):
+    # a FrameStatsSurface, every frame it presents goes into the ring
+    if self.surface is not None:
+      self.surface.frameReady.disconnect(self.capture)
+    self.surface = surface
+    if surface is not None:
+      surface.frameReady.connect(self.capture)
+
+  def capture(self):
+    frame = self.surface.current_frame
+    if frame is None or frame.startTime() < 0:
+      return
+    pts = frame.startTime() // 1000
+    if frame.endTime() > frame.startTime():
+      self.frame_duration = max((frame.endTime() - frame.startTime()) // 1000, 1)
+    elif self.surface.surfaceFormat().frameRate() > 0:
+      self.frame_duration = max(round(1000 / self.surface.surfaceFormat().frameRate()), 1)
+    if self.ring.isEnabled() and frame.map(READ_ONLY):
+      try:
+        # a deep copy, the decoder reuses the frame's buffer
+        image = QtGui.QImage(frame.bits(), frame.width(), frame.height(), frame.bytesPerLine(),
+                             self.surface.image_format).copy()
+      finally:
+        frame.unmap()
+      self.ring.add(pts, self.frame_duration, image)
+    if self.backfill_target is not None:
+      if pts + self.frame_duration > self.backfill_target:
+        self.finishBackfill()
+    elif self.isLooping() and self.engine.state() == PLAYING_STATE and pts + self.frame_duration > self.loop_b and \
+         not self.engine.seek_controller.isSeeking():
+      self.loopBack()
+    elif self.loop_frame is not None and pts + self.frame_duration <= self.loop_b and \
+         not self.engine.seek_controller.isSeeking():
+      # the decoder's own frames are back from A
+      self.loop_frame = None
+      self.show(None)
+
+  def livePosition(self) -> int:
+    if self.surface is not None and self.surface.current_frame is not None and \
+       self.surface.current_frame.startTime() >= 0:
+      return self.surface.current_frame.startTime() // 1000
+    return self.engine.position()
+
+  def position(self) -> int:
+    return self.shown.pts if self.shown is not None else self.livePosition()
+
+  def isHolding(self) -> bool:
+    # a frame from memory is on screen or a backfill runs behind it
+    return self.shown is not None or self.backfill_target is not None
+
+  def show(self, frame: typing.Optional[RingFrame]):
+    self.shown = frame
+    self.frameShown.emit(frame.image if frame is not None else None, frame.pts if frame is not None else -1)
+
+  def step(self, direction: int):
+    if self.engine.player is None:
+      return
+    self.loop_frame = None
+    if self.backfill_target is not None:
+      return
+    if self.engine.state() == PLAYING_STATE:
+      self.engine.player.pause()
+    current = self.shown if self.shown is not None else self.ring.frameAt(self.livePosition())
+    target = self.ring.neighbor(current, direction) if current is not None else None
+    if self.ring.lookup(target) is not None:
+      self.show(target)
+      return
+    position = max(current.pts if current is not None else self.position(), 0)
+    if direction < 0 and self.ring.isEnabled() and self.surface is not None and position > 0:
+      if self.shown is None and current is not None:
+        # the decoding behind it stays out of sight
+        self.show(current)
+      self.backfill(max(position - self.frame_duration, 0))
+    else:
+      self.show(None)
+      self.engine.seek_controller.commit(max(position + direction * self.frame_duration, 0))
+
+  def backfill(self, target: int):
+    logger.debug("backfilling frames before %d", target)
+    player = self.engine.player
+    self.backfill_target = target
+    player.setMuted(True)
+    player.setPosition(max(target - self.backfill_ms, 0))
+    player.play()
+    self.backfill_timer.start(self.backfill_ms * 4 + 2000)
+
+  def finishBackfill(self):
+    if self.backfill_target is None:
+      return
+    target = self.backfill_target
+    self.backfill_target = None
+    self.backfill_timer.stop()
+    player = self.engine.player
+    player.pause()
+    player.setMuted(self.engine.isMuted())
+    frame = self.ring.frameAt(target)
+    if frame is not None:
+      self.show(frame)
+    else:
+      self.show(None)
+      self.engine.seek_controller.commit(target)
+
+  def isLooping(self) -> bool:
+    return 0 <= self.loop_a < self.loop_b
+
+  def setLoop(self, begin: int, end: int):
+    self.loop_a = begin
+    self.loop_b = end
+    if self.engine.player is not None:
+      # loops without a surface rely on position updates
+      self.engine.player.setNotifyInterval(50 if self.isLooping() else 1000)
+    self.loopChanged.emit(begin, end)
+
+  def markLoop(self):
+    # A, then B, then off again
+    position = self.position()
+    if self.loop_a < 0:
+      self.setLoop(position, -1)
+    elif self.loop_b < 0 and position > self.loop_a:
+      self.setLoop(self.loop_a, position)
+    else:
+      self.setLoop(-1, -1)
+
+  def positionChanged(self, position: int):
+    if self.surface is None and self.isLooping() and self.engine.state() == PLAYING_STATE and \
+       position >= self.loop_b and not self.engine.seek_controller.isSeeking():
+      self.loopBack()
+
+  def loopBack(self):
+    # the player plays from A again with its sound, frame A from memory
+    # covers the seek
+    frame = self.ring.frameAt(self.loop_a)
+    if self.ring.lookup(frame) is not None:
+      self.loop_frame = frame
+      self.show(frame)
+    self.engine.seek_controller.commit(self.loop_a)
+
+  def resume(self):
+    # before playing: the player continues from the frame on screen
+    self.loop_frame = None
+    if self.backfill_target is not None:
+      self.backfill_target = None
+      self.backfill_timer.stop()
+      self.engine.player.setMuted(self.engine.isMuted())
+    if self.shown is not None:
+      position = self.shown.pts
+      self.show(None)
+      self.engine.seek_controller.commit(position)
+
+  def reset(self):
+    self.loop_frame = None
+    if self.backfill_target is not None:
+      self.backfill_target = None
+      self.backfill_timer.stop()
+      self.engine.player.setMuted(self.engine.isMuted())
+    if self.shown is not None:
+      self.show(None)
+
+  def mediaChanged(self):
+    self.reset()
+    self.ring.clear()
+    if self.loop_a >= 0:
+      self.setLoop(-1, -1)
+
+  def stats(self) -> typing.Dict[str, int]:
+    return self.ring.stats()
@@ -0,0 +1,202 @@
+from PyQt5 import QtCore, QtMultimedia
+import typing
+import array
+import bisect
+import collections
+import json
+import time
+
+# upper bucket edges in ms for the presentation interval and jitter
+# histograms, the last bucket takes everything above
+HISTOGRAM_EDGES_MS = (1, 2, 4, 8, 12, 17, 20, 25, 34, 42, 50, 67, 100, 150, 250, 500, 1000)
+# packed RGB formats a QImage can wrap as they are
+PIXEL_FORMATS = (
+  QtMultimedia.QVideoFrame.Format_RGB32,
+  QtMultimedia.QVideoFrame.Format_ARGB32,
+  QtMultimedia.QVideoFrame.Format_ARGB32_Premultiplied,
+  QtMultimedia.QVideoFrame.Format_RGB565,
+  QtMultimedia.QVideoFrame.Format_RGB555,
+)
+
+class FrameRecord(typing.NamedTuple):
+  # one presented frame, times in ms. pts is the frame's own timestamp,
+  # jitter how much later than its timestamp said it came on screen
+  at: float
+  pts: float
+  interval: float
+  jitter: float
+  late: bool
+  dropped: int
+  cost_us: float
+
+def frameArray(frame: QtMultimedia.QVideoFrame):
+  # a numpy view of a mapped packed RGB frame as height x width x bytes
+  # per pixel, without copying. Only valid while the frame stays mapped
+  import numpy
+  bits = frame.bits()
+  bits.setsize(frame.mappedBytes())
+  data = numpy.frombuffer(bits, dtype=numpy.uint8)
+  bytes_per_pixel = 2 if frame.pixelFormat() in (QtMultimedia.QVideoFrame.Format_RGB565,
+                                                 QtMultimedia.QVideoFrame.Format_RGB555) else 4
+  return numpy.lib.stride_tricks.as_strided(
+    data, shape=(frame.height(), frame.width(), bytes_per_pixel),
+    strides=(frame.bytesPerLine(), bytes_per_pixel, 1), writeable=False)
+
+class FrameStatsSurface(QtMultimedia.QAbstractVideoSurface):
+  # a video surface that takes frames in system memory and timestamps
+  # every one: presented, late (on screen later than its timestamp says),
+  # dropped (timestamp gaps) and stalled (nothing for stall_ms while
+  # playing), plus interval and jitter histograms and a bounded per frame
+  # log. It keeps the last frame for whoever draws it, nothing is
+  # rendered here so it also works without a window
+  frameReady = QtCore.pyqtSignal()
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None, log_size: int = 20000,
+               stall_ms: float = 250.0) -> None:
+    super().__init__(parent)
+    self.log_size = log_size
+    self.stall_ms = stall_ms
+    self.playback_rate = 1.0
+    self.current_frame = None
+    self.image_format = None
+    self.hooks = []
+    self.reset()
+
+  def reset(self):
+    self.presented = 0
+    self.late = 0
+    self.dropped = 0
+    self.stalls = 0
+    self.interval_histogram = array.array("I", [0] * (len(HISTOGRAM_EDGES_MS) + 1))
+    self.jitter_histogram = array.array("I", [0] * (len(HISTOGRAM_EDGES_MS) + 1))
+    self.log = collections.deque(maxlen=self.log_size)
+    self.started = time.perf_counter()
+    self.resetTiming()
+
+  def resetTiming(self):
+    # pauses, seeks and rate changes break the timing, the next frame
+    # starts over instead of counting as late or stalled
+    self.last_wall = None
+    self.last_pts = None
+    self.frame_duration = None
+
+  def setPlaybackRate(self, rate: float):
+    self.playback_rate = rate if rate > 0 else 1.0
+    self.resetTiming()
+
+  def addFrameHook(self, hook: typing.Callable[[typing.Any, QtMultimedia.QVideoFrame], None]):
+    # hook(view, frame) is called for every frame with frameArray's view
+    # while the frame is mapped. It must not keep the view around
+    self.hooks.append(hook)
+
+  def removeFrameHook(self, hook: typing.Callable):
+    self.hooks.remove(hook)
+
+  def supportedPixelFormats(self, handle_type=QtMultimedia.QAbstractVideoBuffer.NoHandle):
+    if handle_type == QtMultimedia.QAbstractVideoBuffer.NoHandle:
+      return list(PIXEL_FORMATS)
+    return []
+
+  def start(self, format: QtMultimedia.QVideoSurfaceFormat) -> bool:
+    image_format = QtMultimedia.QVideoFrame.imageFormatFromPixelFormat(format.pixelFormat())
+    if format.handleType() != QtMultimedia.QAbstractVideoBuffer.NoHandle or \
+       format.pixelFormat() not in PIXEL_FORMATS:
+      return False
+    self.image_format = image_format
+    self.resetTiming()
+    return super().start(format)
+
+  def stop(self):
+    self.current_frame = None
+    self.resetTiming()
+    super().stop()
+    self.frameReady.emit()
+
+  def present(self, frame: QtMultimedia.QVideoFrame) -> bool:
+    begin = time.perf_counter()
+    if len(self.hooks) != 0 and frame.map(QtMultimedia.QAbstractVideoBuffer.ReadOnly):
+      try:
+        view = frameArray(frame)
+        for hook in self.hooks:
+          hook(view, frame)
+      finally:
+        frame.unmap()
+    self.current_frame = QtMultimedia.QVideoFrame(frame)
+    self.frameReady.emit()
+    self.record(begin, frame.startTime(), frame.endTime(), time.perf_counter() - begin)
+    return True
+
+  def record(self, now: float, start_us: int, end_us: int, cost: float):
+    self.presented += 1
+    pts = start_us / 1000 if start_us >= 0 else -1.0
+    if end_us > start_us >= 0:
+      self.frame_duration = (end_us - start_us) / 1000
+    elif self.frame_duration is None:
+      rate = self.surfaceFormat().frameRate()
+      if rate > 0:
+        self.frame_duration = 1000 / rate
+
+    interval = jitter = 0.0
+    late = False
+    dropped = 0
+    if self.last_wall is not None:
+      interval = (now - self.last_wall) * 1000
+      self.interval_histogram[bisect.bisect_left(HISTOGRAM_EDGES_MS, interval)] += 1
+      media_interval = (pts - self.last_pts) / self.playback_rate if pts >= 0 and self.last_pts >= 0 else None
+      if media_interval is not None and 0 <= media_interval <= 1000:
+        jitter = interval - media_interval
+        self.jitter_histogram[bisect.bisect_left(HISTOGRAM_EDGES_MS, abs(jitter))] += 1
+        duration = self.frame_duration
+        if duration is not None and duration > 0:
+          late = jitter > max(duration / 2, 8.0)
+          # timestamps skipped whole frames, the decoder dropped them
+          frames = media_interval * self.playback_rate / duration
+          if frames > 1.5:
+            dropped = round(frames) - 1
+      if interval > self.stall_ms:
+        self.stalls += 1
+    self.late += late
+    self.dropped += dropped
+    self.last_wall = now
+    self.last_pts = pts
+    self.log.append(FrameRecord((now - self.started) * 1000, pts, interval, jitter, late, dropped, cost * 1e6))
+
+  def recentFps(self, window_ms: float = 1000.0) -> float:
+    if len(self.log) < 2:
+      return 0.0
+    last = self.log[-1].at
+    count = 0
+    for record in reversed(self.log):
+      if last - record.at > window_ms:
+        break
+      count += 1
+    return count * 1000 / window_ms
+
+  def summary(self) -> typing.Dict[str, typing.Any]:
+    jitters = sorted(abs(record.jitter) for record in self.log)
+    def percentile(p: float) -> float:
+      return jitters[min(len(jitters) - 1, int(p * len(jitters)))] if len(jitters) != 0 else 0.0
+    return {
+      "presented": self.presented,
+      "late": self.late,
+      "dropped": self.dropped,
+      "stalls": self.stalls,
+      "fps": self.recentFps(),
+      "jitter_p50_ms": percentile(0.50),
+      "jitter_p95_ms": percentile(0.95),
+      "jitter_max_ms": jitters[-1] if len(jitters) != 0 else 0.0,
+    }
+
+  def snapshot(self) -> typing.Dict[str, typing.Any]:
+    return {
+      "summary": self.summary(),
+      "histogram_edges_ms": list(HISTOGRAM_EDGES_MS),
+      "interval_histogram": list(self.interval_histogram),
+      "jitter_histogram": list(self.jitter_histogram),
+      "fields": list(FrameRecord._fields),
+      "frames": [list(record) for record in self.log],
+    }
+
+  def dump(self, path: str):
+    with open(path, "w") as f:
+      json.dump(self.snapshot(), f)
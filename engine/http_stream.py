@@ -0,0 +1,405 @@
+from PyQt5 import QtCore
+from model.chunk_cache import ChunkCache, StreamInfo
+import typing
+import collections
+import logging
+import re
+import threading
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+READ_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+
+# http.client pulls in the email package, it is only imported once
+# something is actually fetched
+http_client = None
+
+def loadHttpClient():
+  global http_client
+  if http_client is None:
+    import http.client as http_client
+  return http_client
+
+def isNetworkUrl(url: str) -> bool:
+  return url.startswith("http://") or url.startswith("https://")
+
+class StreamError(Exception):
+  # the server answered and retrying won't change the answer
+  pass
+
+class StreamFetcher(QtCore.QObject):
+  # downloads chunks of network streams into a ChunkCache on one pool
+  # thread. Requests are ranges of chunks per url, an urgent one (a stream
+  # waiting for data) goes first and takes over the connection. A request
+  # just past what the open connection is reading extends it instead, so
+  # steady playback stays on one connection. Dropped connections resume
+  # where they stopped. A stream the server gives no length for (chunked
+  # live radio) is never read, its info says so and the backend streams
+  # it itself
+  chunkReady = QtCore.pyqtSignal(str, int)
+  infoReady = QtCore.pyqtSignal(str, object)
+  fetchFailed = QtCore.pyqtSignal(str, str)
+
+  def __init__(self, cache: ChunkCache, parent: typing.Optional[QtCore.QObject] = None,
+               retries: int = 5, timeout: float = 10.0, prefetch_chunks: int = 2) -> None:
+    super().__init__(parent=parent)
+    self.cache = cache
+    self.retries = retries
+    self.timeout = timeout
+    self.prefetch_chunks = prefetch_chunks
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(1)
+    self.lock = threading.Lock()
+    # url -> (first, last, urgent)
+    self.queue = collections.OrderedDict()
+    self.running = False
+    self.cancel_event = threading.Event()
+    # [url, next index, last index] of the open connection
+    self.active = None
+    self.received_bytes = 0
+    self.connections = 0
+
+  def request(self, url: str, first: int, count: int, urgent: bool = True):
+    last = first + max(count, 1) - 1
+    with self.lock:
+      active = self.active
+      if active is not None and active[0] == url and active[1] <= first <= active[2] + 1:
+        active[2] = max(active[2], last)
+        self.queue.pop(url, None)
+        return
+      self.queue[url] = (first, last, urgent)
+      if urgent:
+        self.queue.move_to_end(url, last=False)
+      self.cancel_event.clear()
+      if self.running:
+        return
+      self.running = True
+    self.pool.start(self.work)
+
+  def prefetch(self, urls: typing.List[str]):
+    # the first chunks of upcoming items, only once nothing is waiting
+    for url in urls:
+      if not self.cache.has(url, 0) and not self.isLive(url):
+        self.request(url, 0, self.prefetch_chunks, urgent=False)
+
+  def isLive(self, url: str) -> bool:
+    # the server said before that it doesn't know the length
+    info = self.cache.info(url)
+    return info is not None and info.length < 0
+
+  def cancel(self):
+    with self.lock:
+      self.queue.clear()
+    self.cancel_event.set()
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def work(self):
+    while True:
+      with self.lock:
+        if len(self.queue) == 0:
+          self.running = False
+          return
+        url, (first, last, _) = self.queue.popitem(last=False)
+      try:
+        self.fetch(url, first, last)
+      except StreamError as e:
+        logger.warning("fetching %s failed: %s", url, e)
+        self.fetchFailed.emit(url, str(e))
+      finally:
+        with self.lock:
+          self.active = None
+
+  def preempted(self, url: str, whole: bool = False) -> bool:
+    # with the lock held: something waits that this connection won't
+    # serve. Without ranges a reconnect starts over at 0, reading on
+    # serves any request for the same url sooner
+    return self.cancel_event.is_set() or \
+           any((urgent and not (whole and queued == url)) or (queued == url and not whole)
+               for queued, (_, _, urgent) in self.queue.items())
+
+  def fetch(self, url: str, first: int, last: int):
+    loadHttpClient()
+    index = first
+    partial = bytearray()
+    attempt = 0
+    while True:
+      info = self.cache.info(url)
+      if len(partial) == 0:
+        while index <= last and self.cache.has(url, index):
+          index += 1
+      with self.lock:
+        if self.active is not None:
+          last = self.active[2]
+        if index > last or self.preempted(url):
+          return
+        self.active = [url, index, last]
+      if info is not None and index * self.cache.chunk_size >= info.length:
+        return
+      received = self.received_bytes
+      try:
+        index, done = self.readFrom(url, index, partial, info)
+        attempt = 0
+        if done:
+          return
+      except (OSError, http_client.HTTPException) as e:
+        if self.received_bytes != received:
+          # it got somewhere before dropping, resume right away
+          logger.info("connection to %s dropped (%s), resuming", url, e)
+          attempt = 0
+          continue
+        attempt += 1
+        if attempt > self.retries:
+          raise StreamError(str(e))
+        logger.info("connection to %s dropped (%s), retry %d", url, e, attempt)
+        # backs off, a cancel ends the wait early
+        if self.cancel_event.wait(min(0.25 * 2 ** (attempt - 1), 4.0)):
+          return
+
+  def connect(self, url: str, start: int, info: typing.Optional[StreamInfo]):
+    headers = {"Range": "bytes={}-".format(start)}
+    if info is not None and len(info.etag) != 0:
+      # a changed resource comes back whole instead of a mismatched range
+      headers["If-Range"] = info.etag
+    for _ in range(MAX_REDIRECTS):
+      parts = urllib.parse.urlsplit(url)
+      connection_class = http_client.HTTPSConnection if parts.scheme == "https" else http_client.HTTPConnection
+      connection = connection_class(parts.hostname, parts.port, timeout=self.timeout)
+      path = (parts.path or "/") + ("?" + parts.query if len(parts.query) != 0 else "")
+      connection.request("GET", path, headers=headers)
+      self.connections += 1
+      response = connection.getresponse()
+      if response.status in (301, 302, 303, 307, 308) and response.getheader("Location") is not None:
+        url = urllib.parse.urljoin(url, response.getheader("Location"))
+        connection.close()
+        continue
+      return connection, response
+    raise StreamError("too many redirects")
+
+  def readFrom(self, url: str, index: int, partial: bytearray,
+               info: typing.Optional[StreamInfo]) -> typing.Tuple[int, bool]:
+    # reads chunks from `index` (plus what `partial` already holds of it)
+    # on one connection, returns the next index and whether the request
+    # is done. Raises on a dropped connection, partial keeps what arrived
+    chunk_size = self.cache.chunk_size
+    connection, response = self.connect(url, index * chunk_size + len(partial), info)
+    try:
+      if response.status == 416:
+        return index, True
+      if response.status == 206:
+        match = CONTENT_RANGE.match(response.getheader("Content-Range", ""))
+        if match is None:
+          raise StreamError("bad Content-Range {!r}".format(response.getheader("Content-Range")))
+        position = int(match.group(1))
+        length = int(match.group(3)) if match.group(3) != "*" else -1
+      elif response.status == 200:
+        # no ranges here, or the resource changed: it starts over at 0
+        # and is read to the end
+        position = 0
+        length = int(response.getheader("Content-Length", "-1"))
+        index = 0
+        partial.clear()
+      else:
+        raise StreamError("HTTP {} {}".format(response.status, response.reason))
+
+      new_info = StreamInfo(length, response.getheader("ETag", ""), response.getheader("Last-Modified", ""))
+      if self.cache.setInfo(url, new_info):
+        self.infoReady.emit(url, self.cache.info(url))
+      if length < 0:
+        # endless or of unknown size, reading it through the cache would
+        # only churn it
+        return index, True
+
+      whole = response.status == 200
+      while True:
+        with self.lock:
+          if self.preempted(url, whole):
+            return index, True
+          if self.active is not None:
+            if index > self.active[2] and not whole:
+              return index, True
+            self.active[1] = index
+        if len(partial) == 0 and response.status == 206 and self.cache.has(url, index):
+          # the rest is on disk already up to some point, reconnect after it
+          return index, False
+        data = response.read(min(READ_SIZE, chunk_size - len(partial)))
+        if len(data) == 0:
+          if length >= 0 and position < length:
+            raise http_client.IncompleteRead(bytes(partial), length - position)
+          if len(partial) != 0:
+            self.store(url, index, partial)
+            index += 1
+          return index, True
+        partial += data
+        position += len(data)
+        self.received_bytes += len(data)
+        if len(partial) == chunk_size or position == length:
+          if response.status == 200 and self.cache.has(url, index):
+            partial.clear()
+          else:
+            self.store(url, index, partial)
+          index += 1
+          if position == length:
+            return index, True
+    finally:
+      connection.close()
+
+  def store(self, url: str, index: int, partial: bytearray):
+    self.cache.put(url, index, bytes(partial))
+    partial.clear()
+    self.chunkReady.emit(url, index)
+
+class HttpStream(QtCore.QIODevice):
+  # a random access QIODevice over a network stream for QMediaPlayer.
+  # Reads are served from the chunk cache and never block: a missing chunk
+  # reads as nothing for now and readyRead follows once it arrives.
+  # Reading keeps `readahead` chunks ahead of the position on their way
+  ready = QtCore.pyqtSignal()
+  # the server doesn't know the length, there's nothing to serve ranges
+  # of and the url should go to the backend as is
+  live = QtCore.pyqtSignal()
+  failed = QtCore.pyqtSignal(str)
+  bufferStatusChanged = QtCore.pyqtSignal(int)
+
+  def __init__(self, url: str, fetcher: StreamFetcher, parent: typing.Optional[QtCore.QObject] = None,
+               readahead: int = 8) -> None:
+    super().__init__(parent)
+    self.url = url
+    self.fetcher = fetcher
+    self.cache = fetcher.cache
+    self.chunk_size = self.cache.chunk_size
+    self.readahead = max(1, readahead)
+    # the last chunks read, gstreamer reads a few KiB at a time
+    self.chunks = collections.OrderedDict()
+    self.requested = None
+    self.waiting = False
+    self.buffer_status = -1
+    # connected before looking at the cache, a fetch in between still
+    # gets through
+    fetcher.chunkReady.connect(self.chunkReady)
+    fetcher.infoReady.connect(self.infoReady)
+    fetcher.fetchFailed.connect(self.fetchFailed)
+    info = self.cache.info(url)
+    self.length = info.length if info is not None else -1
+    self.open(QtCore.QIODevice.ReadOnly | QtCore.QIODevice.Unbuffered)
+    self.requestWindow(0)
+
+  def isReady(self) -> bool:
+    return self.length >= 0
+
+  def isSequential(self) -> bool:
+    return False
+
+  def size(self) -> int:
+    return max(self.length, 0)
+
+  def atEnd(self) -> bool:
+    return self.length >= 0 and self.pos() >= self.length
+
+  def close(self):
+    for signal, slot in ((self.fetcher.chunkReady, self.chunkReady), (self.fetcher.infoReady, self.infoReady),
+                         (self.fetcher.fetchFailed, self.fetchFailed)):
+      try:
+        signal.disconnect(slot)
+      except TypeError:
+        pass
+    self.chunks.clear()
+    super().close()
+
+  def seek(self, pos: int) -> bool:
+    if not super().seek(pos):
+      return False
+    self.requestWindow(pos // self.chunk_size)
+    return True
+
+  def chunk(self, index: int) -> typing.Optional[bytes]:
+    data = self.chunks.get(index, None)
+    if data is None:
+      data = self.cache.get(self.url, index)
+      if data is None:
+        return None
+      self.chunks[index] = data
+      while len(self.chunks) > 2:
+        self.chunks.popitem(last=False)
+    return data
+
+  def hasChunk(self, index: int) -> bool:
+    return index in self.chunks or self.cache.has(self.url, index)
+
+  def bytesAvailable(self) -> int:
+    pos = self.pos()
+    if self.length < 0 or pos >= self.length or not self.hasChunk(pos // self.chunk_size):
+      return super().bytesAvailable()
+    end = min((pos // self.chunk_size + 1) * self.chunk_size, self.length)
+    return end - pos + super().bytesAvailable()
+
+  def readData(self, max_size: int) -> bytes:
+    pos = self.pos()
+    if self.length < 0 or pos >= self.length:
+      return b""
+    index, offset = divmod(pos, self.chunk_size)
+    self.requestWindow(index)
+    data = self.chunk(index)
+    if data is None:
+      self.waiting = True
+      return b""
+    return data[offset:offset + max_size]
+
+  def requestWindow(self, index: int):
+    # only once half the window ahead is used up, so it is refilled in
+    # runs instead of one connection per chunk
+    if self.requested == index:
+      return
+    self.requested = index
+    end = index + self.readahead
+    if self.length >= 0:
+      end = min(end, (self.length + self.chunk_size - 1) // self.chunk_size)
+    ahead = index
+    while ahead < end and self.hasChunk(ahead):
+      ahead += 1
+    if ahead == index or (ahead < end and ahead - index < (self.readahead + 1) // 2):
+      self.fetcher.request(self.url, index, self.readahead)
+    self.updateBufferStatus()
+
+  def updateBufferStatus(self):
+    first = self.pos() // self.chunk_size
+    last = first + self.readahead
+    if self.length >= 0:
+      last = min(last, (self.length + self.chunk_size - 1) // self.chunk_size)
+    present = sum(1 for index in range(first, last) if self.hasChunk(index))
+    status = 100 * present // max(last - first, 1)
+    if status != self.buffer_status:
+      self.buffer_status = status
+      self.bufferStatusChanged.emit(status)
+
+  def chunkReady(self, url: str, index: int):
+    if url != self.url:
+      return
+    self.updateBufferStatus()
+    if self.waiting and index == self.pos() // self.chunk_size:
+      self.waiting = False
+      self.readyRead.emit()
+
+  def infoReady(self, url: str, info: StreamInfo):
+    if url != self.url:
+      return
+    if self.length >= 0 and info.length != self.length:
+      self.fetchFailed(url, "the stream changed on the server")
+      return
+    if info.length < 0:
+      self.live.emit()
+      return
+    was_ready = self.isReady()
+    self.length = info.length
+    if not was_ready:
+      self.ready.emit()
+
+  def fetchFailed(self, url: str, message: str):
+    if url != self.url:
+      return
+    self.setErrorString(message)
+    self.failed.emit(message)
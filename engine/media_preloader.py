@@ -0,0 +1,59 @@
+from PyQt5 import QtCore, QtMultimedia
+import typing
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MediaPreloader(QtCore.QObject):
+  # keeps up to `horizon` standby QMediaPlayers that already loaded (and
+  # prerolled) the upcoming playlist items, so switching to one of them
+  # is a swap instead of a cold load
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None, horizon: int = 1) -> None:
+    super().__init__(parent=parent)
+    self.horizon = max(0, horizon)
+    self.standby = {}
+    self.spare = []
+
+  def setHorizon(self, horizon: int):
+    self.horizon = max(0, horizon)
+    for url in list(self.standby.keys())[self.horizon:]:
+      self.release(self.standby.pop(url))
+
+  def isEnabled(self) -> bool:
+    return self.horizon > 0
+
+  def preload(self, urls: typing.List[str]):
+    urls = [url for url in urls[:self.horizon] if len(url) != 0]
+    for url in list(self.standby.keys()):
+      if url not in urls:
+        self.release(self.standby.pop(url))
+    for url in urls:
+      if url in self.standby:
+        continue
+      player = self.spare.pop() if len(self.spare) != 0 else QtMultimedia.QMediaPlayer(self)
+      player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl(url)))
+      # pausing makes the backend preroll the first buffers without
+      # producing any sound
+      player.pause()
+      self.standby[url] = player
+      logger.debug("preloading %s", url)
+
+  def take(self, url: str) -> typing.Optional[QtMultimedia.QMediaPlayer]:
+    player = self.standby.pop(url, None)
+    if player is not None and player.mediaStatus() == QtMultimedia.QMediaPlayer.InvalidMedia:
+      self.release(player)
+      return None
+    return player
+
+  def release(self, player: QtMultimedia.QMediaPlayer):
+    player.stop()
+    player.setMedia(QtMultimedia.QMediaContent())
+    if len(self.spare) < self.horizon:
+      self.spare.append(player)
+    else:
+      player.deleteLater()
+
+  def clear(self):
+    for player in self.standby.values():
+      self.release(player)
+    self.standby.clear()
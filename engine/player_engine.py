@@ -0,0 +1,637 @@
+from __future__ import annotations
+from model.playlist_store import PlaylistStore
+from model.playlist_loader import PlaylistLoader
+from model.session import SessionState, saveSession, loadSession
+from model.keyframe_index import KeyframeIndex
+from model.audio_analysis import AudioAnalyzer, REFERENCE_LOUDNESS
+from model.media_library import MediaLibrary
+from engine.seek_controller import SeekController
+from engine.frame_ring import FrameStepper
+from engine.qoe_recorder import QoeRecorder
+from model.qoe_store import QoeStore
+from engine.http_stream import StreamFetcher, HttpStream, isNetworkUrl
+from model.chunk_cache import ChunkCache
+from PyQt5 import QtCore
+import typing
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# QtMultimedia pulls in the platform media stack, it is only imported
+# once the player backend is actually needed
+QtMultimedia = None
+
+def loadMultimedia():
+  global QtMultimedia
+  if QtMultimedia is None:
+    from PyQt5 import QtMultimedia
+  return QtMultimedia
+
+class PlayerEngine(QtCore.QObject):
+  # playback without any widgets: the playlist and how it advances, the
+  # media player with its standby players, seeking, loudness, the session
+  # and the library. A view listens to the signals and calls the slots,
+  # headless runs drive it directly
+  backendCreated = QtCore.pyqtSignal()
+  backendUnavailable = QtCore.pyqtSignal()
+  durationChanged = QtCore.pyqtSignal(int)
+  positionChanged = QtCore.pyqtSignal(int)
+  stateChanged = QtCore.pyqtSignal(int)
+  mediaStatusChanged = QtCore.pyqtSignal(int)
+  busyChanged = QtCore.pyqtSignal(bool)
+  mediaFinished = QtCore.pyqtSignal()
+  videoAvailableChanged = QtCore.pyqtSignal(bool)
+  trackInfoChanged = QtCore.pyqtSignal(str)
+  statusInfoChanged = QtCore.pyqtSignal(str)
+  errorOccurred = QtCore.pyqtSignal(str)
+  volumeChanged = QtCore.pyqtSignal(int)
+  mutedChanged = QtCore.pyqtSignal(bool)
+  playbackRateChanged = QtCore.pyqtSignal(float)
+  envelopeChanged = QtCore.pyqtSignal(object)
+  trackSwitched = QtCore.pyqtSignal(float, bool)
+  firstFrame = QtCore.pyqtSignal(float)
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None, preload_horizon: int = 1,
+               started_at: typing.Optional[float] = None, session_path: typing.Optional[str] = None,
+               seek_interval: int = 150,
+               loudness_target: typing.Optional[float] = REFERENCE_LOUDNESS,
+               library_path: typing.Optional[str] = None, profiler=None,
+               stream_cache_bytes: int = 0, stream_cache_dir: typing.Optional[str] = None,
+               frame_cache_bytes: int = 0, qoe_path: typing.Optional[str] = None) -> None:
+    super().__init__(parent=parent)
+    # handlers are connected through the profiler's slot wrapper when
+    # there is one
+    self.slot = profiler.slot if profiler is not None else lambda func, name=None: func
+    # startup times are measured from here unless the caller knows better
+    self.started_at = started_at if started_at is not None else time.perf_counter()
+    self.first_frame_pending = True
+    self.status_info = ""
+    self.preload_horizon = preload_horizon
+    self.switch_started = None
+    self.switch_preloaded = False
+    # the playlist and position are saved here on shutdown and restored
+    # by start, None disables it
+    self.session_path = session_path
+    self.session = None
+    self.pending_position = None
+    # LUFS every audio track is brought to, None plays them as they are
+    self.loudness_target = loudness_target
+    # what the user picked, the player gets volume times gain
+    self.volume_level = 100
+    self.gain = 1.0
+    self.muted = False
+    self.rate = 1.0
+    self.video_output = None
+
+    slot = self.slot
+    # the media player and the preloader are created by ensureBackend
+    # on first use
+    self.player = None
+    self.preloader = None
+    self.play_list = PlaylistStore(self)
+    self.playlist_loader = PlaylistLoader(self.play_list, self)
+    self.play_list.currentIndexChanged.connect(slot(self.playlistPositionChanged))
+    self.play_list.currentIndexShifted.connect(slot(self.playlistPositionShifted))
+
+    # the upcoming items change whenever the playlist around the current
+    # item does, recompute them once per event loop pass
+    self.preload_timer = QtCore.QTimer(self)
+    self.preload_timer.setSingleShot(True)
+    self.preload_timer.setInterval(0)
+    self.preload_timer.timeout.connect(slot(self.updatePreload))
+    # QTimer.start would take a signal's first row for its interval
+    schedule = lambda *_: self.preload_timer.start()
+    self.play_list.mediaInserted.connect(schedule)
+    self.play_list.mediaRemoved.connect(schedule)
+    self.play_list.mediaRunsRemoved.connect(schedule)
+    self.play_list.mediaChanged.connect(schedule)
+    self.play_list.playbackModeChanged.connect(schedule)
+
+    self.keyframe_index = KeyframeIndex(self)
+    self.seek_controller = SeekController(self.keyframe_index, self, seek_interval)
+    # steps and loops, from decoded frames kept in memory once a view
+    # hands it a surface
+    self.frame_stepper = FrameStepper(self, frame_cache_bytes)
+
+    self.audio_analyzer = AudioAnalyzer(self)
+    self.audio_analyzer.analysisReady.connect(slot(self.analysisReady))
+
+    # index of the watched library folders, None disables library mode
+    self.library = None
+    if library_path is not None:
+      self.library = MediaLibrary(library_path, self)
+      self.library.filesAdded.connect(slot(self.libraryFilesAdded))
+      self.library.filesRemoved.connect(slot(self.libraryFilesRemoved))
+      self.library.filesMoved.connect(slot(self.libraryFilesMoved))
+
+    # http(s) media is read through a disk backed read-ahead cache when
+    # it has a budget, otherwise the backend streams it itself
+    self.stream_fetcher = None
+    self.stream = None
+    self.stream_play_pending = False
+    if stream_cache_bytes > 0:
+      self.stream_fetcher = StreamFetcher(ChunkCache(stream_cache_dir, stream_cache_bytes), self)
+
+    # playback metrics per item go here, None records nothing
+    self.qoe = None
+    if qoe_path is not None:
+      self.qoe = QoeRecorder(self, QoeStore(qoe_path))
+
+  def start(self, lazy_backend: bool = True):
+    # separate from the constructor so views can connect first
+    if self.session_path is not None:
+      self.restoreSession()
+    if self.library is not None:
+      # a restored playlist already holds the library, only the changes
+      # since the last run are applied to it
+      self.library.start(emit_known=self.play_list.mediaCount() == 0)
+    if not lazy_backend:
+      self.ensureBackend()
+
+  def shutdown(self):
+    self.playlist_loader.cancel()
+    self.playlist_loader.wait()
+    self.audio_analyzer.cancel()
+    self.audio_analyzer.wait()
+    if self.library is not None:
+      self.library.cancel()
+      self.library.wait()
+    if self.preloader is not None:
+      self.preloader.clear()
+    if self.stream_fetcher is not None:
+      self.stream_fetcher.cancel()
+      self.stream_fetcher.wait()
+      self.replaceStream(None)
+    if self.qoe is not None:
+      self.qoe.close()
+    if self.session_path is not None:
+      self.saveSession()
+
+  def ensureBackend(self):
+    if self.player is not None:
+      return
+    begin = time.perf_counter()
+    loadMultimedia()
+    from engine.media_preloader import MediaPreloader
+
+    self.player = QtMultimedia.QMediaPlayer(self)
+    self.preloader = MediaPreloader(self, self.preload_horizon)
+    if self.video_output is not None:
+      self.player.setVideoOutput(self.video_output)
+    # views hook their video output up here, before anything is loaded
+    self.backendCreated.emit()
+    self.seek_controller.setPlayer(self.player)
+
+    # volume and friends may have been set before there was a player
+    self.player.setVolume(self.outputVolume())
+    self.player.setMuted(self.muted)
+    self.player.setPlaybackRate(self.rate)
+    self.connectPlayer(self.player)
+    self.stateChanged.emit(self.player.state())
+
+    if not self.player.isAvailable():
+      self.backendUnavailable.emit()
+
+    self.metaDataChanged()
+    if self.play_list.currentIndex() != -1:
+      self.playlistPositionChanged(self.play_list.currentIndex())
+    self.preload_timer.start()
+    logger.info("media backend created in %.1f ms", (time.perf_counter() - begin) * 1000)
+
+  def setVideoOutput(self, output):
+    self.video_output = output
+    if self.player is not None:
+      self.player.setVideoOutput(output)
+
+  def connectPlayer(self, player: QtMultimedia.QMediaPlayer):
+    slot = self.slot
+    player.durationChanged.connect(self.durationChanged)
+    player.positionChanged.connect(slot(self.onPositionChanged))
+    player.metaDataChanged.connect(slot(self.metaDataChanged))
+    player.mediaStatusChanged.connect(slot(self.statusChanged))
+    player.bufferStatusChanged.connect(slot(self.bufferingProgress))
+    player.videoAvailableChanged.connect(self.videoAvailableChanged)
+    player.error.connect(slot(self.displayErrorMessage))
+    player.stateChanged.connect(self.stateChanged)
+
+  def disconnectPlayer(self, player: QtMultimedia.QMediaPlayer):
+    slot = self.slot
+    player.durationChanged.disconnect(self.durationChanged)
+    player.positionChanged.disconnect(slot(self.onPositionChanged))
+    player.metaDataChanged.disconnect(slot(self.metaDataChanged))
+    player.mediaStatusChanged.disconnect(slot(self.statusChanged))
+    player.bufferStatusChanged.disconnect(slot(self.bufferingProgress))
+    player.videoAvailableChanged.disconnect(self.videoAvailableChanged)
+    player.error.disconnect(slot(self.displayErrorMessage))
+    player.stateChanged.disconnect(self.stateChanged)
+
+  def swapPlayer(self, player: QtMultimedia.QMediaPlayer):
+    # hand the video output and all wiring over to an already loaded
+    # standby player, the old one goes back to the preloader
+    old_player = self.player
+    self.disconnectPlayer(old_player)
+    old_player.stop()
+
+    player.setVolume(old_player.volume())
+    player.setMuted(old_player.isMuted())
+    player.setPlaybackRate(old_player.playbackRate())
+    if self.video_output is not None:
+      player.setVideoOutput(self.video_output)
+    self.player = player
+    self.seek_controller.setPlayer(player)
+    self.connectPlayer(player)
+    self.preloader.release(old_player)
+
+    # the new player is past the signals a cold load would have sent
+    self.durationChanged.emit(player.duration())
+    self.onPositionChanged(player.position())
+    self.statusChanged(player.mediaStatus())
+    self.videoAvailableChanged.emit(player.isVideoAvailable())
+    self.stateChanged.emit(player.state())
+    self.metaDataChanged()
+
+  def updatePreload(self):
+    if self.preloader is None:
+      return
+    if not self.preloader.isEnabled() or self.play_list.currentIndex() == -1:
+      self.preloader.clear()
+      return
+    urls = self.upcomingUrls(self.preloader.horizon)
+    if self.stream_fetcher is not None:
+      # standby players would download on their own, the cache gets the
+      # first chunks instead
+      self.stream_fetcher.prefetch([url for url in urls if isNetworkUrl(url)])
+      urls = [url for url in urls if not isNetworkUrl(url)]
+    self.preloader.preload(urls)
+
+  def upcomingUrls(self, count: int) -> typing.List[str]:
+    urls = []
+    current_item = self.play_list.currentIndex()
+    for steps in range(1, count + 1):
+      index = self.play_list.nextIndex(steps)
+      if index == -1 or index == current_item:
+        break
+      urls.append(self.play_list.url(index))
+    return urls
+
+  def addToPlaylist(self, urls: typing.List[QtCore.QUrl]):
+    # path checks, folder walks and playlist parsing happen on a worker
+    # thread, results arrive as batches that are inserted in one range
+    self.playlist_loader.start(urls)
+
+  def play(self):
+    self.ensureBackend()
+    self.frame_stepper.resume()
+    if self.stream is not None and not self.stream.isReady():
+      self.stream_play_pending = True
+    self.player.play()
+
+  def pause(self):
+    self.stream_play_pending = False
+    if self.player is not None:
+      self.player.pause()
+
+  def stop(self):
+    self.stream_play_pending = False
+    if self.player is not None:
+      self.frame_stepper.reset()
+      self.player.stop()
+
+  def state(self) -> int:
+    return self.player.state() if self.player is not None else 0
+
+  def position(self) -> int:
+    return self.player.position() if self.player is not None else 0
+
+  def duration(self) -> int:
+    return self.player.duration() if self.player is not None else 0
+
+  def jump(self, row: int):
+    self.play_list.setCurrentIndex(row)
+    self.play()
+
+  def next(self):
+    self.play_list.next()
+
+  def previous(self):
+    # Go to previous track if we are within the first 5 seconds of playback
+    # Otherwise, seek to the beginning.
+    if self.player is None or self.player.position() <= 5000:
+      self.play_list.previous()
+    else:
+      self.player.setPosition(0)
+
+  def seek(self, position: int):
+    self.frame_stepper.reset()
+    self.seek_controller.commit(position)
+
+  def stepFrame(self, direction: int):
+    self.ensureBackend()
+    self.frame_stepper.step(direction)
+
+  def volume(self) -> int:
+    return self.volume_level
+
+  def setVolume(self, volume: int):
+    if volume == self.volume_level:
+      return
+    self.volume_level = volume
+    self.applyVolume()
+    self.volumeChanged.emit(volume)
+
+  def setGain(self, gain_db: float):
+    gain = 10 ** (gain_db / 20)
+    if gain != self.gain:
+      self.gain = gain
+      self.applyVolume()
+
+  def outputVolume(self) -> int:
+    # what the player gets. The player can't go above 100, so quiet
+    # tracks only get louder as far as the volume leaves room
+    return min(max(round(self.volume_level * self.gain), 0), 100)
+
+  def applyVolume(self):
+    if self.player is not None:
+      self.player.setVolume(self.outputVolume())
+
+  def isMuted(self) -> bool:
+    return self.muted
+
+  def setMuted(self, muted: bool):
+    if muted == self.muted:
+      return
+    self.muted = muted
+    if self.player is not None:
+      self.player.setMuted(muted)
+    self.mutedChanged.emit(muted)
+
+  def playbackRate(self) -> float:
+    return self.rate
+
+  def setPlaybackRate(self, rate: float):
+    if rate == self.rate:
+      return
+    self.rate = rate
+    if self.player is not None:
+      self.player.setPlaybackRate(rate)
+    self.playbackRateChanged.emit(rate)
+
+  def restoreSession(self):
+    begin = time.perf_counter()
+    try:
+      session = loadSession(self.session_path)
+    except FileNotFoundError:
+      return
+    except (OSError, ValueError) as e:
+      logger.warning("could not restore session: %s", e)
+      return
+    # the playlist columns are views into the mapped file until edited,
+    # rows are only decoded when something reads them
+    self.session = session
+    state = session.state
+    self.play_list.setPlaybackMode(state.playback_mode)
+    self.play_list.setColumns(session.urls, session.titles, session.durations)
+    self.setVolume(state.volume)
+    self.setMuted(state.muted)
+    self.setPlaybackRate(state.rate)
+    if state.current_index != -1:
+      self.pending_position = (self.play_list.url(state.current_index), state.position)
+      self.play_list.setCurrentIndex(state.current_index)
+    logger.info("restored %d items in %.1f ms", self.play_list.mediaCount(), (time.perf_counter() - begin) * 1000)
+
+  def saveSession(self):
+    current_index = self.play_list.currentIndex()
+    if self.pending_position is not None:
+      position = self.pending_position[1]
+    elif self.player is not None and current_index != -1:
+      position = self.player.position()
+    else:
+      position = 0
+    state = SessionState(
+      current_index=current_index,
+      position=position,
+      volume=self.volume_level,
+      muted=self.muted,
+      rate=self.rate,
+      playback_mode=self.play_list.playbackMode(),
+    )
+    # the mapping has to go before the file is replaced
+    if self.session is not None:
+      self.play_list.materialize()
+      self.session.close()
+      self.session = None
+    try:
+      saveSession(self.session_path, self.play_list, state)
+    except OSError as e:
+      logger.warning("could not save session: %s", e)
+
+  def libraryFilesAdded(self, urls: typing.List[str]):
+    self.play_list.addMedia(urls)
+
+  def libraryFilesRemoved(self, urls: typing.List[str]):
+    self.play_list.removeMediaRows(self.play_list.findMedia(urls).values())
+
+  def libraryFilesMoved(self, old_urls: typing.List[str], new_urls: typing.List[str]):
+    rows = self.play_list.findMedia(old_urls)
+    moved = [(rows[old_url], new_url) for old_url, new_url in zip(old_urls, new_urls) if old_url in rows]
+    self.play_list.replaceMediaRows([row for row, _ in moved], [url for _, url in moved],
+                                    durations=[self.play_list.duration(row) for row, _ in moved])
+
+  def onPositionChanged(self, progress: int):
+    self.seek_controller.positionChanged(progress)
+    if self.first_frame_pending and progress > 0:
+      # the backend is producing output, closest we get to a frame on screen
+      self.first_frame_pending = False
+      elapsed = (time.perf_counter() - self.started_at) * 1000
+      logger.info("first frame after %.1f ms", elapsed)
+      self.firstFrame.emit(elapsed)
+    self.positionChanged.emit(progress)
+
+  def metaDataChanged(self):
+    if self.player is not None and self.player.isMetaDataAvailable():
+      self.trackInfoChanged.emit("{} - {}".format(
+        self.player.metaData(QtMultimedia.QMediaMetaData.AlbumArtist),
+        self.player.metaData(QtMultimedia.QMediaMetaData.Title),
+      ))
+
+  def playlistPositionChanged(self, current_item: int):
+    # rows shift with edits, the restored position belongs to the url
+    if self.pending_position is not None and \
+       (current_item == -1 or self.play_list.url(current_item) != self.pending_position[0]):
+      self.pending_position = None
+    self.updateAnalysis(current_item)
+    self.frame_stepper.mediaChanged()
+    if self.player is None:
+      # nothing to load into yet, ensureBackend picks the current item up
+      return
+    was_playing = self.player.state() == QtMultimedia.QMediaPlayer.PlayingState
+    if self.qoe is not None:
+      # before the new media, its first status changes already count
+      if current_item == -1:
+        self.qoe.finish()
+      else:
+        self.qoe.begin(self.play_list.url(current_item), was_playing)
+    if current_item == -1:
+      self.seek_controller.setMedia("")
+      self.player.setMedia(QtMultimedia.QMediaContent())
+      self.replaceStream(None)
+    else:
+      url = self.play_list.url(current_item)
+      self.seek_controller.setMedia(url)
+      standby = self.preloader.take(url)
+      self.switch_started = time.perf_counter()
+      self.switch_preloaded = standby is not None
+      if standby is not None:
+        self.swapPlayer(standby)
+        self.replaceStream(None)
+      elif self.stream_fetcher is not None and isNetworkUrl(url) and not self.stream_fetcher.isLive(url):
+        self.openStream(url, was_playing)
+        was_playing = was_playing and self.stream.isReady()
+      else:
+        self.player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl(url)))
+        self.replaceStream(None)
+      if was_playing:
+        self.player.play()
+    self.preload_timer.start()
+
+  def playlistPositionShifted(self, current_item: int):
+    # same item at another row, it keeps playing. Only the upcoming ones
+    # may differ now
+    self.preload_timer.start()
+
+  def openStream(self, url: str, play: bool):
+    # the player reads the new stream once its length is known, right
+    # away when the cache has seen it before
+    stream = HttpStream(url, self.stream_fetcher, self)
+    stream.failed.connect(self.slot(self.streamFailed))
+    stream.live.connect(self.slot(self.streamLive))
+    stream.bufferStatusChanged.connect(self.slot(self.streamBuffering))
+    self.stream_play_pending = play and not stream.isReady()
+    if stream.isReady():
+      self.player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl(url)), stream)
+    else:
+      self.player.setMedia(QtMultimedia.QMediaContent())
+      stream.ready.connect(self.slot(self.streamReady))
+    self.replaceStream(stream)
+
+  def replaceStream(self, stream: typing.Optional[HttpStream]):
+    # the old stream goes once the player no longer reads it
+    old, self.stream = self.stream, stream
+    if old is not None:
+      old.blockSignals(True)
+      old.close()
+      old.deleteLater()
+
+  def streamReady(self):
+    self.player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl(self.stream.url)), self.stream)
+    if self.stream_play_pending:
+      self.player.play()
+    self.stream_play_pending = False
+
+  def streamLive(self):
+    # no length to serve ranges of, the backend streams it itself
+    self.player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl(self.stream.url)))
+    self.replaceStream(None)
+    if self.stream_play_pending:
+      self.player.play()
+    self.stream_play_pending = False
+
+  def streamFailed(self, message: str):
+    self.stream_play_pending = False
+    self.player.stop()
+    self.errorOccurred.emit(message)
+    self.setStatusInfo(message)
+
+  def streamBuffering(self, progress: int):
+    self.setStatusInfo("Buffering {}%".format(progress) if progress < 100 else "")
+
+  def updateAnalysis(self, current_item: int):
+    # the waveform and gain of the new item, or none until it is analysed.
+    # The upcoming items are analysed right after it
+    url = self.play_list.url(current_item) if current_item != -1 else ""
+    self.applyAnalysis(url)
+    if current_item == -1:
+      self.audio_analyzer.cancel()
+      return
+    self.audio_analyzer.request([url] + self.upcomingUrls(max(self.preload_horizon, 1)))
+
+  def applyAnalysis(self, url: str):
+    analysis = self.audio_analyzer.analysis(url) if len(url) != 0 else None
+    self.envelopeChanged.emit(analysis.envelope if analysis is not None else None)
+    if analysis is not None and self.loudness_target is not None:
+      self.setGain(analysis.gain(self.loudness_target))
+    else:
+      self.setGain(0.0)
+
+  def analysisReady(self, url: str):
+    current_item = self.play_list.currentIndex()
+    if current_item != -1 and self.play_list.url(current_item) == url:
+      self.applyAnalysis(url)
+
+  def statusChanged(self, status: QtMultimedia.QMediaPlayer.MediaStatus):
+    self.mediaStatusChanged.emit(int(status))
+    self.busyChanged.emit(status == QtMultimedia.QMediaPlayer.LoadingMedia or
+                          status == QtMultimedia.QMediaPlayer.BufferingMedia or
+                          status == QtMultimedia.QMediaPlayer.StalledMedia)
+    self.measureSwitchLatency(status)
+    if self.pending_position is not None and \
+       (status == QtMultimedia.QMediaPlayer.LoadedMedia or status == QtMultimedia.QMediaPlayer.BufferedMedia):
+      self.player.setPosition(self.pending_position[1])
+      self.pending_position = None
+
+    if status == QtMultimedia.QMediaPlayer.UnknownMediaStatus or \
+       status == QtMultimedia.QMediaPlayer.NoMedia or \
+       status == QtMultimedia.QMediaPlayer.LoadedMedia or \
+       status == QtMultimedia.QMediaPlayer.BufferingMedia or \
+       status == QtMultimedia.QMediaPlayer.BufferedMedia:
+      self.setStatusInfo("")
+    elif status == QtMultimedia.QMediaPlayer.LoadingMedia:
+      self.setStatusInfo("Loading")
+    elif status == QtMultimedia.QMediaPlayer.StalledMedia:
+      self.setStatusInfo("Media Stalled")
+    elif status == QtMultimedia.QMediaPlayer.EndOfMedia:
+      self.mediaFinished.emit()
+      self.playNextAfterEnd()
+    elif status == QtMultimedia.QMediaPlayer.InvalidMedia:
+      self.displayErrorMessage()
+
+  def playNextAfterEnd(self):
+    # QMediaPlayer no longer owns the playlist, so advancing is up to us
+    next_index = self.play_list.nextIndex()
+    if next_index == -1:
+      return
+    if next_index == self.play_list.currentIndex():
+      self.player.setPosition(0)
+    else:
+      self.play_list.setCurrentIndex(next_index)
+    self.player.play()
+
+  def measureSwitchLatency(self, status: QtMultimedia.QMediaPlayer.MediaStatus):
+    # time from picking a new item until it can actually be played
+    if self.switch_started is None:
+      return
+    if status == QtMultimedia.QMediaPlayer.BufferedMedia or \
+       (status == QtMultimedia.QMediaPlayer.LoadedMedia and
+        self.player.state() != QtMultimedia.QMediaPlayer.PlayingState):
+      elapsed = (time.perf_counter() - self.switch_started) * 1000
+      self.switch_started = None
+      logger.info("track switch %.1f ms (%s)", elapsed, "preloaded" if self.switch_preloaded else "cold")
+      self.trackSwitched.emit(elapsed, self.switch_preloaded)
+    elif status == QtMultimedia.QMediaPlayer.InvalidMedia:
+      self.switch_started = None
+
+  def setStatusInfo(self, info: str):
+    # backends repeat the same status many times a second, views only
+    # hear about changes
+    if info != self.status_info:
+      self.status_info = info
+      self.statusInfoChanged.emit(info)
+
+  def bufferingProgress(self, progress: int):
+    self.setStatusInfo("Buffering {}%".format(progress))
+
+  def displayErrorMessage(self):
+    message = self.player.errorString()
+    self.errorOccurred.emit(message)
+    self.setStatusInfo(message)
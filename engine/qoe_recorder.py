@@ -0,0 +1,190 @@
+from PyQt5 import QtCore
+from model.qoe_store import QoeStore, PlayRecord, defaultVersion
+import typing
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# QMediaPlayer.State and MediaStatus values, QtMultimedia isn't loaded
+# for these
+PLAYING_STATE = 1
+LOADING_MEDIA = 2
+LOADED_MEDIA = 3
+STALLED_MEDIA = 4
+BUFFERING_MEDIA = 5
+BUFFERED_MEDIA = 6
+END_OF_MEDIA = 7
+
+class QoeRecorder(QtCore.QObject):
+  # quality of experience per played item, written to a QoeStore when the
+  # next item is picked and on shutdown:
+  # - startup: from LoadingMedia while playing (or play, when the item was
+  #   picked paused or came preloaded) to the first frame the attached
+  #   FrameStatsSurface presents. Audio, or no surface, falls back to the
+  #   position moving or buffered media while playing
+  # - stalls and buffering episodes, count and time, the ones before the
+  #   start included
+  # - exact seek latencies from the seek controller, and errors
+  versionResolved = QtCore.pyqtSignal(str)
+
+  def __init__(self, engine, store: QoeStore) -> None:
+    super().__init__(parent=engine)
+    self.engine = engine
+    self.store = store
+    self.session = uuid.uuid4().hex
+    self.session_started = time.time()
+    self.session_stored = False
+    self.url = None
+    self.surface = None
+    self.video_available = False
+    # git describe takes a while, the session is filed once it's known
+    self.versionResolved.connect(self.storeSession)
+    self.version_thread = threading.Thread(target=self.resolveVersion, daemon=True)
+    self.version_thread.start()
+    engine.stateChanged.connect(self.stateChanged)
+    engine.mediaStatusChanged.connect(self.mediaStatusChanged)
+    engine.positionChanged.connect(self.positionChanged)
+    engine.errorOccurred.connect(self.errorOccurred)
+    engine.videoAvailableChanged.connect(self.videoAvailableChanged)
+    engine.seek_controller.seekFinished.connect(self.seekFinished)
+
+  def resolveVersion(self):
+    # on the version thread
+    self.versionResolved.emit(defaultVersion())
+
+  def storeSession(self, version: str):
+    if self.session_stored:
+      return
+    try:
+      self.store.addSession(self.session, self.session_started, version)
+      self.session_stored = True
+    except Exception as e:
+      logger.warning("storing playback session failed: %s", e)
+
+  def setSurface(self, surface):
+    # a FrameStatsSurface, its first frame after the load is the start
+    if self.surface is not None:
+      self.surface.frameReady.disconnect(self.frameReady)
+    self.surface = surface
+    if surface is not None:
+      surface.frameReady.connect(self.frameReady)
+
+  def begin(self, url: str, playing: bool):
+    self.finish()
+    self.url = url
+    self.started = time.time()
+    self.requested = time.perf_counter() if playing else None
+    self.startup_ms = None
+    self.played_ms = 0.0
+    self.playing_since = None
+    self.status = None
+    self.episode_started = None
+    self.stalls = 0
+    self.stall_ms = 0.0
+    self.buffering = 0
+    self.buffering_ms = 0.0
+    self.seek_latencies = []
+    self.errors = 0
+    self.last_error = ""
+    self.ended = False
+
+  def finish(self):
+    if self.url is None:
+      return
+    now = time.perf_counter()
+    self.endEpisode(now)
+    if self.playing_since is not None:
+      self.played_ms += (now - self.playing_since) * 1000
+      self.playing_since = None
+    record = PlayRecord(self.url, self.started, self.startup_ms, self.played_ms, self.stalls, self.stall_ms,
+                        self.buffering, self.buffering_ms, len(self.seek_latencies), self.errors,
+                        self.last_error, self.ended)
+    self.url = None
+    try:
+      self.store.add(self.session, record, self.seek_latencies)
+    except Exception as e:
+      logger.warning("storing playback metrics failed: %s", e)
+
+  def close(self):
+    self.finish()
+    if not self.session_stored:
+      # shutting down before the version came in, the queued signal won't
+      # be delivered any more
+      self.version_thread.join()
+      self.storeSession(defaultVersion())
+    self.store.close()
+
+  def framesExpected(self) -> bool:
+    return self.surface is not None and self.video_available
+
+  def markStarted(self):
+    if self.requested is not None and self.startup_ms is None:
+      self.startup_ms = (time.perf_counter() - self.requested) * 1000
+
+  def videoAvailableChanged(self, available: bool):
+    self.video_available = available
+
+  def frameReady(self):
+    if self.url is not None and self.startup_ms is None and self.engine.state() == PLAYING_STATE:
+      self.markStarted()
+
+  def stateChanged(self, state: int):
+    if self.url is None:
+      return
+    now = time.perf_counter()
+    if state == PLAYING_STATE:
+      if self.requested is None:
+        self.requested = now
+      if self.playing_since is None:
+        self.playing_since = now
+      if (self.status == BUFFERED_MEDIA or self.status == LOADED_MEDIA) and not self.framesExpected():
+        self.markStarted()
+    elif self.playing_since is not None:
+      self.played_ms += (now - self.playing_since) * 1000
+      self.playing_since = None
+
+  def positionChanged(self, position: int):
+    if self.url is not None and self.startup_ms is None and position > 0 and \
+       self.engine.state() == PLAYING_STATE and not self.framesExpected():
+      self.markStarted()
+
+  def endEpisode(self, now: float):
+    if self.episode_started is None:
+      return
+    elapsed = (now - self.episode_started) * 1000
+    if self.status == STALLED_MEDIA:
+      self.stall_ms += elapsed
+    else:
+      self.buffering_ms += elapsed
+    self.episode_started = None
+
+  def mediaStatusChanged(self, status: int):
+    if self.url is None or status == self.status:
+      return
+    now = time.perf_counter()
+    self.endEpisode(now)
+    self.status = status
+    if status == LOADING_MEDIA and self.startup_ms is None and self.requested is not None:
+      self.requested = now
+    elif status == BUFFERED_MEDIA and self.engine.state() == PLAYING_STATE and not self.framesExpected():
+      self.markStarted()
+    elif status == STALLED_MEDIA:
+      self.stalls += 1
+      self.episode_started = now
+    elif status == BUFFERING_MEDIA:
+      self.buffering += 1
+      self.episode_started = now
+    elif status == END_OF_MEDIA:
+      self.ended = True
+
+  def seekFinished(self, elapsed: float, exact: bool):
+    if self.url is not None and exact:
+      self.seek_latencies.append(elapsed)
+
+  def errorOccurred(self, message: str):
+    if self.url is not None:
+      self.errors += 1
+      self.last_error = message
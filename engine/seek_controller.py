@@ -0,0 +1,112 @@
+from model.keyframe_index import KeyframeIndex
+from PyQt5 import QtCore
+import typing
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class SeekController(QtCore.QObject):
+  # turns slider drags into few seeks: while dragging, at most one
+  # preview seek per interval to the latest position, snapped to the
+  # nearest keyframe so the decoder never has to decode up to it. On
+  # release one exact seek. interval_ms <= 0 seeks every move exactly,
+  # which is the old behaviour.
+  # A seek counts as done on the first position update near its target
+  seekFinished = QtCore.pyqtSignal(float, bool)
+
+  def __init__(self, keyframe_index: typing.Optional[KeyframeIndex] = None,
+               parent: typing.Optional[QtCore.QObject] = None, interval_ms: int = 150,
+               tolerance_ms: int = 250, timeout_ms: int = 5000, latency_samples: int = 500) -> None:
+    super().__init__(parent=parent)
+    self.keyframe_index = keyframe_index
+    self.interval_ms = interval_ms
+    self.tolerance_ms = tolerance_ms
+    self.timeout_ms = timeout_ms
+    self.player = None
+    self.url = ""
+    self.target = None
+    self.last_seek = None
+    self.pending = None
+    self.seeks = 0
+    self.previews = 0
+    self.latencies = {True: collections.deque(maxlen=latency_samples),
+                      False: collections.deque(maxlen=latency_samples)}
+    self.timer = QtCore.QTimer(self)
+    self.timer.setSingleShot(True)
+    self.timer.timeout.connect(self.flushPreview)
+
+  def setPlayer(self, player):
+    self.player = player
+    self.timer.stop()
+    self.target = None
+    self.pending = None
+
+  def setMedia(self, url: str):
+    self.url = url
+    self.timer.stop()
+    self.target = None
+    self.pending = None
+    if self.keyframe_index is not None and len(url) != 0:
+      self.keyframe_index.request(url)
+
+  def isSeeking(self) -> bool:
+    return self.target is not None or self.pending is not None
+
+  def preview(self, position: int):
+    if self.interval_ms <= 0:
+      self.seek(position, True)
+      return
+    self.target = position
+    if not self.timer.isActive():
+      # the first move seeks right away, later ones wait for the interval
+      self.flushPreview()
+
+  def flushPreview(self):
+    if self.target is None:
+      return
+    position = self.target
+    self.target = None
+    if self.keyframe_index is not None:
+      position = self.keyframe_index.snap(self.url, position)
+    if position != self.last_seek:
+      self.previews += 1
+      self.seek(position, False)
+    self.timer.start(self.interval_ms)
+
+  def commit(self, position: int):
+    self.timer.stop()
+    self.target = None
+    self.seek(position, True)
+
+  def seek(self, position: int, exact: bool):
+    if self.player is None:
+      return
+    self.seeks += 1
+    self.last_seek = position
+    self.pending = (position, exact, time.perf_counter())
+    self.player.setPosition(position)
+
+  def positionChanged(self, position: int):
+    if self.pending is None:
+      return
+    target, exact, started = self.pending
+    elapsed = (time.perf_counter() - started) * 1000
+    if abs(position - target) <= self.tolerance_ms:
+      self.pending = None
+      self.latencies[exact].append(elapsed)
+      logger.debug("%s seek to %d took %.1f ms", "exact" if exact else "preview", target, elapsed)
+      self.seekFinished.emit(elapsed, exact)
+    elif elapsed > self.timeout_ms:
+      self.pending = None
+
+  def latencyReport(self) -> typing.Dict[str, typing.Any]:
+    def summary(values: typing.Iterable[float]) -> typing.Dict[str, float]:
+      values = sorted(values)
+      if len(values) == 0:
+        return {"count": 0}
+      return {"count": len(values), "p50_ms": values[len(values) // 2],
+              "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))], "max_ms": values[-1]}
+    return {"seeks": self.seeks, "previews": self.previews,
+            "exact": summary(self.latencies[True]), "preview": summary(self.latencies[False])}
@@ -0,0 +1,262 @@
+from PyQt5 import QtCore
+from model.metadata_cache import defaultCacheDir
+from model.thumbnail_cache import FFMPEG
+import typing
+import collections
+import hashlib
+import importlib.util
+import math
+import os
+import struct
+import subprocess
+import threading
+
+# numpy is optional, without it nothing gets analysed. It takes longer
+# to import than the rest of the player, so it is only loaded on the
+# analysis thread once there is something to analyse
+numpy = None
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+def loadNumpy():
+  global numpy
+  if numpy is None:
+    import numpy
+  return numpy
+
+SAMPLE_RATE = 48000
+# loudness is built from 100 ms hops, 4 of them make a 400 ms gating block
+HOP = SAMPLE_RATE // 10
+ENVELOPE_SIZE = 1000
+# ReplayGain 2.0 reference level
+REFERENCE_LOUDNESS = -18.0
+# ITU-R BS.1770 K-weighting at 48 kHz, high shelf then RLB high pass
+K_SHELF = ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585))
+K_HIGHPASS = ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621))
+CACHE_HEADER = struct.Struct("<ddI")
+
+class AudioAnalysis(typing.NamedTuple):
+  # loudness in LUFS, None for silence or clips shorter than one block.
+  # envelope is the peak level per bucket, 0-255, evenly over the track
+  loudness: typing.Optional[float] = None
+  peak: float = 0.0
+  envelope: bytes = b""
+
+  def gain(self, target: float = REFERENCE_LOUDNESS) -> float:
+    # dB to reach the target loudness, never more than the peak allows
+    if self.loudness is None:
+      return 0.0
+    gain = target - self.loudness
+    if self.peak > 0:
+      gain = min(gain, -20 * math.log10(self.peak))
+    return gain
+
+def kWeights(size: int) -> "numpy.ndarray":
+  # |H|^2 of the K-weighting filter at the rfft bins of a `size` long
+  # block, with the Parseval factors folded in, so summing
+  # |X|^2 * weights gives the mean square of the filtered block
+  bins = size // 2 + 1
+  z = numpy.exp(-1j * 2 * numpy.pi * numpy.arange(bins) / size)
+  response = numpy.ones(bins, dtype=complex)
+  for b, a in (K_SHELF, K_HIGHPASS):
+    response *= numpy.polyval(b[::-1], z) / numpy.polyval(a[::-1], z)
+  weights = numpy.abs(response) ** 2 / (size * size)
+  weights[1:bins - 1 if size % 2 == 0 else bins] *= 2
+  return weights
+
+def integratedLoudness(powers: "numpy.ndarray") -> typing.Optional[float]:
+  # powers: K-weighted mean square per 100 ms hop, summed over channels.
+  # BS.1770 gating over 400 ms blocks with 75% overlap
+  if len(powers) < 4:
+    return None
+  blocks = numpy.lib.stride_tricks.sliding_window_view(powers, 4).mean(axis=-1)
+  with numpy.errstate(divide="ignore"):
+    loudness = -0.691 + 10 * numpy.log10(blocks)
+  gated = blocks[loudness > -70]
+  if len(gated) == 0:
+    return None
+  relative_gate = -0.691 + 10 * math.log10(gated.mean()) - 10
+  gated = blocks[(loudness > -70) & (loudness > relative_gate)]
+  return -0.691 + 10 * math.log10(gated.mean())
+
+def downsampleEnvelope(peaks: "numpy.ndarray", size: int) -> bytes:
+  if len(peaks) > size:
+    # max over evenly sized groups, the last few hops are dropped
+    peaks = peaks[:len(peaks) // size * size].reshape(size, -1).max(axis=1)
+  return numpy.clip(peaks * 255, 0, 255).astype(numpy.uint8).tobytes()
+
+def analyzeAudio(path: str, cancel_event: typing.Optional[threading.Event] = None,
+                 chunk_seconds: int = 10) -> typing.Optional[AudioAnalysis]:
+  # decodes once through ffmpeg as 48 kHz stereo float, a chunk at a time
+  if FFMPEG is None or not HAS_NUMPY:
+    return None
+  loadNumpy()
+  try:
+    process = subprocess.Popen(
+      [FFMPEG, "-v", "error", "-i", path, "-vn", "-ac", "2", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-"],
+      stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+  except OSError:
+    return None
+
+  weights = kWeights(HOP)
+  hop_bytes = HOP * 2 * 4
+  chunk_bytes = hop_bytes * 10 * chunk_seconds
+  powers = []
+  peaks = []
+  mono = True
+  pending = b""
+  try:
+    while True:
+      if cancel_event is not None and cancel_event.is_set():
+        return None
+      data = process.stdout.read(chunk_bytes)
+      if len(data) == 0:
+        break
+      data = pending + data
+      usable = len(data) // hop_bytes * hop_bytes
+      pending = data[usable:]
+      if usable == 0:
+        continue
+      # (hops, samples, channels) -> (channels, hops, samples)
+      samples = numpy.frombuffer(data[:usable], dtype="<f4").reshape(-1, HOP, 2).transpose(2, 0, 1)
+      mono = mono and numpy.array_equal(samples[0], samples[1])
+      spectrum = numpy.fft.rfft(samples, axis=-1)
+      powers.append(((spectrum.real ** 2 + spectrum.imag ** 2) * weights).sum(axis=-1).T)
+      peaks.append(numpy.abs(samples).max(axis=(0, 2)))
+  finally:
+    process.stdout.close()
+    process.kill()
+    process.wait()
+
+  if len(powers) == 0:
+    return None
+  powers = numpy.concatenate(powers)
+  peaks = numpy.concatenate(peaks)
+  # mono sources come out duplicated on both channels, BS.1770 counts
+  # them once
+  loudness = integratedLoudness(powers[:, 0] if mono else powers.sum(axis=1))
+  return AudioAnalysis(loudness=loudness, peak=float(peaks.max()),
+                       envelope=downsampleEnvelope(peaks, ENVELOPE_SIZE))
+
+class AudioAnalyzer(QtCore.QObject):
+  # waveform envelope and loudness per audio track, computed on one pool
+  # thread and cached on disk keyed by path, size and mtime
+  analysisReady = QtCore.pyqtSignal(str)
+  analysisLoaded = QtCore.pyqtSignal(str, object, int)
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None,
+               cache_dir: typing.Optional[str] = None, max_items: int = 256) -> None:
+    super().__init__(parent=parent)
+    self.cache_dir = cache_dir if cache_dir is not None else os.path.join(defaultCacheDir(), "analysis")
+    os.makedirs(self.cache_dir, exist_ok=True)
+    self.max_items = max_items
+    self.analyses = collections.OrderedDict()
+    self.mime_database = QtCore.QMimeDatabase()
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(1)
+    self.lock = threading.Lock()
+    self.queue = collections.deque()
+    self.failed = set()
+    self.running = False
+    # bumped by cancel. Jobs carry the generation they were queued in,
+    # results of an older one are dropped, whatever they are. Each
+    # generation has its own event, setting it stops that generation's
+    # decode and never one started later
+    self.generation = 0
+    self.cancel_event = threading.Event()
+    self.analysisLoaded.connect(self.onAnalysisLoaded)
+
+  def isAvailable(self) -> bool:
+    return FFMPEG is not None and HAS_NUMPY
+
+  def analysis(self, url: str) -> typing.Optional[AudioAnalysis]:
+    analysis = self.analyses.get(url, None)
+    if analysis is not None:
+      self.analyses.move_to_end(url)
+    return analysis
+
+  def request(self, urls: typing.List[str]):
+    # replaces what is still queued, the first url goes first
+    if not self.isAvailable():
+      return
+    # by extension only, asking by url may read the file on the gui thread
+    urls = [url for url in urls
+            if url not in self.analyses and url not in self.failed and
+               self.mime_database.mimeTypeForFile(QtCore.QUrl(url).path(), QtCore.QMimeDatabase.MatchExtension)
+                 .name().startswith("audio/")]
+    with self.lock:
+      self.queue = collections.deque((url, self.generation) for url in urls)
+      if self.running or len(self.queue) == 0:
+        return
+      self.running = True
+    self.pool.start(self.work)
+
+  def cancel(self):
+    with self.lock:
+      self.queue.clear()
+      self.generation += 1
+      self.cancel_event.set()
+      self.cancel_event = threading.Event()
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def work(self):
+    while True:
+      with self.lock:
+        if len(self.queue) == 0:
+          self.running = False
+          return
+        url, generation = self.queue.popleft()
+        cancel_event = self.cancel_event
+      analysis = self.loadAnalysis(url, cancel_event)
+      if cancel_event.is_set():
+        continue
+      self.analysisLoaded.emit(url, analysis, generation)
+
+  def onAnalysisLoaded(self, url: str, analysis: typing.Optional[AudioAnalysis], generation: int):
+    if generation != self.generation:
+      # cancelled after it was sent, a None may only mean it was cut short
+      return
+    if analysis is None:
+      self.failed.add(url)
+      return
+    self.analyses[url] = analysis
+    while len(self.analyses) > self.max_items:
+      self.analyses.popitem(last=False)
+    self.analysisReady.emit(url)
+
+  def cachePath(self, path: str) -> typing.Optional[str]:
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+    key = "{}|{}|{}".format(path, stat.st_size, stat.st_mtime_ns)
+    return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".bin")
+
+  def loadAnalysis(self, url: str, cancel_event: threading.Event) -> typing.Optional[AudioAnalysis]:
+    path = QtCore.QUrl(url).toLocalFile()
+    if len(path) == 0:
+      return None
+    cache_path = self.cachePath(path)
+    if cache_path is None:
+      return None
+    if os.path.exists(cache_path):
+      try:
+        with open(cache_path, "rb") as f:
+          data = f.read()
+        loudness, peak, size = CACHE_HEADER.unpack_from(data, 0)
+        envelope = data[CACHE_HEADER.size:CACHE_HEADER.size + size]
+        if len(envelope) == size:
+          return AudioAnalysis(None if math.isnan(loudness) else loudness, peak, envelope)
+      except (OSError, struct.error):
+        pass
+    analysis = analyzeAudio(path, cancel_event)
+    if analysis is not None:
+      try:
+        with open(cache_path, "wb") as f:
+          f.write(CACHE_HEADER.pack(analysis.loudness if analysis.loudness is not None else math.nan,
+                                    analysis.peak, len(analysis.envelope)))
+          f.write(analysis.envelope)
+      except OSError:
+        pass
+    return analysis
@@ -0,0 +1,127 @@
+from model.metadata_cache import defaultCacheDir
+from model.file_budget import FileBudget
+import typing
+import hashlib
+import json
+import os
+import threading
+
+class StreamInfo(typing.NamedTuple):
+  # what the server said about a stream, cached chunks are only valid
+  # while these stay the same
+  length: int
+  etag: str = ""
+  last_modified: str = ""
+  chunk_size: int = 0
+
+class ChunkCache:
+  # network streams on disk in fixed size chunks, one folder per url.
+  # A FileBudget keeps the chunks under max_bytes, least recently used go
+  # first. Safe to use from any thread
+  def __init__(self, cache_dir: typing.Optional[str] = None, max_bytes: int = 512 * 1024 * 1024,
+               chunk_size: int = 512 * 1024) -> None:
+    self.cache_dir = cache_dir if cache_dir is not None else os.path.join(defaultCacheDir(), "streams")
+    os.makedirs(self.cache_dir, exist_ok=True)
+    self.max_bytes = max_bytes
+    self.chunk_size = chunk_size
+    self.budget = FileBudget(self.cache_dir, ".chunk", max_bytes, nested=True)
+    self.lock = threading.Lock()
+    self.infos = {}
+    self.hits = 0
+    self.misses = 0
+
+  @staticmethod
+  def key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+  def chunkPath(self, key: str, index: int) -> str:
+    return os.path.join(self.cache_dir, key, "{:08d}.chunk".format(index))
+
+  def info(self, url: str) -> typing.Optional[StreamInfo]:
+    key = self.key(url)
+    with self.lock:
+      if key in self.infos:
+        return self.infos[key]
+    try:
+      with open(os.path.join(self.cache_dir, key, "info.json")) as f:
+        info = StreamInfo(**json.load(f))
+    except (OSError, ValueError, TypeError):
+      info = None
+    # chunks cut for another chunk size can't be used
+    if info is not None and info.chunk_size != self.chunk_size:
+      self.invalidate(url)
+      info = None
+    with self.lock:
+      self.infos[key] = info
+    return info
+
+  def setInfo(self, url: str, info: StreamInfo) -> bool:
+    # True when it differs from what the cached chunks were fetched with,
+    # those are dropped then
+    info = info._replace(chunk_size=self.chunk_size)
+    old = self.info(url)
+    if old == info:
+      return False
+    if old is not None:
+      self.invalidate(url)
+    key = self.key(url)
+    os.makedirs(os.path.join(self.cache_dir, key), exist_ok=True)
+    try:
+      with open(os.path.join(self.cache_dir, key, "info.json"), "w") as f:
+        json.dump(info._asdict(), f)
+    except OSError:
+      pass
+    with self.lock:
+      self.infos[key] = info
+    return True
+
+  def has(self, url: str, index: int) -> bool:
+    return self.budget.has(self.chunkPath(self.key(url), index))
+
+  def get(self, url: str, index: int) -> typing.Optional[bytes]:
+    path = self.chunkPath(self.key(url), index)
+    hit = self.budget.has(path)
+    with self.lock:
+      if hit:
+        self.hits += 1
+      else:
+        self.misses += 1
+    if not hit:
+      return None
+    try:
+      with open(path, "rb") as f:
+        data = f.read()
+    except OSError:
+      self.budget.remove([path])
+      return None
+    self.budget.touch(path)
+    return data
+
+  def put(self, url: str, index: int, data: bytes):
+    key = self.key(url)
+    path = self.chunkPath(key, index)
+    try:
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      # written aside first, a crash never leaves a short chunk behind
+      with open(path + ".tmp", "wb") as f:
+        f.write(data)
+      os.replace(path + ".tmp", path)
+    except OSError:
+      return
+    self.budget.add(path)
+
+  def invalidate(self, url: str):
+    key = self.key(url)
+    self.budget.removeFolder(os.path.join(self.cache_dir, key))
+    with self.lock:
+      self.infos.pop(key, None)
+    try:
+      os.remove(os.path.join(self.cache_dir, key, "info.json"))
+    except OSError:
+      pass
+
+  def stats(self) -> typing.Dict[str, int]:
+    stats = self.budget.stats()
+    with self.lock:
+      return {"chunks": stats["files"], "used_bytes": stats["used_bytes"], "max_bytes": stats["max_bytes"],
+              "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,108 @@
+import typing
+import collections
+import os
+import threading
+
+class FileBudget:
+  # keeps the files ending in `suffix` in a cache folder under max_bytes,
+  # least recently used go first, the order survives restarts through the
+  # files' mtimes. The folder is read on first use, from whichever
+  # worker thread gets there first. With nested the files sit one folder
+  # further down, e.g. a folder per stream. Safe to use from any thread
+  def __init__(self, directory: str, suffix: str, max_bytes: int, nested: bool = False) -> None:
+    self.directory = directory
+    self.suffix = suffix
+    self.max_bytes = max_bytes
+    self.nested = nested
+    self.lock = threading.Lock()
+    # path -> size, oldest first
+    self.files = collections.OrderedDict()
+    self.used_bytes = 0
+    self.loaded = False
+
+  def load(self):
+    # with the lock held
+    self.loaded = True
+    entries = []
+    try:
+      folders = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()] \
+                if self.nested else [self.directory]
+      for folder in folders:
+        for entry in os.scandir(folder):
+          if entry.name.endswith(self.suffix) and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+    except OSError:
+      return
+    entries.sort()
+    for _, path, size in entries:
+      self.files.setdefault(path, size)
+    self.used_bytes = sum(self.files.values())
+    self.evict()
+
+  def has(self, path: str) -> bool:
+    with self.lock:
+      if not self.loaded:
+        self.load()
+      return path in self.files
+
+  def touch(self, path: str):
+    # a cache hit, the file moves to the back of the line
+    with self.lock:
+      if not self.loaded:
+        self.load()
+      if path not in self.files:
+        return
+      self.files.move_to_end(path)
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+
+  def add(self, path: str):
+    # a file just written or rewritten
+    try:
+      size = os.path.getsize(path)
+    except OSError:
+      return
+    with self.lock:
+      if not self.loaded:
+        self.load()
+      self.used_bytes -= self.files.pop(path, 0)
+      self.files[path] = size
+      self.used_bytes += size
+      self.evict()
+
+  def remove(self, paths: typing.Iterable[str]):
+    # files that went stale, or vanished under us
+    with self.lock:
+      if not self.loaded:
+        self.load()
+      for path in paths:
+        self.used_bytes -= self.files.pop(path, 0)
+        try:
+          os.remove(path)
+        except OSError:
+          pass
+
+  def removeFolder(self, folder: str):
+    # every file kept in one folder, with nested
+    with self.lock:
+      if not self.loaded:
+        self.load()
+      paths = [path for path in self.files if os.path.dirname(path) == folder]
+    self.remove(paths)
+
+  def evict(self):
+    # with the lock held
+    while self.used_bytes > self.max_bytes and len(self.files) > 1:
+      path, size = self.files.popitem(last=False)
+      self.used_bytes -= size
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+  def stats(self) -> typing.Dict[str, int]:
+    with self.lock:
+      return {"files": len(self.files), "used_bytes": self.used_bytes, "max_bytes": self.max_bytes}
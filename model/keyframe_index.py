@@ -0,0 +1,141 @@
+from PyQt5 import QtCore
+from model.metadata_cache import defaultCacheDir
+from model.metadata_scanner import FFPROBE
+from model.file_budget import FileBudget
+import typing
+import array
+import bisect
+import collections
+import hashlib
+import os
+import subprocess
+import threading
+
+def probeKeyframes(path: str) -> typing.Optional[array.array]:
+  # keyframe times in ms from the packet flags of the first video
+  # stream, nothing gets decoded. Empty for files without video
+  if FFPROBE is None:
+    return None
+  try:
+    output = subprocess.run(
+      [FFPROBE, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+       "-of", "csv=p=0", path],
+      capture_output=True, timeout=120, check=True).stdout
+  except (OSError, subprocess.SubprocessError):
+    return None
+  keyframes = array.array("q")
+  for line in output.decode("ascii", "replace").splitlines():
+    pts_time, _, flags = line.partition(",")
+    if "K" not in flags:
+      continue
+    try:
+      keyframes.append(int(float(pts_time) * 1000))
+    except ValueError:
+      continue
+  # packets come in decode order, keyframes are nearly always sorted
+  # already but b-frame streams can reorder
+  return array.array("q", sorted(set(keyframes)))
+
+class KeyframeIndex(QtCore.QObject):
+  # per file keyframe positions, probed on one pool thread and cached on
+  # disk, one file per path that starts with the size and mtime it was
+  # probed at, plus a few files in memory
+  keyframesReady = QtCore.pyqtSignal(str)
+  keyframesLoaded = QtCore.pyqtSignal(str, object)
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None,
+               cache_dir: typing.Optional[str] = None, max_files: int = 16,
+               max_disk_bytes: int = 16 * 1024 * 1024) -> None:
+    super().__init__(parent=parent)
+    self.cache_dir = cache_dir if cache_dir is not None else os.path.join(defaultCacheDir(), "keyframes")
+    os.makedirs(self.cache_dir, exist_ok=True)
+    self.disk_budget = FileBudget(self.cache_dir, ".bin", max_disk_bytes)
+    self.max_files = max_files
+    self.keyframes = collections.OrderedDict()
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(1)
+    self.lock = threading.Lock()
+    self.loading = set()
+    self.keyframesLoaded.connect(self.onKeyframesLoaded)
+
+  def isAvailable(self) -> bool:
+    return FFPROBE is not None
+
+  def request(self, url: str):
+    if not self.isAvailable() or url in self.keyframes:
+      return
+    path = QtCore.QUrl(url).toLocalFile()
+    if len(path) == 0:
+      return
+    with self.lock:
+      if url in self.loading:
+        return
+      self.loading.add(url)
+    self.pool.start(lambda: self.work(url, path))
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def work(self, url: str, path: str):
+    keyframes = self.loadKeyframes(path)
+    self.keyframesLoaded.emit(url, keyframes)
+
+  def onKeyframesLoaded(self, url: str, keyframes: typing.Optional[array.array]):
+    with self.lock:
+      self.loading.discard(url)
+    if keyframes is None:
+      return
+    self.keyframes[url] = keyframes
+    while len(self.keyframes) > self.max_files:
+      self.keyframes.popitem(last=False)
+    self.keyframesReady.emit(url)
+
+  def cachePath(self, path: str) -> str:
+    # by path alone, a changed file overwrites its old index
+    return os.path.join(self.cache_dir, hashlib.sha1(path.encode("utf-8")).hexdigest() + ".bin")
+
+  def loadKeyframes(self, path: str) -> typing.Optional[array.array]:
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+    cache_path = self.cachePath(path)
+    keyframes = array.array("q")
+    try:
+      with open(cache_path, "rb") as f:
+        keyframes.frombytes(f.read())
+      # the first two values are the size and mtime it was probed at
+      if len(keyframes) >= 2 and keyframes[0] == stat.st_size and keyframes[1] == stat.st_mtime_ns:
+        self.disk_budget.touch(cache_path)
+        return keyframes[2:]
+    except (OSError, ValueError):
+      pass
+    keyframes = probeKeyframes(path)
+    if keyframes is not None:
+      try:
+        with open(cache_path, "wb") as f:
+          f.write(array.array("q", [stat.st_size, stat.st_mtime_ns]))
+          f.write(keyframes)
+        self.disk_budget.add(cache_path)
+      except OSError:
+        pass
+    return keyframes
+
+  def hasKeyframes(self, url: str) -> bool:
+    return len(self.keyframes.get(url, ())) != 0
+
+  def snap(self, url: str, position: int) -> int:
+    # nearest keyframe, or the position itself when there is no index
+    # (yet) or the file has no video
+    keyframes = self.keyframes.get(url, None)
+    if keyframes is None or len(keyframes) == 0:
+      return position
+    self.keyframes.move_to_end(url)
+    pos = bisect.bisect_left(keyframes, position)
+    if pos == 0:
+      return keyframes[0]
+    if pos == len(keyframes):
+      return keyframes[-1]
+    before = keyframes[pos - 1]
+    after = keyframes[pos]
+    return before if position - before <= after - position else after
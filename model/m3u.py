@@ -0,0 +1,132 @@
+import typing
+import os
+import re
+import threading
+
+URL_SCHEME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9+.\-]*://")
+WINDOWS_DRIVE_PATTERN = re.compile(r"^[A-Za-z]:[\\/]")
+
+class M3UEntry(typing.NamedTuple):
+  location: str
+  title: str
+  duration: int
+  line: int
+
+class M3UError(typing.NamedTuple):
+  line: int
+  message: str
+
+def iterLines(path: str, chunk_size: int,
+              cancel_event: typing.Optional[threading.Event] = None) -> typing.Iterator[bytes]:
+  remainder = b""
+  with open(path, "rb") as f:
+    while cancel_event is None or not cancel_event.is_set():
+      chunk = f.read(chunk_size)
+      if len(chunk) == 0:
+        break
+      lines = (remainder + chunk).split(b"\n")
+      remainder = lines.pop()
+      yield from lines
+  if len(remainder) != 0:
+    yield remainder
+
+def isLocalPath(location: str) -> bool:
+  return os.path.isabs(location)
+
+def isForeignDrivePath(location: str) -> bool:
+  # a drive letter path read anywhere but windows points nowhere, as a
+  # url it would get a "c:" scheme
+  return os.name != "nt" and WINDOWS_DRIVE_PATTERN.match(location) is not None
+
+def resolveLocation(location: str, base_dir: str) -> str:
+  if URL_SCHEME_PATTERN.match(location) or location.startswith("file:"):
+    return location
+  if os.path.isabs(location):
+    return os.path.normpath(location)
+  return os.path.normpath(os.path.join(base_dir, location.replace("\\", os.sep)))
+
+def parseExtinf(value: str) -> typing.Tuple[int, str]:
+  # #EXTINF:<duration> [key="value" ...],<title>
+  head, separator, title = value.partition(",")
+  if len(separator) == 0:
+    raise ValueError("missing ',' in EXTINF")
+  duration = head.split(" ", 1)[0].strip()
+  return int(float(duration)), title.strip()
+
+def parseM3U(path: str, chunk_size: int = 1 << 16,
+             cancel_event: typing.Optional[threading.Event] = None
+             ) -> typing.Iterator[typing.Union[M3UEntry, M3UError]]:
+  base_dir = os.path.dirname(os.path.abspath(path))
+  strict_utf8 = path.lower().endswith(".m3u8")
+  pending_info = None
+
+  for line_number, raw_line in enumerate(iterLines(path, chunk_size, cancel_event), 1):
+    if line_number == 1 and raw_line.startswith(b"\xef\xbb\xbf"):
+      raw_line = raw_line[3:]
+    try:
+      line = raw_line.decode("utf-8").strip()
+    except UnicodeDecodeError:
+      if strict_utf8:
+        yield M3UError(line_number, "invalid utf-8")
+        continue
+      # legacy .m3u files are usually in the local 8 bit codepage
+      line = raw_line.decode("latin-1").strip()
+
+    if len(line) == 0:
+      continue
+    if line.startswith("#EXTINF:"):
+      if pending_info is not None:
+        yield M3UError(pending_info[0], "EXTINF without a location")
+      try:
+        duration, title = parseExtinf(line[len("#EXTINF:"):])
+      except ValueError as e:
+        yield M3UError(line_number, "malformed EXTINF: {}".format(e))
+        pending_info = None
+        continue
+      pending_info = (line_number, duration, title)
+    elif line.startswith("#"):
+      continue
+    else:
+      if pending_info is not None:
+        duration, title = pending_info[1], pending_info[2]
+      else:
+        duration, title = -1, ""
+      pending_info = None
+      if isForeignDrivePath(line):
+        yield M3UError(line_number, "drive letter path can't be resolved here")
+        continue
+      yield M3UEntry(resolveLocation(line, base_dir), title, duration, line_number)
+
+  if pending_info is not None:
+    yield M3UError(pending_info[0], "EXTINF without a location")
+
+def relativeLocation(location: str, base_dir: str) -> str:
+  if not os.path.isabs(location):
+    return location
+  try:
+    relative = os.path.relpath(location, base_dir)
+  except ValueError:
+    # different drive on windows
+    return location
+  return location if relative.startswith("..") else relative
+
+def writeM3U(path: str, entries: typing.Iterable[typing.Tuple[str, str, int]]):
+  # entries are (location, title, duration), locations are local paths
+  # or urls, local paths below the playlist folder are written relative
+  base_dir = os.path.dirname(os.path.abspath(path))
+  temp_path = path + ".tmp"
+  try:
+    with open(temp_path, "w", encoding="utf-8", newline="\n") as f:
+      f.write("#EXTM3U\n")
+      for location, title, duration in entries:
+        if len(title) != 0 or duration >= 0:
+          f.write("#EXTINF:{},{}\n".format(duration, title))
+        f.write(relativeLocation(location, base_dir) + "\n")
+    os.replace(temp_path, path)
+  except BaseException:
+    # a half written playlist isn't left lying next to the real one
+    try:
+      os.remove(temp_path)
+    except OSError:
+      pass
+    raise
@@ -0,0 +1,461 @@
+from PyQt5 import QtCore
+import typing
+import collections
+import hashlib
+import os
+import sqlite3
+import threading
+
+# the content hash only reads the start and the end of a file, together
+# with the size that tells media files apart without reading them whole
+HASH_SAMPLE = 16 * 1024
+EMIT_BATCH = 5000
+
+def defaultLibraryPath() -> str:
+  return os.path.join(QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.AppDataLocation),
+                      "library.sqlite")
+
+def contentHash(path: str, size: int) -> typing.Optional[str]:
+  digest = hashlib.sha1(str(size).encode("ascii"))
+  try:
+    with open(path, "rb") as f:
+      digest.update(f.read(HASH_SAMPLE))
+      if size > 2 * HASH_SAMPLE:
+        f.seek(-HASH_SAMPLE, os.SEEK_END)
+        digest.update(f.read(HASH_SAMPLE))
+      elif size > HASH_SAMPLE:
+        digest.update(f.read())
+  except OSError:
+    return None
+  return digest.hexdigest()
+
+def subtreeRange(path: str) -> typing.Tuple[str, str]:
+  # every path below `path` sorts into [low, high)
+  return path + os.sep, path + chr(ord(os.sep) + 1)
+
+class LibraryIndex:
+  # what the library looked like on the last scan: the directories with
+  # their mtime and the media files in them with size, mtime and hash.
+  # The hash is filled in later for files found by a walk
+  def __init__(self, path: str) -> None:
+    if path != ":memory:":
+      os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    self.lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+    self.connection.execute("CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY)")
+    self.connection.execute(
+      "CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER)")
+    self.connection.execute(
+      "CREATE TABLE IF NOT EXISTS files ("
+      "  path TEXT PRIMARY KEY, directory TEXT, size INTEGER, mtime_ns INTEGER, hash TEXT)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS files_directory ON files (directory)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS files_hash ON files (size, hash)")
+    self.connection.commit()
+
+  def query(self, sql: str, parameters: typing.Sequence = ()) -> typing.List[tuple]:
+    with self.lock:
+      return self.connection.execute(sql, parameters).fetchall()
+
+  def roots(self) -> typing.List[str]:
+    return [row[0] for row in self.query("SELECT path FROM roots ORDER BY path")]
+
+  def addRoot(self, path: str):
+    with self.lock:
+      self.connection.execute("INSERT OR IGNORE INTO roots VALUES (?)", (path,))
+      self.connection.commit()
+
+  def removeRoot(self, path: str):
+    with self.lock:
+      self.connection.execute("DELETE FROM roots WHERE path = ?", (path,))
+      self.connection.commit()
+
+  def directories(self) -> typing.List[typing.Tuple[str, int]]:
+    return self.query("SELECT path, mtime_ns FROM directories")
+
+  def hasDirectory(self, path: str) -> bool:
+    return len(self.query("SELECT 1 FROM directories WHERE path = ?", (path,))) != 0
+
+  def subdirectories(self, path: str) -> typing.List[str]:
+    return [row[0] for row in self.query("SELECT path FROM directories WHERE parent = ?", (path,))]
+
+  def files(self, directory: str) -> typing.List[typing.Tuple[str, int, int, typing.Optional[str]]]:
+    return self.query("SELECT path, size, mtime_ns, hash FROM files WHERE directory = ?", (directory,))
+
+  def filesByDirectory(self) -> typing.Dict[str, typing.List[typing.Tuple[str, int, int]]]:
+    files = collections.defaultdict(list)
+    for path, directory, size, mtime_ns in self.query("SELECT path, directory, size, mtime_ns FROM files"):
+      files[directory].append((path, size, mtime_ns))
+    return files
+
+  def subtree(self, path: str) -> typing.Tuple[typing.List[str], typing.List[tuple]]:
+    # the directory itself and everything below it
+    low, high = subtreeRange(path)
+    directories = [row[0] for row in self.query(
+      "SELECT path FROM directories WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))]
+    files = self.query(
+      "SELECT path, size, mtime_ns, hash FROM files WHERE path >= ? AND path < ?", (low, high))
+    return directories, files
+
+  def allFiles(self) -> typing.List[str]:
+    return [row[0] for row in self.query("SELECT path FROM files ORDER BY path")]
+
+  def unhashed(self, limit: int) -> typing.List[typing.Tuple[str, int]]:
+    return self.query("SELECT path, size FROM files WHERE hash IS NULL LIMIT ?", (limit,))
+
+  def setHashes(self, items: typing.List[typing.Tuple[str, str]]):
+    with self.lock:
+      self.connection.executemany("UPDATE files SET hash = ? WHERE path = ?",
+                                  [(digest, path) for path, digest in items])
+      self.connection.commit()
+
+  def apply(self, directories: typing.List[typing.Tuple[str, str, int]], removed_directories: typing.List[str],
+            files: typing.List[typing.Tuple[str, str, int, int, typing.Optional[str]]],
+            removed_files: typing.List[str], moves: typing.List[typing.Tuple[str, str, str, int, int]]):
+    # one transaction per scan, a crash in between leaves the old state
+    with self.lock:
+      with self.connection:
+        self.connection.executemany("DELETE FROM directories WHERE path = ?",
+                                    [(path,) for path in removed_directories])
+        self.connection.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed_files])
+        # moved rows keep their hash
+        self.connection.executemany(
+          "UPDATE files SET path = ?, directory = ?, size = ?, mtime_ns = ? WHERE path = ?",
+          [(path, directory, size, mtime_ns, old_path) for old_path, path, directory, size, mtime_ns in moves])
+        self.connection.executemany("INSERT OR REPLACE INTO directories VALUES (?, ?, ?)", directories)
+        self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", files)
+
+  def close(self):
+    with self.lock:
+      self.connection.close()
+
+class LibraryScan:
+  # the changes one pass over some directories found, applied to the
+  # index in one go once the pass is done
+  def __init__(self) -> None:
+    self.directories = []
+    self.removed_directories = []
+    self.files = []
+    self.removed_files = []
+    self.added = []
+
+  def isEmpty(self) -> bool:
+    return len(self.directories) == 0 and len(self.removed_directories) == 0 and \
+           len(self.files) == 0 and len(self.removed_files) == 0
+
+class MediaLibrary(QtCore.QObject):
+  # keeps the media files below a few root folders indexed. A restart
+  # stats the known directories and files and only lists the directories
+  # whose mtime moved, while running QFileSystemWatcher reports changed
+  # directories. Files that vanish and show up elsewhere with the same
+  # size and content hash are reported as moved, not removed and added
+  filesAdded = QtCore.pyqtSignal(list)
+  filesRemoved = QtCore.pyqtSignal(list)
+  filesMoved = QtCore.pyqtSignal(list, list)
+  scanFinished = QtCore.pyqtSignal()
+  watchesChanged = QtCore.pyqtSignal(list, list)
+
+  def __init__(self, path: str, parent: typing.Optional[QtCore.QObject] = None,
+               rescan_delay: int = 500) -> None:
+    super().__init__(parent=parent)
+    self.index = LibraryIndex(path)
+    self.mime_database = QtCore.QMimeDatabase()
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(1)
+    self.lock = threading.Lock()
+    self.running = False
+    self.cancel_event = threading.Event()
+    # work for the pool thread, taken under the lock
+    self.startup_pending = False
+    self.emit_known = False
+    self.dirty = set()
+    self.new_roots = []
+    self.removed_roots = []
+
+    self.watcher = QtCore.QFileSystemWatcher(self)
+    self.watcher.directoryChanged.connect(self.directoryChanged)
+    self.watchesChanged.connect(self.updateWatches)
+    # a copy or an unpack touches a directory many times, it is rescanned
+    # once things settle
+    self.changed_directories = set()
+    self.rescan_timer = QtCore.QTimer(self)
+    self.rescan_timer.setSingleShot(True)
+    self.rescan_timer.setInterval(rescan_delay)
+    self.rescan_timer.timeout.connect(self.rescanChanged)
+
+  def roots(self) -> typing.List[str]:
+    return self.index.roots()
+
+  def start(self, emit_known: bool = False):
+    # brings the index up to date with the disk. emit_known reports every
+    # indexed file through filesAdded once that is done, for a playlist
+    # that starts empty, instead of only the differences
+    with self.lock:
+      self.startup_pending = True
+      self.emit_known = emit_known
+    self.schedule()
+
+  def addRoot(self, path: str):
+    path = os.path.normpath(os.path.abspath(path))
+    if path in self.index.roots():
+      return
+    self.index.addRoot(path)
+    with self.lock:
+      self.new_roots.append(path)
+    self.schedule()
+
+  def removeRoot(self, path: str):
+    path = os.path.normpath(os.path.abspath(path))
+    self.index.removeRoot(path)
+    with self.lock:
+      self.removed_roots.append(path)
+    self.schedule()
+
+  def rescan(self, directories: typing.Iterable[str]):
+    with self.lock:
+      self.dirty.update(directories)
+    self.schedule()
+
+  def cancel(self):
+    self.rescan_timer.stop()
+    with self.lock:
+      self.startup_pending = False
+      self.dirty.clear()
+      self.new_roots.clear()
+      self.removed_roots.clear()
+    self.cancel_event.set()
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def close(self):
+    self.cancel()
+    self.wait()
+    self.index.close()
+
+  def schedule(self):
+    with self.lock:
+      self.cancel_event.clear()
+      if self.running:
+        return
+      self.running = True
+    self.pool.start(self.work)
+
+  def directoryChanged(self, path: str):
+    self.changed_directories.add(path)
+    self.rescan_timer.start()
+
+  def rescanChanged(self):
+    directories = self.changed_directories
+    self.changed_directories = set()
+    self.rescan(directories)
+
+  def updateWatches(self, added: typing.List[str], removed: typing.List[str]):
+    watched = set(self.watcher.directories())
+    removed = [path for path in removed if path in watched]
+    if len(removed) != 0:
+      self.watcher.removePaths(removed)
+    added = [path for path in added if path not in watched]
+    if len(added) != 0:
+      self.watcher.addPaths(added)
+
+  def work(self):
+    while True:
+      with self.lock:
+        startup = self.startup_pending
+        emit_known = self.emit_known
+        new_roots = self.new_roots
+        removed_roots = self.removed_roots
+        dirty = self.dirty
+        self.startup_pending = False
+        self.emit_known = False
+        self.new_roots = []
+        self.removed_roots = []
+        self.dirty = set()
+        if not startup and len(new_roots) == 0 and len(removed_roots) == 0 and len(dirty) == 0:
+          self.running = False
+          break
+      scan = LibraryScan()
+      if startup:
+        dirty |= self.staleDirectories(scan)
+        new_roots = [root for root in self.index.roots() if not self.index.hasDirectory(root)] + new_roots
+      for root in removed_roots:
+        self.removeSubtree(root, scan)
+      for root in new_roots:
+        self.walk(root, os.path.dirname(root), scan)
+      for directory in sorted(dirty):
+        if self.cancel_event.is_set():
+          break
+        self.scanDirectory(directory, scan)
+      if self.cancel_event.is_set():
+        continue
+      self.commit(scan, report=not emit_known)
+      if startup:
+        self.watchesChanged.emit([path for path, _ in self.index.directories()], [])
+      if emit_known:
+        paths = self.index.allFiles()
+        for start in range(0, len(paths), EMIT_BATCH):
+          self.filesAdded.emit([QtCore.QUrl.fromLocalFile(path).toString()
+                                for path in paths[start:start + EMIT_BATCH]])
+      self.scanFinished.emit()
+    self.hashMissing()
+
+  def isMediaFile(self, path: str) -> bool:
+    mime_name = self.mime_database.mimeTypeForFile(path, QtCore.QMimeDatabase.MatchExtension).name()
+    return mime_name.startswith("audio/") or mime_name.startswith("video/")
+
+  def staleDirectories(self, scan: LibraryScan) -> typing.Set[str]:
+    # the stat diff: a directory whose mtime moved gets listed again,
+    # for the others only the known files are stat'ed for edits in place
+    dirty = set()
+    files = self.index.filesByDirectory()
+    for directory, mtime_ns in self.index.directories():
+      if self.cancel_event.is_set():
+        break
+      try:
+        stat = os.stat(directory)
+      except OSError:
+        dirty.add(directory)
+        continue
+      if stat.st_mtime_ns != mtime_ns:
+        dirty.add(directory)
+        continue
+      for path, size, file_mtime_ns in files.get(directory, ()):
+        try:
+          stat = os.stat(path)
+        except OSError:
+          dirty.add(directory)
+          break
+        if stat.st_size != size or stat.st_mtime_ns != file_mtime_ns:
+          scan.files.append((path, directory, stat.st_size, stat.st_mtime_ns, None))
+    return dirty
+
+  def scanDirectory(self, directory: str, scan: LibraryScan):
+    # lists one known directory and diffs it against the index, new
+    # subdirectories are walked whole
+    try:
+      stat = os.stat(directory)
+      entries = list(os.scandir(directory))
+    except OSError:
+      self.removeSubtree(directory, scan)
+      return
+    if not self.index.hasDirectory(directory):
+      return
+    known_files = {path: (size, mtime_ns, digest) for path, size, mtime_ns, digest in self.index.files(directory)}
+    known_directories = set(self.index.subdirectories(directory))
+    parent = os.path.dirname(directory)
+    scan.directories.append((directory, parent, stat.st_mtime_ns))
+    for entry in entries:
+      try:
+        if entry.is_dir(follow_symlinks=False):
+          if entry.path in known_directories:
+            known_directories.discard(entry.path)
+          else:
+            self.walk(entry.path, directory, scan)
+        elif entry.is_file() and self.isMediaFile(entry.path):
+          entry_stat = entry.stat()
+          known = known_files.pop(entry.path, None)
+          if known is None:
+            scan.added.append((entry.path, directory, entry_stat.st_size, entry_stat.st_mtime_ns))
+          elif known[:2] != (entry_stat.st_size, entry_stat.st_mtime_ns):
+            scan.files.append((entry.path, directory, entry_stat.st_size, entry_stat.st_mtime_ns, None))
+      except OSError:
+        continue
+    for path, (size, _, digest) in known_files.items():
+      scan.removed_files.append((path, size, digest))
+    for path in known_directories:
+      self.removeSubtree(path, scan)
+
+  def walk(self, directory: str, parent: str, scan: LibraryScan):
+    stack = [(directory, parent)]
+    while len(stack) != 0 and not self.cancel_event.is_set():
+      directory, parent = stack.pop()
+      try:
+        stat = os.stat(directory)
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+      except OSError:
+        continue
+      scan.directories.append((directory, parent, stat.st_mtime_ns))
+      subdirectories = []
+      for entry in entries:
+        try:
+          if entry.is_dir(follow_symlinks=False):
+            subdirectories.append((entry.path, directory))
+          elif entry.is_file() and self.isMediaFile(entry.path):
+            entry_stat = entry.stat()
+            scan.added.append((entry.path, directory, entry_stat.st_size, entry_stat.st_mtime_ns))
+        except OSError:
+          continue
+      stack.extend(reversed(subdirectories))
+
+  def removeSubtree(self, directory: str, scan: LibraryScan):
+    directories, files = self.index.subtree(directory)
+    scan.removed_directories.extend(directories)
+    scan.removed_files.extend((path, size, digest) for path, size, _, digest in files)
+
+  def commit(self, scan: LibraryScan, report: bool = True):
+    # files that disappeared and appeared in the same pass with the same
+    # size and hash moved. Only new files with the size of a removed one
+    # are hashed here, the rest is hashed in the background later
+    removed = set()
+    candidates = collections.defaultdict(list)
+    for path, size, digest in scan.removed_files:
+      removed.add(path)
+      if digest:
+        candidates[(size, digest)].append(path)
+    candidate_sizes = {size for size, _ in candidates}
+    moves = []
+    added = []
+    for path, directory, size, mtime_ns in scan.added:
+      digest = None
+      if size in candidate_sizes:
+        digest = contentHash(path, size)
+        sources = candidates.get((size, digest), None)
+        if sources:
+          old_path = sources.pop()
+          removed.discard(old_path)
+          moves.append((old_path, path, directory, size, mtime_ns))
+          continue
+      added.append(path)
+      scan.files.append((path, directory, size, mtime_ns, digest))
+    # a directory that was rescanned is not removed even if it was under
+    # a removed root a moment ago
+    kept_directories = {path for path, _, _ in scan.directories}
+    removed_directories = [path for path in scan.removed_directories if path not in kept_directories]
+    removed_files = sorted(removed)
+    if scan.isEmpty() and len(moves) == 0:
+      return
+    self.index.apply(scan.directories, removed_directories, scan.files, removed_files, moves)
+
+    watched_directories = [path for path, _, _ in scan.directories]
+    if len(watched_directories) != 0 or len(removed_directories) != 0:
+      self.watchesChanged.emit(watched_directories, removed_directories)
+    if not report:
+      return
+    toUrl = lambda path: QtCore.QUrl.fromLocalFile(path).toString()
+    if len(moves) != 0:
+      self.filesMoved.emit([toUrl(move[0]) for move in moves], [toUrl(move[1]) for move in moves])
+    if len(removed_files) != 0:
+      self.filesRemoved.emit([toUrl(path) for path in removed_files])
+    for start in range(0, len(added), EMIT_BATCH):
+      self.filesAdded.emit([toUrl(path) for path in added[start:start + EMIT_BATCH]])
+
+  def hashMissing(self, chunk: int = 64):
+    # fills in the hashes a walk left out, stops as soon as there is
+    # other work so scans never wait behind it
+    while not self.cancel_event.is_set():
+      with self.lock:
+        if self.startup_pending or len(self.dirty) != 0 or len(self.new_roots) != 0 or \
+           len(self.removed_roots) != 0:
+          return
+      rows = self.index.unhashed(chunk)
+      if len(rows) == 0:
+        return
+      hashes = []
+      for path, size in rows:
+        digest = contentHash(path, size)
+        # unreadable files get an empty hash so they aren't tried forever
+        hashes.append((path, digest if digest is not None else ""))
+      self.index.setHashes(hashes)
@@ -0,0 +1,80 @@
+from PyQt5 import QtCore
+import typing
+import os
+import sqlite3
+import threading
+
+class MediaMetadata(typing.NamedTuple):
+  duration: int = -1
+  artist: str = ""
+  title: str = ""
+  width: int = 0
+  height: int = 0
+  codec: str = ""
+
+def defaultCacheDir() -> str:
+  return QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.CacheLocation)
+
+class MetadataCache:
+  # rows are keyed by path and only valid for the size/mtime they were
+  # probed with, a touched file simply misses and gets probed again
+  def __init__(self, path: typing.Optional[str] = None) -> None:
+    if path is None:
+      path = os.path.join(defaultCacheDir(), "metadata.sqlite")
+    if path != ":memory:":
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    self.lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+    self.connection.execute(
+      "CREATE TABLE IF NOT EXISTS metadata ("
+      "  path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+      "  duration INTEGER, artist TEXT, title TEXT,"
+      "  width INTEGER, height INTEGER, codec TEXT)"
+    )
+    self.connection.commit()
+
+  def lookup(self, path: str, size: int, mtime_ns: int) -> typing.Optional[MediaMetadata]:
+    with self.lock:
+      row = self.connection.execute(
+        "SELECT size, mtime_ns, duration, artist, title, width, height, codec "
+        "FROM metadata WHERE path = ?", (path,)).fetchone()
+    if row is None or row[0] != size or row[1] != mtime_ns:
+      return None
+    return MediaMetadata(*row[2:])
+
+  def get(self, path: str) -> typing.Optional[MediaMetadata]:
+    # the last probe of path whatever the file looks like now, good enough
+    # to show while a scan checks it
+    with self.lock:
+      row = self.connection.execute(
+        "SELECT duration, artist, title, width, height, codec FROM metadata WHERE path = ?", (path,)).fetchone()
+    return MediaMetadata(*row) if row is not None else None
+
+  def store(self, items: typing.List[typing.Tuple[str, int, int, MediaMetadata]]):
+    with self.lock:
+      self.connection.executemany(
+        "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(path, size, mtime_ns) + tuple(metadata) for path, size, mtime_ns, metadata in items])
+      self.connection.commit()
+
+  def invalidate(self, paths: typing.List[str]):
+    with self.lock:
+      self.connection.executemany("DELETE FROM metadata WHERE path = ?", [(path,) for path in paths])
+      self.connection.commit()
+
+  def prune(self):
+    # drops rows of files that no longer exist
+    with self.lock:
+      paths = [row[0] for row in self.connection.execute("SELECT path FROM metadata")]
+    self.invalidate([path for path in paths if not os.path.exists(path)])
+
+  def clear(self):
+    with self.lock:
+      self.connection.execute("DELETE FROM metadata")
+      self.connection.commit()
+
+  def close(self):
+    with self.lock:
+      self.connection.close()
@@ -0,0 +1,170 @@
+from PyQt5 import QtCore
+from model.metadata_cache import MetadataCache, MediaMetadata
+import typing
+import collections
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+FFPROBE = shutil.which("ffprobe")
+
+def findTag(tags: dict, name: str) -> str:
+  for key, value in tags.items():
+    if key.lower() == name:
+      return value
+  return ""
+
+def probeMedia(path: str) -> typing.Optional[MediaMetadata]:
+  # ffprobe is optional, without it nothing gets probed (or cached)
+  if FFPROBE is None:
+    return None
+  try:
+    output = subprocess.run(
+      [FFPROBE, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+      capture_output=True, timeout=30, check=True).stdout
+    info = json.loads(output)
+  except (OSError, subprocess.SubprocessError, ValueError):
+    # a timeout or error isn't cached either, a later scan retries it
+    return None
+
+  media_format = info.get("format", {})
+  streams = info.get("streams", [])
+  tags = media_format.get("tags", {})
+  video = next((s for s in streams if s.get("codec_type") == "video" and
+                not s.get("disposition", {}).get("attached_pic")), None)
+  audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+  main_stream = video if video is not None else audio
+  try:
+    duration = int(float(media_format.get("duration", -0.001)) * 1000)
+  except ValueError:
+    duration = -1
+  return MediaMetadata(
+    duration=duration,
+    artist=findTag(tags, "artist") or findTag(tags, "album_artist"),
+    title=findTag(tags, "title"),
+    width=int(video.get("width", 0)) if video is not None else 0,
+    height=int(video.get("height", 0)) if video is not None else 0,
+    codec=main_stream.get("codec_name", "") if main_stream is not None else "",
+  )
+
+class MetadataScanner(QtCore.QObject):
+  metadataReady = QtCore.pyqtSignal(list)
+  finished = QtCore.pyqtSignal()
+
+  def __init__(self, cache: typing.Optional[MetadataCache] = None,
+               parent: typing.Optional[QtCore.QObject] = None,
+               max_concurrency: int = 4, batch_size: int = 500, flush_interval: float = 0.2) -> None:
+    super().__init__(parent=parent)
+    self.cache = cache if cache is not None else MetadataCache()
+    self.max_concurrency = max(1, max_concurrency)
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(self.max_concurrency)
+    self.lock = threading.Lock()
+    self.queue = collections.deque()
+    self.sources = collections.deque()
+    # urls queued or being probed, a url added again meanwhile isn't
+    # probed twice. They leave once their result is in, a later scan of
+    # the same url goes through the cache again
+    self.pending_urls = set()
+    self.results = []
+    self.probed = []
+    self.last_flush = time.perf_counter()
+    self.running = 0
+
+  def isAvailable(self) -> bool:
+    return FFPROBE is not None
+
+  def scan(self, urls: typing.Iterable[str]):
+    # urls are read on the pool threads a chunk at a time, pass a list or
+    # a copied column, not a view of something the gui thread changes
+    with self.lock:
+      self.sources.append(iter(urls))
+      # a fixed number of workers drain the queue, so concurrency stays
+      # bounded however many files are queued
+      start = self.max_concurrency - self.running
+      self.running += start
+    for _ in range(start):
+      self.pool.start(self.work)
+
+  def fillQueue(self):
+    # called with the lock held
+    while len(self.queue) == 0 and len(self.sources) != 0:
+      chunk = list(itertools.islice(self.sources[0], 256))
+      if len(chunk) == 0:
+        self.sources.popleft()
+      for url in chunk:
+        if url not in self.pending_urls:
+          self.pending_urls.add(url)
+          self.queue.append(url)
+
+  def rescan(self, urls: typing.List[str]):
+    self.cache.invalidate([QtCore.QUrl(url).toLocalFile() for url in urls])
+    self.scan(urls)
+
+  def cancel(self):
+    with self.lock:
+      for url in self.queue:
+        self.pending_urls.discard(url)
+      self.queue.clear()
+      self.sources.clear()
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def work(self):
+    while True:
+      with self.lock:
+        self.fillQueue()
+        if len(self.queue) == 0:
+          self.running -= 1
+          last = self.running == 0
+          break
+        url = self.queue.popleft()
+      item = self.scanUrl(url)
+      with self.lock:
+        if item is None:
+          self.pending_urls.discard(url)
+          continue
+        self.results.append(item)
+        ready = len(self.results) >= self.batch_size or \
+                time.perf_counter() - self.last_flush >= self.flush_interval
+      if ready:
+        self.flush()
+    self.flush()
+    if last:
+      self.finished.emit()
+
+  def scanUrl(self, url: str) -> typing.Optional[typing.Tuple[str, MediaMetadata]]:
+    path = QtCore.QUrl(url).toLocalFile()
+    if len(path) == 0:
+      return None
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+    metadata = self.cache.lookup(path, stat.st_size, stat.st_mtime_ns)
+    if metadata is None:
+      metadata = probeMedia(path)
+      if metadata is None:
+        return None
+      with self.lock:
+        self.probed.append((path, stat.st_size, stat.st_mtime_ns, metadata))
+    return url, metadata
+
+  def flush(self):
+    with self.lock:
+      results, self.results = self.results, []
+      probed, self.probed = self.probed, []
+      self.last_flush = time.perf_counter()
+    if len(probed) != 0:
+      self.cache.store(probed)
+    with self.lock:
+      self.pending_urls.difference_update(url for url, _ in results)
+    if len(results) != 0:
+      self.metadataReady.emit(results)
@@ -0,0 +1,112 @@
+from PyQt5 import QtCore
+from model.playlist_index import PlaylistSearchIndex
+import typing
+import bisect
+
+class PlaylistFilterModel(QtCore.QAbstractProxyModel):
+  # shows the source rows returned by the search index, re-queried
+  # whenever the source rows move. Matches the source hasn't exposed yet
+  # are read through its rowData, so searching never exposes the rows
+  # above them
+  def __init__(self, index: PlaylistSearchIndex, parent: typing.Optional[QtCore.QObject] = None) -> None:
+    super().__init__(parent=parent)
+    self.search_index = index
+    self.query = ""
+    self.rows = []
+    self.refresh_timer = QtCore.QTimer(self)
+    self.refresh_timer.setSingleShot(True)
+    self.refresh_timer.setInterval(0)
+    self.refresh_timer.timeout.connect(self.refresh)
+    # the index catches up on a worker thread, show what it has so far
+    self.search_index.updated.connect(self.indexUpdated)
+
+  def setSourceModel(self, model: QtCore.QAbstractItemModel):
+    if self.sourceModel() is not None:
+      self.sourceModel().rowsInserted.disconnect(self.sourceRowsInserted)
+      self.sourceModel().rowsRemoved.disconnect(self.refresh_timer.start)
+      self.sourceModel().modelReset.disconnect(self.refresh_timer.start)
+      self.sourceModel().rowsChanged.disconnect(self.sourceRowsChanged)
+    self.beginResetModel()
+    super().setSourceModel(model)
+    if model is not None:
+      model.rowsInserted.connect(self.sourceRowsInserted)
+      model.rowsRemoved.connect(self.refresh_timer.start)
+      model.modelReset.connect(self.refresh_timer.start)
+      model.rowsChanged.connect(self.sourceRowsChanged)
+    self.rows = self.search_index.search(self.query) if len(self.query) != 0 else []
+    self.endResetModel()
+
+  def setQuery(self, query: str):
+    self.query = query
+    self.refresh()
+
+  def refresh(self):
+    self.refresh_timer.stop()
+    self.beginResetModel()
+    self.rows = self.search_index.search(self.query) if len(self.query) != 0 else []
+    self.endResetModel()
+
+  def sourceRowsInserted(self, parent: QtCore.QModelIndex, first: int, last: int):
+    # rows the source merely exposed didn't move anything
+    if not self.sourceModel().isFetching():
+      self.refresh_timer.start()
+
+  def indexUpdated(self):
+    if len(self.query) != 0 and not self.refresh_timer.isActive():
+      self.refresh_timer.start(100)
+
+  def sourceRowsChanged(self, first: int, last: int):
+    # the matches within the changed source rows, they're sorted
+    first, last = bisect.bisect_left(self.rows, first), bisect.bisect_right(self.rows, last) - 1
+    if first <= last:
+      self.dataChanged.emit(self.index(first, 0), self.index(last, self.columnCount() - 1))
+
+  def rowCount(self, parent: QtCore.QModelIndex=QtCore.QModelIndex()) -> int:
+    return len(self.rows) if not parent.isValid() else 0
+
+  def columnCount(self, parent: QtCore.QModelIndex=QtCore.QModelIndex()) -> int:
+    if self.sourceModel() is None or parent.isValid():
+      return 0
+    return self.sourceModel().columnCount(QtCore.QModelIndex())
+
+  def index(self, row: int, column: int, parent: QtCore.QModelIndex=QtCore.QModelIndex()) -> QtCore.QModelIndex:
+    if not parent.isValid() and 0 <= row < len(self.rows) and 0 <= column < self.columnCount():
+      return self.createIndex(row, column)
+    return QtCore.QModelIndex()
+
+  def parent(self, child: QtCore.QModelIndex):
+    return QtCore.QModelIndex()
+
+  def data(self, index: QtCore.QModelIndex, role: int=QtCore.Qt.DisplayRole) -> typing.Any:
+    if not index.isValid() or index.row() >= len(self.rows):
+      return QtCore.QVariant()
+    return self.sourceModel().rowData(self.rows[index.row()], index.column(), role)
+
+  def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+    if not index.isValid():
+      return QtCore.Qt.NoItemFlags
+    return QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled
+
+  def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int=QtCore.Qt.DisplayRole) -> typing.Any:
+    # columns are the source's, mapping a cell could hit an unexposed row
+    return self.sourceModel().headerData(section, orientation, role)
+
+  def mapToSource(self, proxy_index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+    if not proxy_index.isValid() or proxy_index.row() >= len(self.rows):
+      return QtCore.QModelIndex()
+    return self.sourceModel().index(self.rows[proxy_index.row()], proxy_index.column())
+
+  def mapFromSource(self, source_index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+    if not source_index.isValid():
+      return QtCore.QModelIndex()
+    return self.index(self.proxyRow(source_index.row()), source_index.column())
+
+  def proxyRow(self, source_row: int) -> int:
+    # -1 when the row doesn't match, exposed in the source or not
+    row = bisect.bisect_left(self.rows, source_row)
+    if row == len(self.rows) or self.rows[row] != source_row:
+      return -1
+    return row
+
+  def sourceRow(self, row: int) -> int:
+    return self.rows[row]
@@ -0,0 +1,402 @@
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore, StringColumn
+import typing
+import array
+import bisect
+import collections
+import itertools
+import operator
+import re
+import sys
+import threading
+
+DEAD_ROW = 0xFFFFFFFF
+WORD_PATTERN = re.compile(r"[^\W_]+")
+# one word queries up to this long match word starts, they'd match most
+# of a big playlist anywhere
+PREFIX_LENGTH = 3
+
+def searchTexts(title: str, url: str) -> typing.Tuple[str, str]:
+  # (title and file name without extension, folder), lowercased. Plain
+  # string slicing, building a QUrl per row is too slow for big playlists
+  location = url.split("://", 1)[-1].lower()
+  directory, _, name = location.rpartition("/")
+  name = name.rpartition(".")[0] or name
+  title = title.lower()
+  return (title if name == title else title + "\n" + name), directory
+
+def trigrams(text: str) -> typing.Set[str]:
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def wordPrefixes(words: typing.Iterable[str]) -> typing.Set[str]:
+  return {word[:length] for word in words for length in range(1, PREFIX_LENGTH + 1)}
+
+class PlaylistSearchIndex(QtCore.QObject):
+  # substring search over titles, file names and folders.
+  # Items are their playlist rows, so every posting is a sorted row array
+  # a search returns as is. The postings are per distinct word and, for
+  # short queries, per word prefix. Words are indexed by their trigrams,
+  # a longer query that is one word matches the items of the words
+  # containing it, which is exact. Anything else narrows down by its
+  # words and is checked against the playlist text.
+  # Rows moving patches the postings past the first moved row: renumbered
+  # copies are made off the lock and swapped in at once, searches never
+  # wait for them. Words of removed items linger until enough pile up to
+  # rebuild.
+  # Indexing runs on one pool thread in playlist order, the gui thread
+  # only copies the new rows' raw text columns, decoding happens there.
+  # Searches run on the gui thread.
+  updated = QtCore.pyqtSignal()
+  rebuildRequested = QtCore.pyqtSignal()
+
+  def __init__(self, play_list: PlaylistStore, parent: typing.Optional[QtCore.QObject] = None,
+               chunk_size: int = 2048) -> None:
+    super().__init__(parent=parent)
+    self.play_list = play_list
+    self.chunk_size = chunk_size
+    self.lock = threading.Lock()
+    self.jobs_lock = threading.Lock()
+    self.jobs = collections.deque()
+    self.running = False
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(1)
+    self.reset()
+    self.rebuildRequested.connect(self.rebuild)
+    self.play_list.mediaInserted.connect(self.insertRows)
+    self.play_list.mediaRemoved.connect(self.removeRows)
+    self.play_list.mediaRunsRemoved.connect(self.removeRuns)
+    self.play_list.mediaChanged.connect(self.changeRows)
+    self.insertRows(0, self.play_list.mediaCount() - 1)
+
+  def reset(self):
+    self.count = 0
+    # items removed or replaced since the vocabulary was built
+    self.dead = 0
+    # word -> word id, word id -> word and the items having it
+    self.word_ids = {}
+    self.words = []
+    self.word_items = []
+    self.word_grams = collections.defaultdict(lambda: array.array("I"))
+    self.prefixes = collections.defaultdict(lambda: array.array("I"))
+    self.directory_ids = {}
+    self.directory_names = []
+    self.directory_items = []
+    self.directory_grams = collections.defaultdict(set)
+    # (query, vocabulary size, matching word ids) of the last one word
+    # query, a longer one only has to look through those words
+    self.last_words = None
+
+  def snapshot(self, start: int, end: int) -> typing.Tuple[StringColumn, StringColumn]:
+    return self.play_list.titles.copyRange(start, end), self.play_list.urls.copyRange(start, end)
+
+  def insertRows(self, start: int, end: int):
+    if end >= start:
+      self.enqueue(("insert", start, self.snapshot(start, end)))
+
+  def removeRows(self, start: int, end: int):
+    self.enqueue(("remove", [(start, end)]))
+
+  def removeRuns(self, runs: typing.List[typing.Tuple[int, int]]):
+    # highest first
+    self.enqueue(("remove", runs[::-1]))
+
+  def changeRows(self, start: int, end: int):
+    self.enqueue(("change", start, self.snapshot(start, end)))
+
+  def rebuild(self):
+    self.enqueue(("reset",))
+    self.insertRows(0, self.play_list.mediaCount() - 1)
+
+  def enqueue(self, job: tuple):
+    with self.jobs_lock:
+      self.jobs.append(job)
+      if self.running:
+        return
+      self.running = True
+    self.pool.start(self.work)
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def work(self):
+    while True:
+      with self.jobs_lock:
+        if len(self.jobs) == 0:
+          self.running = False
+          break
+        job = self.jobs.popleft()
+      if job[0] == "insert":
+        self.applyInsert(job[1], job[2])
+      elif job[0] in ("change", "remove"):
+        # changes or removals queued back to back patch the postings once
+        batch = [job[1:]]
+        with self.jobs_lock:
+          while len(self.jobs) != 0 and self.jobs[0][0] == job[0]:
+            batch.append(self.jobs.popleft()[1:])
+        if job[0] == "change":
+          self.applyChange(batch)
+        else:
+          self.applyRemove([runs for runs, in batch])
+      else:
+        with self.lock:
+          self.reset()
+      self.updated.emit()
+
+  def applyInsert(self, start: int, texts: typing.Tuple[StringColumn, StringColumn]):
+    count = len(texts[0])
+    changes = []
+    if start < self.count:
+      # the rows from start on move down
+      changes = self.patchPostings(start, lambda tail: array.array(
+        "I", map(operator.add, tail, itertools.repeat(count))))
+    with self.lock:
+      self.swap(changes)
+      self.count += count
+    self.fill(start, texts)
+
+  def applyChange(self, changed: typing.List[typing.Tuple[int, typing.Tuple[StringColumn, StringColumn]]]):
+    # the rows stay, they're dropped from their postings and filled in anew
+    mask = bytearray(self.count)
+    for start, texts in changed:
+      mask[start:start + len(texts[0])] = b"\x01" * len(texts[0])
+    first = min(start for start, _ in changed)
+    last = max(start + len(texts[0]) for start, texts in changed)
+
+    def dropRows(tail: array.array) -> typing.Optional[array.array]:
+      end = bisect.bisect_left(tail, last)
+      kept = [row for row in tail[:end] if not mask[row]]
+      return array.array("I", kept) + tail[end:] if len(kept) != end else None
+    changes = self.patchPostings(first, dropRows)
+    with self.lock:
+      self.swap(changes)
+      self.dead += sum(len(texts[0]) for _, texts in changed)
+    for start, texts in changed:
+      self.fill(start, texts)
+
+  def fill(self, start: int, texts: typing.Tuple[StringColumn, StringColumn]):
+    # postings are filled in chunks so searches only ever wait briefly,
+    # they see the new rows once their chunk is in
+    titles, urls = texts
+    count = len(titles)
+    word_ids = self.word_ids
+    # rows past all the others are appended to the postings as they come
+    appending = start + count == self.count
+    for chunk_start in range(0, count, self.chunk_size):
+      chunk_end = min(chunk_start + self.chunk_size, count)
+      chunk = [searchTexts(titles[row], urls[row]) for row in range(chunk_start, chunk_end)]
+      words = [set(WORD_PATTERN.findall(text)) for text, _ in chunk]
+      item_prefixes = [wordPrefixes(item_words) for item_words in words]
+      if appending:
+        word_rows, prefix_rows, directory_rows = self.word_items, self.prefixes, self.directory_items
+      else:
+        # the chunk's rows per posting, spliced in where they belong
+        word_rows = collections.defaultdict(list)
+        prefix_rows = collections.defaultdict(list)
+        directory_rows = collections.defaultdict(list)
+      with self.lock:
+        for row, item_words, item_prefix_set, (_, directory) in zip(
+            range(start + chunk_start, start + chunk_end), words, item_prefixes, chunk):
+          for word in item_words:
+            word_id = word_ids.get(word, None)
+            if word_id is None:
+              word_id = self.addWord(word)
+            word_rows[word_id].append(row)
+          for prefix in item_prefix_set:
+            prefix_rows[prefix].append(row)
+          directory_rows[self.directoryId(directory)].append(row)
+        if appending:
+          continue
+        for postings, added in ((self.word_items, word_rows), (self.prefixes, prefix_rows),
+                                (self.directory_items, directory_rows)):
+          for key, rows in added.items():
+            posting = postings[key]
+            at = bisect.bisect_left(posting, rows[0])
+            posting[at:at] = array.array("I", rows)
+
+  def applyRemove(self, removals: typing.List[typing.List[typing.Tuple[int, int]]]):
+    # ascending runs per removal, each in the rows the one before left
+    count = self.count - sum(end - start + 1 for runs in removals for start, end in runs)
+    if len(removals) == 1 and len(removals[0]) == 1:
+      # one run, the rows after it move up by the same count
+      first, last = removals[0][0]
+      removed = last - first + 1
+      changes = self.patchPostings(first, lambda tail: array.array(
+        "I", map(operator.sub, tail[bisect.bisect_right(tail, last):], itertools.repeat(removed))))
+    else:
+      table = self.removalTable(removals)
+      # rows before the first run of any removal keep their number
+      first = min(runs[0][0] for runs in removals)
+      changes = self.patchPostings(
+        first, lambda tail: array.array("I", [row for row in map(table.__getitem__, tail) if row != DEAD_ROW]))
+    with self.lock:
+      self.swap(changes)
+      self.dead += self.count - count
+      self.count = count
+      needs_rebuild = self.dead > max(count, 10000)
+    if needs_rebuild:
+      # the snapshot for a rebuild has to be taken on the gui thread
+      self.rebuildRequested.emit()
+
+  def removalTable(self, removals: typing.List[typing.List[typing.Tuple[int, int]]]) -> array.array:
+    # the row each row moves to, DEAD_ROW for removed ones
+    count = self.count
+    table = None
+    for runs in removals:
+      step = array.array("I")
+      copied = 0
+      removed = 0
+      for start, end in runs:
+        step.extend(range(copied - removed, start - removed))
+        step.extend(array.array("I", [DEAD_ROW]) * (end - start + 1))
+        removed += end - start + 1
+        copied = end + 1
+      step.extend(range(copied - removed, count - removed))
+      count -= removed
+      table = step if table is None else \
+        array.array("I", [step[row] if row != DEAD_ROW else DEAD_ROW for row in table])
+    return table
+
+  def patchPostings(self, first: int, patch: typing.Callable[[array.array], typing.Optional[array.array]]) -> list:
+    # copies of the postings with their rows from first on patched, None
+    # keeps one. Only the worker writes postings, reading them here
+    # without the lock is safe
+    changes = []
+    for postings, keys in ((self.word_items, range(len(self.word_items))), (self.prefixes, list(self.prefixes)),
+                           (self.directory_items, range(len(self.directory_items)))):
+      for key in keys:
+        posting = postings[key]
+        at = bisect.bisect_left(posting, first)
+        if at == len(posting):
+          continue
+        tail = patch(posting[at:])
+        if tail is not None:
+          changes.append((postings, key, posting[:at] + tail))
+    return changes
+
+  def swap(self, changes: list):
+    for postings, key, posting in changes:
+      postings[key] = posting
+
+  def addWord(self, word: str) -> int:
+    word_id = len(self.words)
+    self.word_ids[word] = word_id
+    self.words.append(word)
+    self.word_items.append(array.array("I"))
+    for gram in trigrams(word):
+      self.word_grams[gram].append(word_id)
+    return word_id
+
+  def directoryId(self, directory: str) -> int:
+    directory_id = self.directory_ids.get(directory, None)
+    if directory_id is None:
+      directory_id = len(self.directory_names)
+      self.directory_ids[directory] = directory_id
+      self.directory_names.append(directory)
+      self.directory_items.append(array.array("I"))
+      for gram in trigrams(directory):
+        self.directory_grams[gram].add(directory_id)
+    return directory_id
+
+  def matchingWords(self, part: str) -> typing.List[int]:
+    # ids of the words containing part
+    last = self.last_words
+    if last is not None and last[1] == len(self.words) and part.startswith(last[0]):
+      # no word was added since, the words containing the previous query
+      # are the only ones left to check
+      candidates = last[2]
+    elif len(part) < 3:
+      candidates = range(len(self.words))
+    else:
+      postings = sorted((self.word_grams.get(gram, ()) for gram in trigrams(part)), key=len)
+      candidates = set(postings[0])
+      for posting in postings[1:]:
+        if len(candidates) == 0:
+          break
+        candidates.intersection_update(posting)
+      candidates = sorted(candidates)
+    words = self.words
+    matches = [word_id for word_id in candidates if part in words[word_id]]
+    self.last_words = (part, len(words), matches)
+    return matches
+
+  def wordsItems(self, word_ids: typing.List[int]) -> typing.Sequence[int]:
+    # increasing rows of the items having any of the words
+    if len(word_ids) == 1:
+      return self.word_items[word_ids[0]]
+    return sorted(set().union(*[self.word_items[word_id] for word_id in word_ids]))
+
+  def partIds(self, part: str, word_start: bool, word_end: bool) -> typing.Sequence[int]:
+    # the items with a word containing part, starting or ending with it
+    if word_start and word_end:
+      word_id = self.word_ids.get(part, None)
+      return self.word_items[word_id] if word_id is not None else ()
+    if word_start and len(part) <= PREFIX_LENGTH:
+      return self.prefixes.get(part, ())
+    words = self.words
+    word_ids = [word_id for word_id in self.matchingWords(part)
+                if (not word_start or words[word_id].startswith(part)) and
+                   (not word_end or words[word_id].endswith(part))]
+    return self.wordsItems(word_ids)
+
+  def matchingIds(self, query: str) -> typing.Sequence[int]:
+    # increasing rows of the items matching query
+    if WORD_PATTERN.fullmatch(query) is not None:
+      # word prefix postings are exact, as are the words containing longer
+      # queries
+      return self.partIds(query, len(query) <= PREFIX_LENGTH, False)
+
+    # a phrase, each of its words narrows the items down to the ones with
+    # a word it can be part of, the fewest are checked against the text
+    parts = [(match.group(), match.start() != 0, match.end() != len(query))
+             for match in WORD_PATTERN.finditer(query)]
+    if len(parts) == 0:
+      candidates = range(self.count)
+    else:
+      candidates = min((self.partIds(*part) for part in parts), key=len)
+    titles = self.play_list.titles
+    urls = self.play_list.urls
+    count = len(urls)
+    matches = []
+    for row in candidates:
+      # the playlist can be ahead of the index, those rows show up once
+      # it caught up
+      if row < count and query in searchTexts(titles[row], urls[row])[0]:
+        matches.append(row)
+    return matches
+
+  def search(self, query: str) -> typing.Sequence[int]:
+    # increasing rows, an array when they come straight from a posting
+    query = query.strip().lower()
+    with self.lock:
+      if len(query) == 0:
+        return list(range(self.count))
+
+      rows = self.matchingIds(query)
+      if len(query) > PREFIX_LENGTH:
+        directory_candidates = None
+        for gram in trigrams(query):
+          matches = self.directory_grams.get(gram, set())
+          directory_candidates = matches if directory_candidates is None else directory_candidates & matches
+        directory_items = [self.directory_items[directory_id] for directory_id in directory_candidates or ()
+                           if query in self.directory_names[directory_id]]
+        if len(directory_items) != 0:
+          rows = sorted(set(rows).union(*directory_items))
+      # a copy, postings keep changing on the worker thread
+      rows = rows[:]
+
+    # rows the playlist already removed, the index is catching up
+    count = self.play_list.mediaCount()
+    if len(rows) != 0 and rows[-1] >= count:
+      del rows[bisect.bisect_left(rows, count):]
+    return rows
+
+  def memoryFootprint(self) -> int:
+    with self.lock:
+      total = 0
+      for postings in (self.prefixes.values(), self.word_grams.values(), self.directory_items):
+        for posting in postings:
+          total += len(posting) * 4
+      # most words are rare, their string and array headers weigh more
+      # than their items
+      total += sum(sys.getsizeof(word) + sys.getsizeof(items) for word, items in zip(self.words, self.word_items))
+    return total
@@ -0,0 +1,193 @@
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore
+from model.m3u import parseM3U, M3UError, isLocalPath
+import typing
+import os
+import threading
+import time
+
+PLAYLIST_SUFFIXES = ("m3u", "m3u8")
+
+def isPlaylistFile(path: str) -> bool:
+  return path.split(".")[-1].lower() in PLAYLIST_SUFFIXES and os.path.exists(path)
+
+class PlaylistAddWorker(QtCore.QObject):
+  batchReady = QtCore.pyqtSignal(int, list, list, list)
+  progress = QtCore.pyqtSignal(int, int, int, int)
+  playlistLoaded = QtCore.pyqtSignal(str)
+  playlistLoadFailed = QtCore.pyqtSignal(str)
+  playlistLineError = QtCore.pyqtSignal(str, int, str)
+  finished = QtCore.pyqtSignal(int)
+
+  def __init__(self, generation: int, urls: typing.List[QtCore.QUrl],
+               batch_size: int, flush_interval: float, first_batch_size: int = 256) -> None:
+    super().__init__()
+    self.generation = generation
+    self.urls = urls
+    self.batch_size = batch_size
+    self.first_batch_size = first_batch_size
+    self.flush_interval = flush_interval
+    self.cancel_event = threading.Event()
+    self.mime_database = QtCore.QMimeDatabase()
+    self.batch_urls = []
+    self.batch_titles = []
+    self.batch_durations = []
+    self.last_flush = 0.0
+    self.flushed = 0
+    self.added = 0
+    self.done = 0
+    self.total = 0
+
+  def cancel(self):
+    self.cancel_event.set()
+
+  @QtCore.pyqtSlot()
+  def run(self):
+    self.total = len(self.urls)
+    self.last_flush = time.perf_counter()
+    for url in self.urls:
+      if self.cancel_event.is_set():
+        break
+      if not url.isLocalFile():
+        self.append(url.toString(), url.fileName())
+      else:
+        path = url.toLocalFile()
+        if os.path.isdir(path):
+          self.addDirectory(path)
+        elif isPlaylistFile(path):
+          self.addPlaylistFile(path)
+        elif os.path.exists(path):
+          self.append(url.toString(), os.path.basename(path))
+      self.done += 1
+    self.flush(force=True)
+    self.finished.emit(self.generation)
+
+  def isMediaFile(self, path: str) -> bool:
+    mime_type = self.mime_database.mimeTypeForFile(path, QtCore.QMimeDatabase.MatchExtension)
+    if mime_type.isDefault():
+      # no or an unknown extension, the file's header tells, we are off
+      # the gui thread here
+      mime_type = self.mime_database.mimeTypeForFile(path, QtCore.QMimeDatabase.MatchContent)
+    mime_name = mime_type.name()
+    return mime_name.startswith("audio/") or mime_name.startswith("video/")
+
+  def addDirectory(self, path: str):
+    for root, dirs, files in os.walk(path):
+      dirs.sort()
+      for name in sorted(files):
+        if self.cancel_event.is_set():
+          return
+        file_path = os.path.join(root, name)
+        if name.split(".")[-1].lower() not in PLAYLIST_SUFFIXES and self.isMediaFile(file_path):
+          self.append(QtCore.QUrl.fromLocalFile(file_path).toString(), name)
+
+  def addPlaylistFile(self, path: str):
+    try:
+      for item in parseM3U(path, cancel_event=self.cancel_event):
+        if isinstance(item, M3UError):
+          self.playlistLineError.emit(path, item.line, item.message)
+        elif isLocalPath(item.location):
+          url = QtCore.QUrl.fromLocalFile(item.location)
+          self.append(url.toString(), item.title or url.fileName(), item.duration)
+        else:
+          self.append(item.location, item.title or QtCore.QUrl(item.location).fileName(), item.duration)
+    except OSError:
+      self.playlistLoadFailed.emit(path)
+      return
+    self.playlistLoaded.emit(path)
+
+  def append(self, url: str, title: str, duration: int = -1):
+    self.batch_urls.append(url)
+    self.batch_titles.append(title)
+    self.batch_durations.append(duration)
+    self.added += 1
+    self.flush()
+
+  def flush(self, force: bool = False):
+    # batches start small and double up to batch_size, so the first rows
+    # show up right away without flooding the gui thread later on
+    now = time.perf_counter()
+    limit = min(self.batch_size, max(self.first_batch_size, self.flushed))
+    if not force and len(self.batch_urls) < limit and \
+       now - self.last_flush < self.flush_interval:
+      return
+    self.last_flush = now
+    if len(self.batch_urls) != 0:
+      self.batchReady.emit(self.generation, self.batch_urls, self.batch_titles, self.batch_durations)
+      self.flushed += len(self.batch_urls)
+      self.batch_urls = []
+      self.batch_titles = []
+      self.batch_durations = []
+    self.progress.emit(self.generation, self.added, self.done, self.total)
+
+class PlaylistLoader(QtCore.QObject):
+  progress = QtCore.pyqtSignal(int, int, int)
+  playlistLoaded = QtCore.pyqtSignal(str)
+  playlistLoadFailed = QtCore.pyqtSignal(str)
+  playlistLineError = QtCore.pyqtSignal(str, int, str)
+  started = QtCore.pyqtSignal()
+  finished = QtCore.pyqtSignal()
+
+  def __init__(self, play_list: PlaylistStore, parent: typing.Optional[QtCore.QObject] = None,
+               batch_size: int = 5000, flush_interval: float = 0.1) -> None:
+    super().__init__(parent=parent)
+    self.play_list = play_list
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.generation = 0
+    self.active_generations = set()
+    self.jobs = {}
+
+  def isRunning(self) -> bool:
+    return len(self.jobs) != 0
+
+  def start(self, urls: typing.List[QtCore.QUrl]):
+    self.generation += 1
+    generation = self.generation
+    thread = QtCore.QThread(self)
+    worker = PlaylistAddWorker(generation, list(urls), self.batch_size, self.flush_interval)
+    worker.moveToThread(thread)
+
+    thread.started.connect(worker.run)
+    worker.batchReady.connect(self.onBatchReady)
+    worker.progress.connect(self.onProgress)
+    worker.playlistLoaded.connect(self.playlistLoaded)
+    worker.playlistLoadFailed.connect(self.playlistLoadFailed)
+    worker.playlistLineError.connect(self.playlistLineError)
+    worker.finished.connect(self.onWorkerFinished)
+
+    # the worker has no parent, this keeps it alive until its thread is done
+    self.jobs[generation] = (thread, worker)
+    self.active_generations.add(generation)
+    if len(self.jobs) == 1:
+      self.started.emit()
+    thread.start()
+
+  def cancel(self):
+    for thread, worker in self.jobs.values():
+      worker.cancel()
+    # batches still queued for the cancelled generations are dropped
+    self.active_generations.clear()
+
+  def wait(self):
+    for thread, worker in list(self.jobs.values()):
+      thread.quit()
+      thread.wait()
+
+  def onBatchReady(self, generation: int, urls: typing.List[str], titles: typing.List[str],
+                   durations: typing.List[int]):
+    if generation in self.active_generations:
+      self.play_list.addMedia(urls, titles, durations)
+
+  def onProgress(self, generation: int, added: int, done: int, total: int):
+    if generation in self.active_generations:
+      self.progress.emit(added, done, total)
+
+  def onWorkerFinished(self, generation: int):
+    thread, worker = self.jobs.pop(generation)
+    self.active_generations.discard(generation)
+    thread.quit()
+    thread.wait()
+    thread.deleteLater()
+    if len(self.jobs) == 0:
+      self.finished.emit()
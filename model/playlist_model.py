@@ -1,21 +1,70 @@
 
-from PyQt5 import QtCore, QtGui, QtWidgets, QtMultimedia, QtMultimediaWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
+from model.playlist_store import PlaylistStore
+from model.metadata_cache import MediaMetadata, MetadataCache
+from model.thumbnail_cache import ThumbnailProvider
 import typing
+import bisect
+import collections
 import enum
 
 class PlaylistColumnEnum(enum.Enum):
   Title=0
-  Count=1
+  Artist=1
+  Duration=2
+  Resolution=3
+  Codec=4
+  Count=5
+
+COLUMN_HEADERS = ["Title", "Artist", "Duration", "Resolution", "Codec"]
+
+def formatDuration(milliseconds: int) -> str:
+  if milliseconds < 0:
+    return ""
+  seconds = milliseconds // 1000
+  if seconds >= 3600:
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+  return "{}:{:02d}".format(seconds // 60, seconds % 60)
 
 class PlaylistModel(QtCore.QAbstractItemModel):
-  def __init__(self, parent: typing.Optional[QtCore.QObject]) -> None:
+  # rows are exposed to views batch_size at a time through fetchMore, so
+  # a million row playlist costs a view no more than what was scrolled
+  # through. Display texts are cached per row for at most cache_rows rows,
+  # the cache shifts with inserts and removes instead of starting over.
+  # Scanned metadata is kept for as many urls, older urls are read back
+  # from the metadata cache when their rows come into view again
+  # rows first..last changed, exposed or not
+  rowsChanged = QtCore.pyqtSignal(int, int)
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject], batch_size: int = 1000,
+               cache_rows: int = 4096) -> None:
     super().__init__(parent=parent)
     self.media_playlist = None
-    self.data_dict = {}
+    self.batch_size = batch_size
+    self.cache_rows = cache_rows
+    self.fetched = 0
+    self.fetching = False
+    # row -> (url, column texts), least recently used first
+    self.data_dict = collections.OrderedDict()
+    # row -> {column: value} from setData
+    self.edits = {}
+    # what the playlist is about to insert or remove, (start, end,
+    # exposed rows) between its about to and done signals
+    self.pending = None
+    # url -> MediaMetadata, least recently used first
+    self.metadata = collections.OrderedDict()
+    self.metadata_cache = None
+    # source rows last prefetched, what a refresh repaints
+    self.visible = None
+    self.thumbnail_provider = None
+    self.refresh_timer = QtCore.QTimer(self)
+    self.refresh_timer.setSingleShot(True)
+    self.refresh_timer.setInterval(100)
+    self.refresh_timer.timeout.connect(self.emitVisibleChanged)
 
   def rowCount(self, parent: QtCore.QModelIndex) -> int:
     if self.media_playlist is not None and not parent.isValid():
-      return self.media_playlist.mediaCount()
+      return self.fetched
     else:
       return 0
 
@@ -25,10 +74,38 @@ class PlaylistModel(QtCore.QAbstractItemModel):
     else:
       return 0
 
+  def canFetchMore(self, parent: QtCore.QModelIndex) -> bool:
+    return self.media_playlist is not None and not parent.isValid() and \
+           self.fetched < self.media_playlist.mediaCount()
+
+  def fetchMore(self, parent: QtCore.QModelIndex):
+    if self.canFetchMore(parent):
+      self.fetchUpTo(self.fetched + self.batch_size - 1)
+
+  def fetchUpTo(self, row: int):
+    # exposes every row up to `row`, e.g. before selecting it. Not again
+    # from a slot of the insert signals while it's at it
+    if self.media_playlist is None or self.fetching:
+      return
+    row = min(row, self.media_playlist.mediaCount() - 1)
+    if row < self.fetched:
+      return
+    self.fetching = True
+    self.beginInsertRows(QtCore.QModelIndex(), self.fetched, row)
+    self.fetched = row + 1
+    self.endInsertRows()
+    self.fetching = False
+
+  def isFetching(self) -> bool:
+    # rows being exposed rather than added to the playlist
+    return self.fetching
+
   def index(self, row: int, column: int, parent: QtCore.QModelIndex=QtCore.QModelIndex()) -> QtCore.QModelIndex:
+    # exposed rows only, a filter proxy reads its matches further down
+    # through rowData and hears of their changes through rowsChanged
     if self.media_playlist is not None and \
        not parent.isValid() and \
-       row >= 0 and row < self.media_playlist.mediaCount() and \
+       row >= 0 and row < self.fetched and \
        column >= 0 and column < PlaylistColumnEnum.Count.value:
       return self.createIndex(row, column)
     else:
@@ -38,27 +115,148 @@ class PlaylistModel(QtCore.QAbstractItemModel):
     return QtCore.QModelIndex()
 
   def data(self, index: QtCore.QModelIndex, role: int) -> typing.Any:
-    if index.isValid() and role == QtCore.Qt.DisplayRole:
-      value = self.data_dict.get(index, None)
-      if value is None and index.column() == PlaylistColumnEnum.Title.value:
-        location = self.media_playlist.media(index.row()).canonicalUrl()
-        return QtCore.QFileInfo(location.path()).fileName()
-      return value
+    if not index.isValid() or index.row() >= self.fetched:
+      return QtCore.QVariant()
+    return self.rowData(index.row(), index.column(), role)
+
+  def rowData(self, row: int, column: int, role: int) -> typing.Any:
+    # any playlist row, exposed or not
+    if self.media_playlist is None or row < 0 or row >= self.media_playlist.mediaCount():
+      return QtCore.QVariant()
+    if role == QtCore.Qt.DisplayRole:
+      edit = self.edits.get(row, None)
+      if edit is not None and column in edit:
+        return edit[column]
+      return self.rowTexts(row)[column]
+    elif role == QtCore.Qt.DecorationRole and \
+         column == PlaylistColumnEnum.Title.value and self.thumbnail_provider is not None:
+      image = self.thumbnail_provider.thumbnail(self.media_playlist.url(row))
+      if image is not None:
+        return image
     return QtCore.QVariant()
 
+  def rowTexts(self, row: int) -> typing.Tuple[str, ...]:
+    entry = self.data_dict.get(row, None)
+    if entry is not None:
+      self.data_dict.move_to_end(row)
+      return entry[1]
+    url = self.media_playlist.url(row)
+    texts = self.columnTexts(row, url)
+    self.data_dict[row] = (url, texts)
+    while len(self.data_dict) > self.cache_rows:
+      self.data_dict.popitem(last=False)
+    return texts
+
+  def prefetch(self, rows: typing.Iterable[int]):
+    # fills the cache for rows about to be painted, e.g. the visible ones
+    # and a margin around them. A filtered view asks for rows not exposed
+    # here yet, they're served all the same
+    count = self.media_playlist.mediaCount() if self.media_playlist is not None else 0
+    rows = [row for row in rows if 0 <= row < count]
+    for row in rows:
+      self.rowTexts(row)
+    self.visible = (min(rows), max(rows)) if len(rows) != 0 else None
+
+  def columnTexts(self, row: int, url: str) -> typing.Tuple[str, ...]:
+    # every column at once, the metadata is looked up once
+    metadata = self.urlMetadata(url)
+    if metadata is None:
+      return (self.media_playlist.title(row), "", formatDuration(self.media_playlist.duration(row) * 1000), "", "")
+    title = metadata.title if len(metadata.title) != 0 else self.media_playlist.title(row)
+    duration = metadata.duration if metadata.duration >= 0 else self.media_playlist.duration(row) * 1000
+    resolution = "{}x{}".format(metadata.width, metadata.height) if metadata.width else ""
+    return (title, metadata.artist, formatDuration(duration), resolution, metadata.codec)
+
+  def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int=QtCore.Qt.DisplayRole) -> typing.Any:
+    if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole and \
+       section >= 0 and section < PlaylistColumnEnum.Count.value:
+      return COLUMN_HEADERS[section]
+    return QtCore.QVariant()
+
+  def urlMetadata(self, url: str) -> typing.Optional[MediaMetadata]:
+    metadata = self.metadata.get(url, None)
+    if metadata is not None:
+      self.metadata.move_to_end(url)
+      return metadata
+    if self.metadata_cache is None:
+      return None
+    path = QtCore.QUrl(url).toLocalFile()
+    metadata = self.metadata_cache.get(path) if len(path) != 0 else None
+    if metadata is not None:
+      self.addMetadata(url, metadata)
+    return metadata
+
+  def addMetadata(self, url: str, metadata: MediaMetadata):
+    self.metadata[url] = metadata
+    self.metadata.move_to_end(url)
+    while len(self.metadata) > self.cache_rows:
+      self.metadata.popitem(last=False)
+
+  def setMetadataCache(self, cache: typing.Optional[MetadataCache]):
+    # where metadata that fell out of memory is read back from, the
+    # scanner stores a result there before handing it over
+    self.metadata_cache = cache
+
+  def setMetadata(self, items: typing.List[typing.Tuple[str, MediaMetadata]]):
+    for url, metadata in items:
+      self.addMetadata(url, metadata)
+    urls = {url for url, _ in items}
+    for row in [row for row, (url, _) in self.data_dict.items() if url in urls]:
+      del self.data_dict[row]
+    self.scheduleRefresh()
+
+  def setThumbnailProvider(self, provider: ThumbnailProvider):
+    if self.thumbnail_provider is not None:
+      self.thumbnail_provider.thumbnailReady.disconnect(self.scheduleRefresh)
+    self.thumbnail_provider = provider
+    if self.thumbnail_provider is not None:
+      self.thumbnail_provider.thumbnailReady.connect(self.scheduleRefresh)
+
+  def scheduleRefresh(self):
+    # scanner and thumbnail results trickle in, repaint once per interval
+    if not self.refresh_timer.isActive():
+      self.refresh_timer.start()
+
+  def emitVisibleChanged(self):
+    # only what the view painted, the rest is read fresh when it scrolls
+    # into view. Before the first prefetch that's the start of the list
+    if self.media_playlist is None:
+      return
+    if self.visible is not None:
+      first, last = self.visible[0], min(self.visible[1], self.media_playlist.mediaCount() - 1)
+    else:
+      first, last = 0, min(self.fetched, self.media_playlist.mediaCount(), self.cache_rows) - 1
+    self.emitRowsChanged(first, last)
+
+  def emitRowsChanged(self, first: int, last: int):
+    # rowsChanged for all of them, dataChanged for the exposed ones
+    if first > last:
+      return
+    self.rowsChanged.emit(first, last)
+    last = min(last, self.fetched - 1)
+    if first <= last:
+      self.dataChanged.emit(self.index(first, 0), self.index(last, PlaylistColumnEnum.Count.value - 1))
+
   def playlist(self):
     return self.media_playlist
 
-  def setPlaylist(self, playlist: QtMultimedia.QMediaPlaylist):
+  def setPlaylist(self, playlist: PlaylistStore):
     if self.media_playlist is not None:
       self.media_playlist.mediaAboutToBeInserted.disconnect(self.beginInsertItems)
       self.media_playlist.mediaInserted.disconnect(self.endInsertItems)
       self.media_playlist.mediaAboutToBeRemoved.disconnect(self.beginRemoveItems)
       self.media_playlist.mediaRemoved.disconnect(self.endRemoveItems)
       self.media_playlist.mediaChanged.disconnect(self.changeItems)
+      self.media_playlist.mediaRunsAboutToBeRemoved.disconnect(self.beginRemoveRuns)
+      self.media_playlist.mediaRunsRemoved.disconnect(self.endRemoveRuns)
 
     self.beginResetModel()
     self.media_playlist = playlist
+    self.fetched = min(playlist.mediaCount(), self.batch_size) if playlist is not None else 0
+    self.data_dict.clear()
+    self.edits.clear()
+    self.pending = None
+    self.visible = None
 
     if self.media_playlist is not None:
       self.media_playlist.mediaAboutToBeInserted.connect(self.beginInsertItems)
@@ -66,29 +264,97 @@ class PlaylistModel(QtCore.QAbstractItemModel):
       self.media_playlist.mediaAboutToBeRemoved.connect(self.beginRemoveItems)
       self.media_playlist.mediaRemoved.connect(self.endRemoveItems)
       self.media_playlist.mediaChanged.connect(self.changeItems)
+      self.media_playlist.mediaRunsAboutToBeRemoved.connect(self.beginRemoveRuns)
+      self.media_playlist.mediaRunsRemoved.connect(self.endRemoveRuns)
 
     self.endResetModel()
 
   def setData(self, index: QtCore.QModelIndex, value: typing.Any, role: int=QtCore.Qt.EditRole) -> bool:
-    self.data_dict[index] = value
+    self.edits.setdefault(index.row(), {})[index.column()] = value
+    self.rowsChanged.emit(index.row(), index.row())
     self.dataChanged.emit(index, index)
     return True
 
+  def shiftRows(self, start: int, offset: int):
+    # rows from start on moved by offset, the cache follows them
+    self.data_dict = collections.OrderedDict(
+      (row + offset if row >= start else row, entry) for row, entry in self.data_dict.items())
+    self.edits = {row + offset if row >= start else row: edit for row, edit in self.edits.items()}
+
+  def dropRows(self, start: int, end: int):
+    for row in [row for row in self.data_dict if start <= row <= end]:
+      del self.data_dict[row]
+    for row in [row for row in self.edits if start <= row <= end]:
+      del self.edits[row]
+
   def beginInsertItems(self, start: int, end: int):
-    self.data_dict.clear()
-    self.beginInsertRows(QtCore.QModelIndex(), start, end)
+    count = end - start + 1
+    if start < self.fetched:
+      exposed = count
+    elif start == self.fetched == self.media_playlist.mediaCount():
+      # appended to a fully exposed playlist, the first batch shows up
+      # right away and the rest as the view asks for it
+      exposed = min(count, self.batch_size)
+    else:
+      exposed = 0
+    self.pending = (start, end, exposed)
+    if exposed != 0:
+      self.beginInsertRows(QtCore.QModelIndex(), start, start + exposed - 1)
 
   def endInsertItems(self):
-    self.endInsertRows()
+    start, end, exposed = self.pending
+    self.pending = None
+    self.shiftRows(start, end - start + 1)
+    if exposed != 0:
+      self.fetched += exposed
+      self.endInsertRows()
 
   def beginRemoveItems(self, start: int, end: int):
-    self.data_dict.clear()
-    self.beginRemoveRows(QtCore.QModelIndex(), start, end)
+    exposed = max(min(end, self.fetched - 1) - start + 1, 0)
+    self.pending = (start, end, exposed)
+    if exposed != 0:
+      self.beginRemoveRows(QtCore.QModelIndex(), start, start + exposed - 1)
 
   def endRemoveItems(self):
-    self.endRemoveRows()
+    start, end, exposed = self.pending
+    self.pending = None
+    self.dropRows(start, end)
+    self.shiftRows(end + 1, start - end - 1)
+    if exposed != 0:
+      self.fetched -= exposed
+      self.endRemoveRows()
+
+  def beginRemoveRuns(self, runs: typing.List[typing.Tuple[int, int]]):
+    # rows removed all over the playlist, one reset costs a view less than
+    # a removal per run
+    self.beginResetModel()
+
+  def endRemoveRuns(self, runs: typing.List[typing.Tuple[int, int]]):
+    runs = runs[::-1]
+    ends = [end for _, end in runs]
+    above = [0]
+    for start, end in runs:
+      above.append(above[-1] + end - start + 1)
+
+    def removedBelow(row: int) -> int:
+      run = bisect.bisect_left(ends, row)
+      return above[run] + (max(row - runs[run][0], 0) if run < len(runs) else 0)
+
+    def moved(row: int) -> typing.Optional[int]:
+      run = bisect.bisect_left(ends, row)
+      if run < len(runs) and runs[run][0] <= row:
+        return None
+      return row - above[run]
+
+    # the cache follows the rows it holds, the exposed rows shrink by the
+    # removed ones among them
+    self.data_dict = collections.OrderedDict(
+      (moved(row), entry) for row, entry in self.data_dict.items() if moved(row) is not None)
+    self.edits = {moved(row): edit for row, edit in self.edits.items() if moved(row) is not None}
+    self.fetched = min(self.fetched - removedBelow(self.fetched), self.media_playlist.mediaCount())
+    self.visible = None
+    self.endResetModel()
 
   def changeItems(self, start: int, end: int):
-    self.data_dict.clear()
-    self.dataChanged.emit(self.index(start, 0), 
-                          self.index(end, PlaylistColumnEnum.Count.value))  
\ No newline at end of file
+    self.dropRows(start, end)
+    self.emitRowsChanged(start, end)
@@ -0,0 +1,484 @@
+from PyQt5 import QtCore
+import typing
+import enum
+import array
+import itertools
+import random
+
+class PlaybackModeEnum(enum.Enum):
+  CurrentItemOnce=0
+  CurrentItemInLoop=1
+  Sequential=2
+  Loop=3
+  Random=4
+
+class StringColumn:
+  # utf-8 bytes of every row back to back, row i lives in
+  # buffer[offsets[i]:offsets[i + 1]]
+  def __init__(self) -> None:
+    self.buffer = bytearray()
+    self.offsets = array.array("Q", [0])
+
+  @classmethod
+  def fromBuffers(cls, buffer: memoryview, offsets: memoryview) -> "StringColumn":
+    # read-only views, e.g. into a mapped session file. Rows are decoded
+    # straight from them, the first edit copies them into owned arrays
+    column = cls()
+    column.buffer = buffer
+    column.offsets = offsets
+    return column
+
+  def isMapped(self) -> bool:
+    return not isinstance(self.buffer, bytearray)
+
+  def materialize(self):
+    if self.isMapped():
+      offsets = array.array("Q")
+      offsets.frombytes(self.offsets.cast("B"))
+      self.buffer = bytearray(self.buffer)
+      self.offsets = offsets
+
+  def __len__(self) -> int:
+    return len(self.offsets) - 1
+
+  def __getitem__(self, row: int) -> str:
+    return bytes(self.buffer[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+  def __iter__(self) -> typing.Iterator[str]:
+    for row in range(len(self)):
+      yield self[row]
+
+  def copyRange(self, start: int, end: int) -> "StringColumn":
+    # rows start..end as a standalone column, copying bytes instead of
+    # decoding rows. Safe to hand to another thread
+    column = StringColumn()
+    base = self.offsets[start]
+    column.buffer = bytearray(self.buffer[base:self.offsets[end + 1]])
+    column.offsets = array.array("Q")
+    column.offsets.frombytes(memoryview(self.offsets)[start:end + 2].cast("B"))
+    if base != 0:
+      column.offsets = array.array("Q", [offset - base for offset in column.offsets])
+    return column
+
+  def insert(self, pos: int, values: typing.List[str]):
+    self.materialize()
+    encoded = [value.encode("utf-8") for value in values]
+    blob = b"".join(encoded)
+    base = self.offsets[pos]
+    inserted = array.array("Q", itertools.accumulate(map(len, encoded), initial=base))
+    tail = self.offsets[pos + 1:]
+    if len(blob) != 0 and len(tail) != 0:
+      tail = array.array("Q", [offset + len(blob) for offset in tail])
+    self.buffer[base:base] = blob
+    self.offsets[pos:] = inserted + tail
+
+  def remove(self, start: int, end: int):
+    self.materialize()
+    low = self.offsets[start]
+    high = self.offsets[end + 1]
+    tail = self.offsets[end + 2:]
+    if high != low and len(tail) != 0:
+      tail = array.array("Q", [offset - (high - low) for offset in tail])
+    del self.buffer[low:high]
+    self.offsets[start + 1:] = tail
+
+  def removeRuns(self, runs: typing.List[typing.Tuple[int, int]]):
+    # (start, end) runs of rows, ascending and apart. The buffer and
+    # offsets are rebuilt once, the rows kept are copied over with their
+    # offsets moved up by what was removed above them
+    if len(runs) == 0:
+      return
+    self.materialize()
+    buffer = self.buffer
+    offsets = self.offsets
+    new_buffer = bytearray()
+    new_offsets = array.array("Q")
+    delta = 0
+    copied = 0
+    for start, end in runs:
+      new_buffer += buffer[offsets[copied]:offsets[start]]
+      starts = offsets[copied:start]
+      new_offsets.extend(starts if delta == 0 else array.array("Q", [offset - delta for offset in starts]))
+      delta += offsets[end + 1] - offsets[start]
+      copied = end + 1
+    new_buffer += buffer[offsets[copied]:]
+    starts = offsets[copied:]
+    new_offsets.extend(starts if delta == 0 else array.array("Q", [offset - delta for offset in starts]))
+    self.buffer = new_buffer
+    self.offsets = new_offsets
+
+  def find(self, values: typing.Iterable[str]) -> typing.Dict[str, int]:
+    # first row of each value, compared as bytes without decoding rows
+    wanted = {value.encode("utf-8"): value for value in values}
+    rows = {}
+    buffer = self.buffer
+    offsets = self.offsets
+    for row in range(len(offsets) - 1):
+      if len(rows) == len(wanted):
+        break
+      value = wanted.get(bytes(buffer[offsets[row]:offsets[row + 1]]), None)
+      if value is not None and value not in rows:
+        rows[value] = row
+    return rows
+
+  def replace(self, row: int, value: str):
+    self.replaceRows({row: value})
+
+  def replaceRows(self, values: typing.Dict[int, str]):
+    # row -> new value. The buffer and offsets are rebuilt once, the rows
+    # in between are copied over with their offsets moved by what the
+    # replaced rows above them grew or shrank
+    if len(values) == 0:
+      return
+    self.materialize()
+    buffer = self.buffer
+    offsets = self.offsets
+    new_buffer = bytearray()
+    new_offsets = array.array("Q")
+    delta = 0
+    copied = 0
+    for row in sorted(values):
+      encoded = values[row].encode("utf-8")
+      new_buffer += buffer[offsets[copied]:offsets[row]]
+      starts = offsets[copied:row + 1]
+      new_offsets.extend(starts if delta == 0 else array.array("Q", [offset + delta for offset in starts]))
+      new_buffer += encoded
+      delta += len(encoded) - (offsets[row + 1] - offsets[row])
+      copied = row + 1
+    new_buffer += buffer[offsets[copied]:]
+    starts = offsets[copied:]
+    new_offsets.extend(starts if delta == 0 else array.array("Q", [offset + delta for offset in starts]))
+    self.buffer = new_buffer
+    self.offsets = new_offsets
+
+  def clear(self):
+    self.buffer = bytearray()
+    self.offsets = array.array("Q", [0])
+
+  def nbytes(self) -> int:
+    return len(self.buffer) + len(self.offsets) * self.offsets.itemsize
+
+class PlaylistStore(QtCore.QObject):
+  mediaAboutToBeInserted = QtCore.pyqtSignal(int, int)
+  mediaInserted = QtCore.pyqtSignal(int, int)
+  mediaAboutToBeRemoved = QtCore.pyqtSignal(int, int)
+  mediaRemoved = QtCore.pyqtSignal(int, int)
+  mediaChanged = QtCore.pyqtSignal(int, int)
+  # many rows removed at once by removeMediaRows, a list of (start, end)
+  # runs, highest first so applying them one by one keeps rows valid
+  mediaRunsAboutToBeRemoved = QtCore.pyqtSignal(list)
+  mediaRunsRemoved = QtCore.pyqtSignal(list)
+  currentIndexChanged = QtCore.pyqtSignal(int)
+  # the current item stayed the same, rows were inserted or removed above it
+  currentIndexShifted = QtCore.pyqtSignal(int)
+  playbackModeChanged = QtCore.pyqtSignal(object)
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None) -> None:
+    super().__init__(parent=parent)
+    self.urls = StringColumn()
+    self.titles = StringColumn()
+    self.durations = array.array("i")
+    self.current_index = -1
+    self.playback_mode = PlaybackModeEnum.Sequential
+    self.random = random.Random()
+    self.shuffle_order = array.array("I")
+    self.shuffle_position = array.array("I")
+
+  def mediaCount(self) -> int:
+    return len(self.urls)
+
+  def isEmpty(self) -> bool:
+    return len(self.urls) == 0
+
+  def url(self, row: int) -> str:
+    return self.urls[row]
+
+  def media(self, row: int) -> QtCore.QUrl:
+    return QtCore.QUrl(self.urls[row])
+
+  def title(self, row: int) -> str:
+    return self.titles[row]
+
+  def duration(self, row: int) -> int:
+    return self.durations[row]
+
+  def addMedia(self, urls: typing.Sequence[typing.Union[QtCore.QUrl, str]],
+               titles: typing.Optional[typing.Sequence[str]] = None,
+               durations: typing.Optional[typing.Sequence[int]] = None) -> bool:
+    return self.insertMedia(self.mediaCount(), urls, titles, durations)
+
+  def insertMedia(self, pos: int, urls: typing.Sequence[typing.Union[QtCore.QUrl, str]],
+                  titles: typing.Optional[typing.Sequence[str]] = None,
+                  durations: typing.Optional[typing.Sequence[int]] = None) -> bool:
+    if pos < 0 or pos > self.mediaCount():
+      return False
+    if len(urls) == 0:
+      return True
+
+    if titles is None:
+      titles = [""] * len(urls)
+    url_strings = []
+    title_strings = []
+    for url, title in zip(urls, titles):
+      if isinstance(url, QtCore.QUrl):
+        url_strings.append(url.toString())
+        title_strings.append(title if title else url.fileName())
+      else:
+        url_strings.append(url)
+        title_strings.append(title if title else QtCore.QUrl(url).fileName())
+
+    start, end = pos, pos + len(url_strings) - 1
+    self.mediaAboutToBeInserted.emit(start, end)
+    self.urls.insert(pos, url_strings)
+    self.titles.insert(pos, title_strings)
+    if durations is not None:
+      self.durations[pos:pos] = array.array("i", durations)
+    else:
+      self.durations[pos:pos] = array.array("i", [-1]) * len(url_strings)
+    self.insertShuffleOrder(start, len(url_strings))
+    self.mediaInserted.emit(start, end)
+
+    if self.current_index >= start:
+      self.current_index += len(url_strings)
+      self.currentIndexShifted.emit(self.current_index)
+    return True
+
+  def removeMedia(self, start: int, end: typing.Optional[int] = None) -> bool:
+    if end is None:
+      end = start
+    if start < 0 or end >= self.mediaCount() or start > end:
+      return False
+
+    self.mediaAboutToBeRemoved.emit(start, end)
+    self.urls.remove(start, end)
+    self.titles.remove(start, end)
+    del self.durations[start:end + 1]
+    self.removeShuffleOrder(start, end)
+    self.mediaRemoved.emit(start, end)
+
+    if self.current_index > end:
+      self.current_index -= end - start + 1
+      self.currentIndexShifted.emit(self.current_index)
+    elif self.current_index >= start:
+      self.current_index = -1
+      self.currentIndexChanged.emit(self.current_index)
+    return True
+
+  def removeMediaRows(self, rows: typing.Iterable[int]) -> bool:
+    # rows anywhere at once, e.g. files gone from the library. Each column
+    # is rebuilt a single time and the runs of adjacent rows are announced
+    # together instead of one removal per run
+    rows = sorted(set(rows))
+    if len(rows) == 0:
+      return True
+    if rows[0] < 0 or rows[-1] >= self.mediaCount():
+      return False
+    runs = []
+    start = rows[0]
+    for row, next_row in zip(rows, rows[1:] + [-1]):
+      if next_row != row + 1:
+        runs.append((start, row))
+        start = next_row
+    if len(runs) == 1:
+      return self.removeMedia(*runs[0])
+
+    highest_first = runs[::-1]
+    self.mediaRunsAboutToBeRemoved.emit(highest_first)
+    self.urls.removeRuns(runs)
+    self.titles.removeRuns(runs)
+    durations = array.array("i")
+    copied = 0
+    for start, end in runs:
+      durations.extend(self.durations[copied:start])
+      copied = end + 1
+    durations.extend(self.durations[copied:])
+    self.durations = durations
+    self.removeShuffleOrderRuns(runs)
+    self.mediaRunsRemoved.emit(highest_first)
+
+    current = self.current_index
+    if current != -1:
+      above = 0
+      for start, end in runs:
+        if start > current:
+          break
+        if end >= current:
+          self.current_index = -1
+          self.currentIndexChanged.emit(self.current_index)
+          return True
+        above += end - start + 1
+      if above != 0:
+        self.current_index -= above
+        self.currentIndexShifted.emit(self.current_index)
+    return True
+
+  def replaceMedia(self, row: int, url: typing.Union[QtCore.QUrl, str], title: str = "", duration: int = -1):
+    self.replaceMediaRows([row], [url], [title], [duration])
+
+  def replaceMediaRows(self, rows: typing.Sequence[int], urls: typing.Sequence[typing.Union[QtCore.QUrl, str]],
+                       titles: typing.Optional[typing.Sequence[str]] = None,
+                       durations: typing.Optional[typing.Sequence[int]] = None):
+    # many rows at once, each column is rebuilt a single time.
+    # mediaChanged comes once per run of adjacent rows
+    if len(rows) == 0:
+      return
+    if titles is None:
+      titles = [""] * len(rows)
+    if durations is None:
+      durations = [-1] * len(rows)
+    url_strings = {}
+    title_strings = {}
+    for row, url, title, duration in zip(rows, urls, titles, durations):
+      if not isinstance(url, QtCore.QUrl):
+        url = QtCore.QUrl(url)
+      url_strings[row] = url.toString()
+      title_strings[row] = title if title else url.fileName()
+      self.durations[row] = duration
+    self.urls.replaceRows(url_strings)
+    self.titles.replaceRows(title_strings)
+
+    changed = sorted(url_strings)
+    start = 0
+    for end in range(len(changed)):
+      if end + 1 == len(changed) or changed[end + 1] != changed[end] + 1:
+        self.mediaChanged.emit(changed[start], changed[end])
+        start = end + 1
+
+  def clear(self) -> bool:
+    if self.isEmpty():
+      return True
+    return self.removeMedia(0, self.mediaCount() - 1)
+
+  def currentIndex(self) -> int:
+    return self.current_index
+
+  def setCurrentIndex(self, index: int):
+    if index < -1 or index >= self.mediaCount():
+      index = -1
+    if index != self.current_index:
+      self.current_index = index
+      self.currentIndexChanged.emit(index)
+
+  def currentMedia(self) -> QtCore.QUrl:
+    if self.current_index == -1:
+      return QtCore.QUrl()
+    return self.media(self.current_index)
+
+  def playbackMode(self) -> PlaybackModeEnum:
+    return self.playback_mode
+
+  def setPlaybackMode(self, mode: PlaybackModeEnum):
+    if mode != self.playback_mode:
+      self.playback_mode = mode
+      self.playbackModeChanged.emit(mode)
+
+  def nextIndex(self, steps: int = 1) -> int:
+    count = self.mediaCount()
+    if count == 0:
+      return -1
+    current = self.current_index
+    mode = self.playback_mode
+
+    if mode == PlaybackModeEnum.CurrentItemOnce:
+      return -1 if steps != 0 else current
+    elif mode == PlaybackModeEnum.CurrentItemInLoop:
+      return current
+    elif mode == PlaybackModeEnum.Sequential:
+      index = current + steps if current != -1 else steps - 1
+      return index if 0 <= index < count else -1
+    elif mode == PlaybackModeEnum.Loop:
+      index = current + steps if current != -1 else steps - 1
+      return index % count
+    else:
+      self.ensureShuffleOrder()
+      pos = self.shuffle_position[current] + steps if current != -1 else steps - 1
+      return self.shuffle_order[pos % count]
+
+  def previousIndex(self, steps: int = 1) -> int:
+    return self.nextIndex(-steps)
+
+  def next(self):
+    self.setCurrentIndex(self.nextIndex())
+
+  def previous(self):
+    self.setCurrentIndex(self.previousIndex())
+
+  def shuffle(self, seed: typing.Optional[int] = None):
+    if seed is not None:
+      self.random.seed(seed)
+    order = list(range(self.mediaCount()))
+    self.random.shuffle(order)
+    self.setShuffleOrder(order)
+
+  def ensureShuffleOrder(self):
+    # the order is only built once random playback is asked for, after
+    # that it is patched on every insert/remove so it stays stable
+    if len(self.shuffle_order) != self.mediaCount():
+      self.shuffle()
+
+  def setShuffleOrder(self, order: typing.List[int]):
+    self.shuffle_order = array.array("I", order)
+    self.shuffle_position = array.array("I", bytes(len(order) * self.shuffle_order.itemsize))
+    for pos, row in enumerate(order):
+      self.shuffle_position[row] = pos
+
+  def insertShuffleOrder(self, start: int, count: int):
+    if len(self.shuffle_order) == 0:
+      return
+    # keep the existing order stable, newly inserted rows are shuffled
+    # among themselves and queued after everything already there
+    inserted = list(range(start, start + count))
+    self.random.shuffle(inserted)
+    if start == len(self.shuffle_order):
+      # appending, nothing already queued has to move
+      self.shuffle_position.extend(array.array("I", [0]) * count)
+      for pos, row in enumerate(inserted, len(self.shuffle_order)):
+        self.shuffle_position[row] = pos
+      self.shuffle_order.extend(inserted)
+      return
+    order = [row + count if row >= start else row for row in self.shuffle_order]
+    self.setShuffleOrder(order + inserted)
+
+  def removeShuffleOrder(self, start: int, end: int):
+    if len(self.shuffle_order) == 0:
+      return
+    count = end - start + 1
+    order = [row - count if row > end else row
+             for row in self.shuffle_order if row < start or row > end]
+    self.setShuffleOrder(order)
+
+  def removeShuffleOrderRuns(self, runs: typing.List[typing.Tuple[int, int]]):
+    if len(self.shuffle_order) == 0:
+      return
+    # rows left move up by the number of removed rows above them
+    removed = bytearray(len(self.shuffle_order))
+    for start, end in runs:
+      removed[start:end + 1] = b"\x01" * (end - start + 1)
+    above = list(itertools.accumulate(removed))
+    self.setShuffleOrder([row - above[row] for row in self.shuffle_order if not removed[row]])
+
+  def setColumns(self, urls: StringColumn, titles: StringColumn, durations: array.array):
+    # replaces the whole playlist, e.g. with columns restored from a session
+    self.clear()
+    self.shuffle_order = array.array("I")
+    self.shuffle_position = array.array("I")
+    if len(urls) == 0:
+      return
+    self.mediaAboutToBeInserted.emit(0, len(urls) - 1)
+    self.urls = urls
+    self.titles = titles
+    self.durations = durations
+    self.mediaInserted.emit(0, len(urls) - 1)
+
+  def findMedia(self, urls: typing.Iterable[str]) -> typing.Dict[str, int]:
+    return self.urls.find(urls)
+
+  def materialize(self):
+    self.urls.materialize()
+    self.titles.materialize()
+
+  def memoryFootprint(self) -> int:
+    return self.urls.nbytes() + self.titles.nbytes() + \
+           len(self.durations) * self.durations.itemsize + \
+           len(self.shuffle_order) * self.shuffle_order.itemsize + \
+           len(self.shuffle_position) * self.shuffle_position.itemsize
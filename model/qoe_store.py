@@ -0,0 +1,114 @@
+from PyQt5 import QtCore
+import typing
+import os
+import sqlite3
+import subprocess
+import threading
+
+def defaultQoePath() -> str:
+  return os.path.join(QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.AppDataLocation),
+                      "qoe.sqlite")
+
+version_cache = None
+
+def defaultVersion() -> str:
+  # what the metrics are filed under: the application version when one is
+  # set, PLAYER_VERSION, or the checkout it runs from
+  global version_cache
+  if version_cache is None:
+    version_cache = QtCore.QCoreApplication.applicationVersion() or os.environ.get("PLAYER_VERSION", "")
+    if len(version_cache) == 0:
+      try:
+        version_cache = subprocess.run(
+          ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+          capture_output=True, text=True, timeout=5).stdout.strip()
+      except (OSError, subprocess.SubprocessError):
+        pass
+    version_cache = version_cache or "unknown"
+  return version_cache
+
+class PlayRecord(typing.NamedTuple):
+  # one item from being picked until the next one is. Times in ms,
+  # startup_ms is None when it never started playing
+  url: str
+  started: float
+  startup_ms: typing.Optional[float] = None
+  played_ms: float = 0.0
+  stalls: int = 0
+  stall_ms: float = 0.0
+  buffering: int = 0
+  buffering_ms: float = 0.0
+  seeks: int = 0
+  errors: int = 0
+  last_error: str = ""
+  ended: bool = False
+
+class QoeStore:
+  # playback metrics per item and session, keeps the last max_plays plays
+  # and drops older ones as new ones come in
+  def __init__(self, path: str, max_plays: int = 50000) -> None:
+    if path != ":memory:":
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    self.max_plays = max_plays
+    self.lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+    self.connection.execute(
+      "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, started REAL, version TEXT)")
+    self.connection.execute(
+      "CREATE TABLE IF NOT EXISTS plays ("
+      "  id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT, url TEXT, started REAL,"
+      "  startup_ms REAL, played_ms REAL, stalls INTEGER, stall_ms REAL,"
+      "  buffering INTEGER, buffering_ms REAL, seeks INTEGER, errors INTEGER,"
+      "  last_error TEXT, ended INTEGER)"
+    )
+    self.connection.execute("CREATE TABLE IF NOT EXISTS seeks (play INTEGER, latency_ms REAL)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS plays_session ON plays (session)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS seeks_play ON seeks (play)")
+    self.connection.commit()
+
+  def addSession(self, session: str, started: float, version: str):
+    with self.lock:
+      self.connection.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session, started, version))
+      self.connection.commit()
+
+  def add(self, session: str, record: PlayRecord, seek_latencies: typing.List[float]):
+    with self.lock:
+      play = self.connection.execute(
+        "INSERT INTO plays (session, url, started, startup_ms, played_ms, stalls, stall_ms, buffering,"
+        "  buffering_ms, seeks, errors, last_error, ended) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (session,) + tuple(record)).lastrowid
+      self.connection.executemany("INSERT INTO seeks VALUES (?, ?)",
+                                  [(play, latency) for latency in seek_latencies])
+      # rolling: whatever fell out of the last max_plays goes
+      oldest = play - self.max_plays
+      if oldest > 0:
+        self.connection.execute("DELETE FROM plays WHERE id <= ?", (oldest,))
+        self.connection.execute("DELETE FROM seeks WHERE play <= ?", (oldest,))
+        self.connection.execute("DELETE FROM sessions WHERE id NOT IN (SELECT DISTINCT session FROM plays)"
+                                "  AND id != ?", (session,))
+      self.connection.commit()
+
+  def sessions(self) -> typing.Dict[str, typing.Tuple[float, str]]:
+    with self.lock:
+      return {row[0]: (row[1], row[2]) for row in self.connection.execute("SELECT id, started, version FROM sessions")}
+
+  def plays(self, since: float = 0.0) -> typing.List[typing.Tuple[int, str, PlayRecord]]:
+    # (id, session, record) oldest first
+    with self.lock:
+      rows = self.connection.execute(
+        "SELECT id, session, url, started, startup_ms, played_ms, stalls, stall_ms, buffering, buffering_ms,"
+        "  seeks, errors, last_error, ended FROM plays WHERE started >= ? ORDER BY id", (since,)).fetchall()
+    return [(row[0], row[1], PlayRecord(*row[2:13], bool(row[13]))) for row in rows]
+
+  def seekLatencies(self) -> typing.Dict[int, typing.List[float]]:
+    latencies = {}
+    with self.lock:
+      for play, latency in self.connection.execute("SELECT play, latency_ms FROM seeks"):
+        latencies.setdefault(play, []).append(latency)
+    return latencies
+
+  def close(self):
+    with self.lock:
+      self.connection.close()
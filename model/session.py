@@ -0,0 +1,146 @@
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore, PlaybackModeEnum, StringColumn
+import typing
+import array
+import mmap
+import os
+import struct
+import sys
+
+# little endian, every section starts 8 byte aligned:
+#   header
+#   url offsets     (rows + 1) x u64
+#   title offsets   (rows + 1) x u64
+#   durations       rows x i32, padded
+#   url bytes       utf-8
+#   title bytes     utf-8
+# the string sections are used in place from the mapped file
+SESSION_MAGIC = b"PQMPSESS"
+SESSION_VERSION = 1
+HEADER = struct.Struct("<8sIIQqqIIdQQ")
+
+class SessionState(typing.NamedTuple):
+  current_index: int = -1
+  position: int = 0
+  volume: int = 100
+  muted: bool = False
+  rate: float = 1.0
+  playback_mode: PlaybackModeEnum = PlaybackModeEnum.Sequential
+
+def defaultSessionPath() -> str:
+  return os.path.join(QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.AppDataLocation),
+                      "session.bin")
+
+def padding(size: int) -> bytes:
+  return b"\0" * (-size % 8)
+
+def saveSession(path: str, play_list: PlaylistStore, state: SessionState):
+  rows = play_list.mediaCount()
+  urls = play_list.urls
+  titles = play_list.titles
+  durations = play_list.durations
+  if sys.byteorder != "little":
+    url_offsets = array.array("Q", urls.offsets)
+    title_offsets = array.array("Q", titles.offsets)
+    durations = array.array("i", durations)
+    for column in (url_offsets, title_offsets, durations):
+      column.byteswap()
+  else:
+    url_offsets = urls.offsets
+    title_offsets = titles.offsets
+
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  temp_path = path + ".tmp"
+  with open(temp_path, "wb") as f:
+    f.write(HEADER.pack(SESSION_MAGIC, SESSION_VERSION, state.playback_mode.value, rows,
+                        state.current_index, state.position, state.volume, int(state.muted), state.rate,
+                        len(urls.buffer), len(titles.buffer)))
+    f.write(url_offsets)
+    f.write(title_offsets)
+    f.write(durations)
+    f.write(padding(rows * 4))
+    f.write(urls.buffer)
+    f.write(titles.buffer)
+  os.replace(temp_path, path)
+
+class Session:
+  # a mapped session file. The columns keep views into the mapping, so
+  # it has to stay open until the playlist was materialized or cleared
+  def __init__(self, path: str) -> None:
+    self.file = open(path, "rb")
+    try:
+      self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      # empty file
+      self.file.close()
+      raise ValueError("{}: not a session file".format(path))
+    self.views = []
+    try:
+      self.parse(path)
+    except Exception:
+      self.close()
+      raise
+
+  def parse(self, path: str):
+    if len(self.mapping) < HEADER.size:
+      raise ValueError("{}: not a session file".format(path))
+    magic, version, playback_mode, rows, current_index, position, volume, muted, rate, url_bytes, title_bytes = \
+      HEADER.unpack_from(self.mapping, 0)
+    if magic != SESSION_MAGIC:
+      raise ValueError("{}: not a session file".format(path))
+    if version != SESSION_VERSION:
+      raise ValueError("{}: unsupported session version {}".format(path, version))
+
+    offsets_size = (rows + 1) * 8
+    durations_size = rows * 4
+    url_offsets_start = HEADER.size
+    title_offsets_start = url_offsets_start + offsets_size
+    durations_start = title_offsets_start + offsets_size
+    urls_start = durations_start + durations_size + len(padding(durations_size))
+    titles_start = urls_start + url_bytes
+    if titles_start + title_bytes != len(self.mapping):
+      raise ValueError("{}: truncated session file".format(path))
+
+    view = memoryview(self.mapping)
+    self.views.append(view)
+    url_offsets = self.view(view[url_offsets_start:title_offsets_start].cast("Q"))
+    title_offsets = self.view(view[title_offsets_start:durations_start].cast("Q"))
+    self.durations = array.array("i")
+    self.durations.frombytes(view[durations_start:durations_start + durations_size])
+    urls = self.view(view[urls_start:titles_start])
+    titles = self.view(view[titles_start:titles_start + title_bytes])
+
+    if sys.byteorder != "little":
+      url_offsets = array.array("Q", url_offsets.tobytes())
+      title_offsets = array.array("Q", title_offsets.tobytes())
+      for column in (url_offsets, title_offsets, self.durations):
+        column.byteswap()
+    if url_offsets[rows] != url_bytes or title_offsets[rows] != title_bytes:
+      raise ValueError("{}: corrupt session file".format(path))
+
+    self.urls = StringColumn.fromBuffers(urls, url_offsets)
+    self.titles = StringColumn.fromBuffers(titles, title_offsets)
+    self.state = SessionState(
+      current_index=current_index if -1 <= current_index < rows else -1,
+      position=max(0, position),
+      volume=min(max(volume, 0), 100),
+      muted=bool(muted),
+      rate=rate if rate > 0 else 1.0,
+      playback_mode=PlaybackModeEnum(playback_mode) if playback_mode in PlaybackModeEnum._value2member_map_
+                    else PlaybackModeEnum.Sequential,
+    )
+
+  def view(self, view: memoryview) -> memoryview:
+    self.views.append(view)
+    return view
+
+  def close(self):
+    # views are released newest first, the parent view goes last
+    for view in reversed(self.views):
+      view.release()
+    self.views = []
+    self.mapping.close()
+    self.file.close()
+
+def loadSession(path: str) -> Session:
+  return Session(path)
@@ -0,0 +1,192 @@
+from PyQt5 import QtCore, QtGui
+from model.metadata_cache import defaultCacheDir
+from model.file_budget import FileBudget
+import typing
+import collections
+import hashlib
+import heapq
+import os
+import shutil
+import subprocess
+import threading
+
+FFMPEG = shutil.which("ffmpeg")
+
+class ThumbnailMemoryCache:
+  # least recently used thumbnails go first once the byte budget is hit
+  def __init__(self, max_bytes: int) -> None:
+    self.max_bytes = max_bytes
+    self.used_bytes = 0
+    self.images = collections.OrderedDict()
+
+  def get(self, key: str) -> typing.Optional[QtGui.QImage]:
+    image = self.images.get(key, None)
+    if image is not None:
+      self.images.move_to_end(key)
+    return image
+
+  def put(self, key: str, image: QtGui.QImage):
+    old = self.images.pop(key, None)
+    if old is not None:
+      self.used_bytes -= old.sizeInBytes()
+    self.images[key] = image
+    self.used_bytes += image.sizeInBytes()
+    while self.used_bytes > self.max_bytes and len(self.images) > 1:
+      _, evicted = self.images.popitem(last=False)
+      self.used_bytes -= evicted.sizeInBytes()
+
+  def __contains__(self, key: str) -> bool:
+    return key in self.images
+
+  def clear(self):
+    self.images.clear()
+    self.used_bytes = 0
+
+def extractFrame(path: str, width: int) -> typing.Optional[QtGui.QImage]:
+  if FFMPEG is None:
+    return None
+  # seek a little in to skip black intro frames, fall back to the
+  # first frame for clips shorter than that
+  for offset in ("10", "0"):
+    try:
+      output = subprocess.run(
+        [FFMPEG, "-v", "error", "-ss", offset, "-i", path, "-frames:v", "1",
+         "-vf", "scale={}:-2".format(width), "-f", "image2pipe", "-vcodec", "png", "-"],
+        capture_output=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+      return None
+    image = QtGui.QImage.fromData(output, "PNG")
+    if not image.isNull():
+      return image
+  return None
+
+class ThumbnailProvider(QtCore.QObject):
+  thumbnailReady = QtCore.pyqtSignal(str)
+  thumbnailLoaded = QtCore.pyqtSignal(str, QtGui.QImage, bool)
+
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None,
+               cache_dir: typing.Optional[str] = None, width: int = 96,
+               max_memory_bytes: int = 32 * 1024 * 1024, max_disk_bytes: int = 64 * 1024 * 1024,
+               max_concurrency: int = 2, max_urls: int = 16384) -> None:
+    super().__init__(parent=parent)
+    self.cache_dir = cache_dir if cache_dir is not None else os.path.join(defaultCacheDir(), "thumbnails")
+    os.makedirs(self.cache_dir, exist_ok=True)
+    self.disk_budget = FileBudget(self.cache_dir, ".jpg", max_disk_bytes)
+    self.width = width
+    self.memory_cache = ThumbnailMemoryCache(max_memory_bytes)
+    self.mime_database = QtCore.QMimeDatabase()
+    # url -> whether it is a video, and urls that gave no thumbnail. Both
+    # remember the last max_urls urls, a forgotten one is simply looked at
+    # again
+    self.max_urls = max_urls
+    self.video_urls = collections.OrderedDict()
+    self.failed = collections.OrderedDict()
+    self.max_concurrency = max(1, max_concurrency)
+    self.pool = QtCore.QThreadPool(self)
+    self.pool.setMaxThreadCount(self.max_concurrency)
+    self.lock = threading.Lock()
+    self.queue = []
+    self.wanted = set()
+    self.loading = set()
+    self.running = 0
+    # the lru is only touched on the gui thread, workers hand images over
+    # through this queued connection instead of locking every paint
+    self.thumbnailLoaded.connect(self.onThumbnailLoaded)
+
+  def isAvailable(self) -> bool:
+    return FFMPEG is not None
+
+  def isVideo(self, url: str) -> bool:
+    is_video = self.video_urls.get(url, None)
+    if is_video is None:
+      # by extension only, asking by url may read the file on the gui thread
+      mime = self.mime_database.mimeTypeForFile(QtCore.QUrl(url).path(), QtCore.QMimeDatabase.MatchExtension)
+      is_video = mime.name().startswith("video/")
+      self.remember(self.video_urls, url, is_video)
+    return is_video
+
+  def remember(self, urls: collections.OrderedDict, url: str, value: typing.Any):
+    urls[url] = value
+    urls.move_to_end(url)
+    while len(urls) > self.max_urls:
+      urls.popitem(last=False)
+
+  def thumbnail(self, url: str) -> typing.Optional[QtGui.QImage]:
+    # gui thread, memory only, never decodes
+    return self.memory_cache.get(url)
+
+  def setVisibleUrls(self, urls: typing.List[str]):
+    # replaces everything still queued, rows that scrolled away are never
+    # decoded, the first url is the most important one
+    if not self.isAvailable():
+      return
+    with self.lock:
+      requests = [url for url in urls
+                  if url not in self.memory_cache and url not in self.failed and
+                     url not in self.loading and self.isVideo(url)]
+      self.queue = [(priority, url) for priority, url in enumerate(requests)]
+      heapq.heapify(self.queue)
+      self.wanted = set(requests)
+      start = min(self.max_concurrency - self.running, len(self.queue))
+      self.running += start
+    for _ in range(start):
+      self.pool.start(self.work)
+
+  def cancel(self):
+    with self.lock:
+      self.queue = []
+      self.wanted = set()
+
+  def wait(self):
+    self.pool.waitForDone()
+
+  def cachePath(self, path: str) -> typing.Optional[str]:
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+    key = "{}|{}|{}|{}".format(path, stat.st_size, stat.st_mtime_ns, self.width)
+    return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+  def work(self):
+    while True:
+      with self.lock:
+        if len(self.queue) == 0:
+          self.running -= 1
+          return
+        _, url = heapq.heappop(self.queue)
+        self.loading.add(url)
+      image = self.loadThumbnail(url)
+      with self.lock:
+        # a row that left the screen while we were decoding is still
+        # worth keeping, but nobody has to be told about it
+        notify = url in self.wanted
+        if image is None:
+          self.remember(self.failed, url, True)
+          self.loading.discard(url)
+      if image is not None:
+        self.thumbnailLoaded.emit(url, image, notify)
+
+  def onThumbnailLoaded(self, url: str, image: QtGui.QImage, notify: bool):
+    self.memory_cache.put(url, image)
+    with self.lock:
+      self.loading.discard(url)
+    if notify:
+      self.thumbnailReady.emit(url)
+
+  def loadThumbnail(self, url: str) -> typing.Optional[QtGui.QImage]:
+    path = QtCore.QUrl(url).toLocalFile()
+    if len(path) == 0:
+      return None
+    cache_path = self.cachePath(path)
+    if cache_path is None:
+      return None
+    if os.path.exists(cache_path):
+      image = QtGui.QImage(cache_path)
+      if not image.isNull():
+        self.disk_budget.touch(cache_path)
+        return image
+    image = extractFrame(path, self.width)
+    if image is not None and image.save(cache_path, "JPG", 85):
+      self.disk_budget.add(cache_path)
+    return image
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from model.chunk_cache import ChunkCache, StreamInfo
+
+URL = "http://example.com/a.mp3"
+OTHER_URL = "http://example.com/b.mp3"
+
+class ChunkCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.dir = self.temp_dir.name
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def cache(self, max_bytes: int = 1000, chunk_size: int = 100) -> ChunkCache:
+    return ChunkCache(self.dir, max_bytes=max_bytes, chunk_size=chunk_size)
+
+  def testPutAndGet(self):
+    cache = self.cache()
+    self.assertIsNone(cache.get(URL, 0))
+    cache.put(URL, 0, b"a" * 100)
+    cache.put(OTHER_URL, 0, b"b" * 100)
+    self.assertTrue(cache.has(URL, 0))
+    self.assertFalse(cache.has(URL, 1))
+    self.assertEqual(cache.get(URL, 0), b"a" * 100)
+    self.assertEqual(cache.get(OTHER_URL, 0), b"b" * 100)
+    self.assertEqual(cache.stats(), {"chunks": 2, "used_bytes": 200, "max_bytes": 1000, "hits": 2, "misses": 1})
+
+  def testLeastRecentlyUsedGoFirst(self):
+    cache = self.cache(max_bytes=250)
+    cache.put(URL, 0, b"0" * 100)
+    cache.put(URL, 1, b"1" * 100)
+    cache.get(URL, 0)
+    cache.put(URL, 2, b"2" * 100)
+    self.assertEqual([cache.has(URL, index) for index in range(3)], [True, False, True])
+    self.assertEqual(cache.stats()["used_bytes"], 200)
+
+  def testSurvivesRestarts(self):
+    cache = self.cache()
+    info = StreamInfo(1000, etag="x")
+    cache.setInfo(URL, info)
+    cache.put(URL, 3, b"3" * 100)
+    restarted = self.cache()
+    self.assertEqual(restarted.info(URL), info._replace(chunk_size=100))
+    self.assertEqual(restarted.get(URL, 3), b"3" * 100)
+
+  def testChangedInfoDropsTheChunks(self):
+    cache = self.cache()
+    self.assertTrue(cache.setInfo(URL, StreamInfo(1000, etag="x")))
+    cache.put(URL, 0, b"0" * 100)
+    cache.put(OTHER_URL, 0, b"b" * 100)
+    self.assertFalse(cache.setInfo(URL, StreamInfo(1000, etag="x")))
+    self.assertTrue(cache.has(URL, 0))
+    self.assertTrue(cache.setInfo(URL, StreamInfo(1000, etag="y")))
+    self.assertFalse(cache.has(URL, 0))
+    self.assertTrue(cache.has(OTHER_URL, 0))
+    self.assertEqual(cache.info(URL).etag, "y")
+
+  def testOtherChunkSizeDropsTheChunks(self):
+    cache = self.cache(chunk_size=100)
+    cache.setInfo(URL, StreamInfo(1000))
+    cache.put(URL, 0, b"0" * 100)
+    resized = self.cache(chunk_size=200)
+    self.assertIsNone(resized.info(URL))
+    self.assertFalse(resized.has(URL, 0))
+    self.assertFalse(os.path.exists(resized.chunkPath(resized.key(URL), 0)))
+
+  def testInvalidate(self):
+    cache = self.cache()
+    cache.setInfo(URL, StreamInfo(1000))
+    cache.put(URL, 0, b"0" * 100)
+    cache.put(URL, 1, b"1" * 100)
+    cache.invalidate(URL)
+    self.assertIsNone(cache.info(URL))
+    self.assertFalse(cache.has(URL, 0))
+    self.assertEqual(os.listdir(os.path.join(self.dir, cache.key(URL))), [])
+    self.assertEqual(cache.stats()["used_bytes"], 0)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from model.m3u import M3UEntry, M3UError, parseM3U, writeM3U
+
+class ParseTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.dir = self.temp_dir.name
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def parse(self, data: bytes, name: str = "list.m3u"):
+    path = os.path.join(self.dir, name)
+    with open(path, "wb") as f:
+      f.write(data)
+    # a small chunk size, so lines are split across reads
+    return list(parseM3U(path, chunk_size=7))
+
+  def testExtinf(self):
+    entries = self.parse(b"#EXTM3U\n"
+                         b"#EXTINF:123,Artist - Title\n"
+                         b"music/a.mp3\n"
+                         b"\n"
+                         b"#EXTINF:-1 tvg-id=\"x\",Radio\r\n"
+                         b"http://example.com/stream\r\n"
+                         b"/abs/b.mp3")
+    self.assertEqual(entries, [
+      M3UEntry(os.path.join(self.dir, "music", "a.mp3"), "Artist - Title", 123, 3),
+      M3UEntry("http://example.com/stream", "Radio", -1, 6),
+      M3UEntry(os.path.normpath("/abs/b.mp3"), "", -1, 7),
+    ])
+
+  def testBomAndLatin1(self):
+    entries = self.parse(b"\xef\xbb\xbf#EXTM3U\n#EXTINF:5,Caf\xe9\ncaf\xe9.mp3\n")
+    self.assertEqual(entries, [M3UEntry(os.path.join(self.dir, "caf\xe9.mp3"), "Caf\xe9", 5, 3)])
+
+  def testM3u8IsStrictUtf8(self):
+    entries = self.parse("a\u00e9.mp3\n".encode("utf-8") + b"caf\xe9.mp3\n", "list.m3u8")
+    self.assertEqual(entries, [M3UEntry(os.path.join(self.dir, "a\u00e9.mp3"), "", -1, 1),
+                               M3UError(2, "invalid utf-8")])
+
+  def testBadExtinf(self):
+    entries = self.parse(b"#EXTINF:abc,Title\na.mp3\n#EXTINF:10,Dangling\n#EXTINF:20,Kept\nb.mp3\n#EXTINF:30,Last\n")
+    self.assertEqual([type(entry) for entry in entries], [M3UError, M3UEntry, M3UError, M3UEntry, M3UError])
+    self.assertEqual([entry.line for entry in entries], [1, 2, 3, 5, 6])
+    self.assertEqual(entries[3].title, "Kept")
+
+  @unittest.skipIf(os.name == "nt", "drive letters resolve on windows")
+  def testDriveLetterPath(self):
+    entries = self.parse(b"C:\\Music\\a.mp3\nb.mp3\n")
+    self.assertEqual(entries, [M3UError(1, "drive letter path can't be resolved here"),
+                               M3UEntry(os.path.join(self.dir, "b.mp3"), "", -1, 2)])
+
+class WriteTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.dir = self.temp_dir.name
+    self.path = os.path.join(self.dir, "list.m3u8")
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def testRoundTrip(self):
+    inside = os.path.join(self.dir, "music", "a.mp3")
+    outside = os.path.normpath("/elsewhere/b.mp3")
+    writeM3U(self.path, [(inside, "A", 61), (outside, "", -1), ("http://example.com/s", "Stream", -1)])
+    with open(self.path, encoding="utf-8") as f:
+      lines = f.read().splitlines()
+    # below the playlist folder paths are relative
+    self.assertEqual(lines[:3], ["#EXTM3U", "#EXTINF:61,A", os.path.join("music", "a.mp3")])
+    self.assertEqual([(entry.location, entry.title, entry.duration) for entry in parseM3U(self.path)],
+                     [(inside, "A", 61), (outside, "", -1), ("http://example.com/s", "Stream", -1)])
+
+  def testFailedWriteKeepsTheOldFile(self):
+    writeM3U(self.path, [("http://example.com/old", "", -1)])
+
+    def entries():
+      yield ("http://example.com/new", "", -1)
+      raise OSError("disk full")
+    with self.assertRaises(OSError):
+      writeM3U(self.path, entries())
+    self.assertEqual(os.listdir(self.dir), ["list.m3u8"])
+    self.assertEqual([entry.location for entry in parseM3U(self.path)], ["http://example.com/old"])
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,79 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import unittest
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore
+from model.playlist_index import PlaylistSearchIndex
+
+app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+ITEMS = [("Blue Monday", "neworder"), ("Monday Morning", "misc"), ("Sunday Bloody Sunday", "u2"),
+         ("Bluebird", "misc"), ("Love Will Tear Us Apart", "joydivision")]
+
+def makeItems(items, first: int = 0):
+  urls = ["file:///music/{}/track{}.mp3".format(folder, first + i) for i, (_, folder) in enumerate(items)]
+  return urls, [title for title, _ in items]
+
+class SearchIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.store = PlaylistStore()
+    self.store.addMedia(*makeItems(ITEMS))
+    # tiny chunks, so rows are filled in over several of them
+    self.index = PlaylistSearchIndex(self.store, chunk_size=2)
+
+  def tearDown(self):
+    self.index.wait()
+
+  def search(self, query: str):
+    self.index.wait()
+    return list(self.index.search(query))
+
+  def testMatches(self):
+    # word prefixes, words containing a longer query, phrases and folders
+    self.assertEqual(self.search("bl"), [0, 2, 3])
+    self.assertEqual(self.search("nday"), [0, 1, 2])
+    self.assertEqual(self.search("blue m"), [0])
+    self.assertEqual(self.search("joydiv"), [4])
+    self.assertEqual(self.search("xyz"), [])
+
+  def testInsert(self):
+    self.store.insertMedia(1, *makeItems([("Blue Velvet", "misc"), ("Atmosphere", "joydivision")], 10))
+    self.assertEqual(self.search("bl"), [0, 1, 4, 5])
+    self.assertEqual(self.search("nday"), [0, 3, 4])
+    self.assertEqual(self.search("blue m"), [0])
+    self.assertEqual(self.search("blue v"), [1])
+    self.assertEqual(self.search("joydiv"), [2, 6])
+
+  def testRemove(self):
+    self.store.removeMedia(1, 2)
+    self.assertEqual(self.search("bl"), [0, 1])
+    self.assertEqual(self.search("nday"), [0])
+    self.assertEqual(self.search("love w"), [2])
+    self.assertEqual(self.search("joydiv"), [2])
+
+  def testRemoveRuns(self):
+    self.store.removeMediaRows([0, 2])
+    self.assertEqual(self.search("bl"), [1])
+    self.assertEqual(self.search("nday"), [0])
+    self.assertEqual(self.search("monday m"), [0])
+    self.assertEqual(self.search("joydiv"), [2])
+
+  def testReplace(self):
+    self.store.replaceMediaRows([1, 3], *makeItems([("Shadowplay", "joydivision"), ("Blue Jay", "misc")], 10))
+    self.assertEqual(self.search("mo"), [0])
+    self.assertEqual(self.search("nday"), [0, 2])
+    self.assertEqual(self.search("bl"), [0, 2, 3])
+    self.assertEqual(self.search("blue j"), [3])
+    self.assertEqual(self.search("shad"), [1])
+    self.assertEqual(self.search("joydiv"), [1, 4])
+
+  def testRowsTheIndexHasNotSeenAreLeftOut(self):
+    self.index.wait()
+    self.store.removeMedia(3, 4)
+    # the playlist is ahead of the index until its worker caught up
+    self.assertTrue(all(row < 3 for row in self.index.search("bl")))
+    self.assertEqual(self.search("bl"), [0, 2])
+
+if __name__ == "__main__":
+  unittest.main()
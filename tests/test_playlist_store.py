@@ -0,0 +1,92 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import unittest
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore
+
+app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+def makeUrls(prefix: str, count: int):
+  return ["file:///media/{}_{:03d}.mp3".format(prefix, i) for i in range(count)]
+
+class CurrentIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.store = PlaylistStore()
+    self.store.addMedia(makeUrls("track", 10))
+    self.store.setCurrentIndex(5)
+    self.changed = []
+    self.shifted = []
+    self.store.currentIndexChanged.connect(self.changed.append)
+    self.store.currentIndexShifted.connect(self.shifted.append)
+
+  def testInsertAboveShifts(self):
+    self.store.insertMedia(2, makeUrls("new", 3))
+    self.assertEqual(self.changed, [])
+    self.assertEqual(self.shifted, [8])
+    self.assertEqual(self.store.url(self.store.currentIndex()), "file:///media/track_005.mp3")
+
+  def testRemoveAboveShifts(self):
+    self.store.removeMedia(1, 3)
+    self.assertEqual(self.changed, [])
+    self.assertEqual(self.shifted, [2])
+    self.assertEqual(self.store.url(self.store.currentIndex()), "file:///media/track_005.mp3")
+
+  def testInsertAndRemoveBelowLeaveIt(self):
+    self.store.insertMedia(8, makeUrls("new", 2))
+    self.store.removeMedia(7, 9)
+    self.assertEqual(self.changed, [])
+    self.assertEqual(self.shifted, [])
+    self.assertEqual(self.store.currentIndex(), 5)
+
+  def testRemovingCurrentChangesIt(self):
+    self.store.removeMedia(4, 6)
+    self.assertEqual(self.changed, [-1])
+    self.assertEqual(self.shifted, [])
+
+class RemoveRowsTest(unittest.TestCase):
+  def setUp(self):
+    self.store = PlaylistStore()
+    self.urls = makeUrls("track", 20)
+    self.store.addMedia(self.urls)
+    self.runs = []
+    self.store.mediaRunsRemoved.connect(self.runs.append)
+
+  def testRunsAreRemovedAtOnce(self):
+    self.store.setCurrentIndex(15)
+    self.store.shuffle(1)
+    self.assertTrue(self.store.removeMediaRows([12, 3, 4, 19, 5, 0]))
+    self.assertEqual(self.runs, [[(19, 19), (12, 12), (3, 5), (0, 0)]])
+    left = [url for row, url in enumerate(self.urls) if row not in (0, 3, 4, 5, 12, 19)]
+    self.assertEqual([self.store.url(row) for row in range(self.store.mediaCount())], left)
+    self.assertEqual(self.store.title(0), "track_001.mp3")
+    self.assertEqual(self.store.currentIndex(), 10)
+    self.assertEqual(sorted(self.store.shuffle_order), list(range(len(left))))
+
+  def testRemovingCurrentChangesIt(self):
+    self.store.setCurrentIndex(7)
+    changed = []
+    self.store.currentIndexChanged.connect(changed.append)
+    self.store.removeMediaRows([1, 7, 9])
+    self.assertEqual(changed, [-1])
+
+  def testOutOfRangeRemovesNothing(self):
+    self.assertFalse(self.store.removeMediaRows([2, 20]))
+    self.assertEqual(self.store.mediaCount(), 20)
+
+class EngineShiftTest(unittest.TestCase):
+  def testShiftKeepsCurrentItem(self):
+    from engine.player_engine import PlayerEngine
+    engine = PlayerEngine()
+    engine.play_list.addMedia(makeUrls("track", 10))
+    engine.play_list.setCurrentIndex(5)
+    # a new pick would drop the loop along with the rest of the item state
+    engine.frame_stepper.setLoop(1000, 2000)
+    engine.play_list.insertMedia(0, makeUrls("new", 4))
+    engine.play_list.removeMedia(0, 1)
+    self.assertEqual(engine.play_list.currentIndex(), 7)
+    self.assertEqual((engine.frame_stepper.loop_a, engine.frame_stepper.loop_b), (1000, 2000))
+    engine.shutdown()
+
+if __name__ == "__main__":
+  unittest.main()
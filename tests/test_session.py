@@ -0,0 +1,65 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import tempfile
+import unittest
+from PyQt5 import QtCore
+from model.playlist_store import PlaylistStore, PlaybackModeEnum
+from model.session import SessionState, saveSession, loadSession
+
+app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+URLS = ["file:///media/track_{:03d}.mp3".format(i) for i in range(5)] + ["http://example.com/stream"]
+TITLES = ["Track {}".format(i) for i in range(5)] + ["Café – Radio"]
+
+class SessionTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.temp_dir.name, "session.bin")
+    self.store = PlaylistStore()
+    self.store.addMedia(URLS, TITLES, list(range(1000, 7000, 1000)))
+
+  def tearDown(self):
+    self.temp_dir.cleanup()
+
+  def testRoundTrip(self):
+    state = SessionState(current_index=3, position=4500, volume=40, muted=True, rate=1.5,
+                         playback_mode=PlaybackModeEnum.Loop)
+    saveSession(self.path, self.store, state)
+    session = loadSession(self.path)
+    self.assertEqual(session.state, state)
+    restored = PlaylistStore()
+    restored.setColumns(session.urls, session.titles, session.durations)
+    self.assertEqual([restored.url(row) for row in range(restored.mediaCount())], URLS)
+    self.assertEqual([restored.title(row) for row in range(restored.mediaCount())], TITLES)
+    self.assertEqual([restored.duration(row) for row in range(restored.mediaCount())], list(range(1000, 7000, 1000)))
+    # the rows outlive the mapping once materialized
+    restored.materialize()
+    session.close()
+    self.assertEqual(restored.title(5), TITLES[5])
+
+  def testEmptyPlaylist(self):
+    saveSession(self.path, PlaylistStore(), SessionState())
+    session = loadSession(self.path)
+    self.assertEqual(len(session.urls), 0)
+    self.assertEqual(session.state, SessionState())
+    session.close()
+
+  def testOutOfRangeStateIsClamped(self):
+    saveSession(self.path, self.store, SessionState(current_index=6, position=-5, volume=150, rate=0.0))
+    session = loadSession(self.path)
+    self.assertEqual(session.state, SessionState(current_index=-1, position=0, volume=100, rate=1.0))
+    session.close()
+
+  def testBrokenFilesAreRejected(self):
+    saveSession(self.path, self.store, SessionState())
+    with open(self.path, "rb") as f:
+      data = f.read()
+    for broken in (b"", b"not a session file at all, just some text", data[:-1], data[:8] + b"\x02" + data[9:]):
+      with open(self.path, "wb") as f:
+        f.write(broken)
+      with self.assertRaises(ValueError):
+        loadSession(self.path)
+
+if __name__ == "__main__":
+  unittest.main()
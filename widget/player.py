@@ -1,13 +1,44 @@
+from __future__ import annotations
+import time
+# taken before the imports below so startup times include them
+LOAD_STARTED = time.perf_counter()
 
+from engine.player_engine import PlayerEngine
 from widget.player_controls import PlayerControls
-from widget.video_widget import VideoWidget
 from model.playlist_model import PlaylistModel
-from PyQt5 import QtCore, QtGui, QtWidgets, QtMultimedia, QtMultimediaWidgets
-import typing, os
+from model.metadata_scanner import MetadataScanner
+from model.thumbnail_cache import ThumbnailProvider
+from model.playlist_index import PlaylistSearchIndex
+from model.playlist_filter_model import PlaylistFilterModel
+from model.m3u import writeM3U
+from model.audio_analysis import REFERENCE_LOUDNESS
+from widget.update_scheduler import UpdateScheduler
+from widget.slot_profiler import SlotProfiler
+from widget.profiler_panel import ProfilerPanel
+from widget.waveform_slider import WaveformSlider
+from PyQt5 import QtCore, QtGui, QtWidgets
+import typing
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Player(QtWidgets.QWidget):
-  def __init__(self, parent: QtWidgets.QWidget = None) -> None:
+  # the window over a PlayerEngine, which does the actual playing
+  firstPaint = QtCore.pyqtSignal(float)
+
+  def __init__(self, parent: QtWidgets.QWidget = None, update_fps: int = 30,
+               preload_horizon: int = 1, profile: bool = False,
+               profile_dump: typing.Optional[str] = None, lazy_backend: bool = True,
+               started_at: typing.Optional[float] = None, session_path: typing.Optional[str] = None,
+               seek_interval: int = 150,
+               loudness_target: typing.Optional[float] = REFERENCE_LOUDNESS,
+               library_path: typing.Optional[str] = None, frame_stats: bool = False,
+               frame_log: typing.Optional[str] = None, stream_cache_bytes: int = 0,
+               frame_cache_bytes: int = 0, qoe_path: typing.Optional[str] = None) -> None:
     super().__init__(parent=parent)
+    # startup times are measured from here unless the caller knows better
+    self.started_at = started_at if started_at is not None else time.perf_counter()
+    self.first_paint_pending = True
 
     self.video_widget = None
     self.cover_label = None
@@ -15,75 +46,180 @@ class Player(QtWidgets.QWidget):
     self.track_info = ""
     self.status_info = ""
     self.duration = 0
+    self.duration_info_key = None
+    self.update_scheduler = UpdateScheduler(self, update_fps)
+    self.video_available = False
+    # created before setupUi, every handler is connected through it
+    self.profiler = SlotProfiler(self, profile)
+    # wrapped once, these are scheduled on every position and status report
+    self.apply_position = self.profiler.slot(self.applyPosition)
+    self.update_title = self.profiler.slot(self.updateWindowTitle)
+    self.profile_dump = profile_dump
+    self.profiler_panel = None
+    self.seek_dragged = False
+    self.last_open_directory = None
+    # draw video in software through a FrameStatsSurface, frame_log is
+    # where its timings are written on exit
+    self.frame_stats = frame_stats or frame_log is not None
+    self.frame_log = frame_log
+    # frames can only be kept for stepping when they are drawn in software
+    self.software_video = self.frame_stats or frame_cache_bytes > 0
+
+    self.engine = PlayerEngine(self, preload_horizon=preload_horizon, started_at=self.started_at,
+                               session_path=session_path, seek_interval=seek_interval,
+                               loudness_target=loudness_target, library_path=library_path,
+                               profiler=self.profiler, stream_cache_bytes=stream_cache_bytes,
+                               frame_cache_bytes=frame_cache_bytes, qoe_path=qoe_path)
+    self.play_list = self.engine.play_list
 
     self.setupUi()
+    self.engine.start(lazy_backend)
 
   def setupUi(self):
-    self.player = QtMultimedia.QMediaPlayer(self)
-    self.play_list = QtMultimedia.QMediaPlaylist()
-    self.player.setPlaylist(self.play_list)
-
-    self.player.durationChanged.connect(self.durationChanged)
-    self.player.positionChanged.connect(self.positionChanged)
-    self.player.metaDataChanged.connect(self.metaDataChanged)
-    self.play_list.currentIndexChanged.connect(self.playlistPositionChanged)
-    self.player.mediaStatusChanged.connect(self.statusChanged)
-    self.player.bufferStatusChanged.connect(self.bufferingProgress)
-    self.player.videoAvailableChanged.connect(self.videoAvailableChanged)
-    self.player.error.connect(self.displayErrorMessage)
-    self.player.stateChanged.connect(self.stateChanged)
-
-    self.video_widget = VideoWidget(self)
-    self.player.setVideoOutput(self.video_widget)
+    slot = self.profiler.slot
+    engine = self.engine
+
+    self.play_list.currentIndexChanged.connect(slot(self.playlistPositionChanged))
+    self.play_list.currentIndexShifted.connect(slot(self.playlistPositionChanged))
+
+    engine.backendCreated.connect(slot(self.backendCreated))
+    engine.backendUnavailable.connect(slot(self.backendUnavailable))
+    engine.durationChanged.connect(slot(self.durationChanged))
+    engine.positionChanged.connect(slot(self.positionChanged))
+    engine.busyChanged.connect(slot(self.handleCursor))
+    engine.mediaFinished.connect(slot(self.mediaFinished))
+    engine.videoAvailableChanged.connect(slot(self.videoAvailableChanged))
+    engine.trackInfoChanged.connect(slot(self.setTrackInfo))
+    engine.statusInfoChanged.connect(slot(self.setStatusInfo))
+
+    self.video_placeholder = QtWidgets.QWidget(self)
+    self.video_placeholder.setSizePolicy(QtWidgets.QSizePolicy(
+      QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Ignored))
+    palette = QtGui.QPalette()
+    palette.setColor(QtGui.QPalette.Window, QtCore.Qt.black)
+    self.video_placeholder.setPalette(palette)
+    self.video_placeholder.setAutoFillBackground(True)
 
     self.play_list_model = PlaylistModel(self)
     self.play_list_model.setPlaylist(self.play_list)
 
-    self.play_list_view = QtWidgets.QListView(self)
-    self.play_list_view.setModel(self.play_list_model)
-    self.play_list_view.setCurrentIndex(self.play_list_model.index(self.play_list.currentIndex(), 0))
+    self.metadata_scanner = MetadataScanner(parent=self,
+                                            max_concurrency=min(4, QtCore.QThread.idealThreadCount()))
+    self.metadata_scanner.metadataReady.connect(slot(self.play_list_model.setMetadata))
+    self.play_list_model.setMetadataCache(self.metadata_scanner.cache)
+    self.play_list.mediaInserted.connect(slot(self.scanInsertedMedia))
+
+    self.thumbnail_provider = ThumbnailProvider(self)
+    self.play_list_model.setThumbnailProvider(self.thumbnail_provider)
 
-    self.play_list_view.activated.connect(self.jump)
+    self.search_index = PlaylistSearchIndex(self.play_list, self)
+    self.filter_model = PlaylistFilterModel(self.search_index, self)
+    self.filter_model.setSourceModel(self.play_list_model)
 
-    self.slider = QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
-    self.slider.setRange(0, self.player.duration())
+    self.search_edit = QtWidgets.QLineEdit(self)
+    self.search_edit.setPlaceholderText("Search")
+    self.search_edit.setClearButtonEnabled(True)
+    self.search_edit.textChanged.connect(slot(self.setSearchQuery))
+
+    self.play_list_view = QtWidgets.QTreeView(self)
+    self.play_list_view.setRootIsDecorated(False)
+    self.play_list_view.setUniformRowHeights(True)
+    self.play_list_view.setModel(self.play_list_model)
+    self.play_list_view.setCurrentIndex(self.viewIndex(self.play_list.currentIndex()))
+    self.play_list_view.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
+    self.play_list_view.setIconSize(QtCore.QSize(48, 27))
+
+    # thumbnails are only requested for what is on screen, once scrolling
+    # settles for a moment
+    self.visible_rows_timer = QtCore.QTimer(self)
+    self.visible_rows_timer.setSingleShot(True)
+    self.visible_rows_timer.setInterval(50)
+    self.visible_rows_timer.timeout.connect(slot(self.requestVisibleThumbnails))
+    # QTimer.start would take the scroll position for its interval
+    self.play_list_view.verticalScrollBar().valueChanged.connect(lambda _: self.visible_rows_timer.start())
+    self.play_list_model.rowsInserted.connect(self.visible_rows_timer.start)
+    self.play_list_model.rowsRemoved.connect(self.visible_rows_timer.start)
+    self.play_list_model.modelReset.connect(self.visible_rows_timer.start)
+
+    self.rescan_action = QtWidgets.QAction("Rescan Metadata", self.play_list_view)
+    self.rescan_action.triggered.connect(slot(self.rescanSelectedMetadata))
+    self.play_list_view.addAction(self.rescan_action)
+
+    self.play_list_view.activated.connect(slot(self.jump))
+
+    # positions are in ms
+    self.slider = WaveformSlider(QtCore.Qt.Horizontal, self)
+    self.slider.setRange(0, 0)
+    self.slider.setSingleStep(1000)
+    self.slider.setPageStep(10000)
+    engine.envelopeChanged.connect(self.slider.setEnvelope)
 
     self.label_duration = QtWidgets.QLabel(self)
-    self.slider.sliderMoved.connect(self.seek)
+    self.slider.sliderMoved.connect(slot(self.previewSeek))
+    self.slider.sliderReleased.connect(slot(self.commitSeek))
+    self.slider.actionTriggered.connect(slot(self.sliderAction))
 
     self.open_button = QtWidgets.QPushButton("Open", self)
-    self.open_button.clicked.connect(self.open)
+    self.open_button.clicked.connect(slot(self.open))
 
-    self.controls = PlayerControls(self)
-    self.controls.setState(self.player.state())
-    self.controls.setVolume(self.player.volume())
-    self.controls.setMuted(self.player.isMuted())
+    self.open_folder_button = QtWidgets.QPushButton("Open Folder", self)
+    self.open_folder_button.clicked.connect(slot(self.openFolder))
+
+    self.save_button = QtWidgets.QPushButton("Save", self)
+    self.save_button.clicked.connect(slot(self.savePlaylist))
+
+    self.library_button = QtWidgets.QPushButton("Library", self)
+    self.library_button.setToolTip("Add a folder that is watched and kept in the playlist")
+    self.library_button.clicked.connect(slot(self.addLibraryFolder))
+    self.library_button.setVisible(engine.library is not None)
+
+    self.cancel_add_button = QtWidgets.QPushButton("Cancel", self)
+    self.cancel_add_button.setVisible(False)
+    self.cancel_add_button.clicked.connect(engine.playlist_loader.cancel)
 
-    self.controls.play.connect(self.player.play)
-    self.controls.pause.connect(self.player.pause)
-    self.controls.stop.connect(self.player.stop)
-    self.controls.next.connect(self.play_list.next)
-    self.controls.previous.connect(self.previousClicked)
-    self.controls.changeVolume.connect(self.player.setVolume)
-    self.controls.changeMuting.connect(self.player.setMuted)
-    self.controls.changeRate.connect(self.player.setPlaybackRate)
+    engine.playlist_loader.started.connect(lambda: self.cancel_add_button.setVisible(True))
+    engine.playlist_loader.finished.connect(slot(self.addToPlaylistFinished))
+    engine.playlist_loader.progress.connect(slot(self.addToPlaylistProgress))
 
-    self.controls.stop.connect(self.video_widget.update)
+    self.controls = PlayerControls(self)
 
-    self.player.stateChanged.connect(self.controls.setState)
-    self.player.volumeChanged.connect(self.controls.setVolume)
-    self.player.mutedChanged.connect(self.controls.setMuted)
+    self.controls.play.connect(engine.play)
+    self.controls.pause.connect(engine.pause)
+    self.controls.stop.connect(engine.stop)
+    self.controls.stop.connect(self.updateVideo)
+    self.controls.next.connect(engine.next)
+    self.controls.previous.connect(slot(engine.previous))
+    self.controls.changeVolume.connect(engine.setVolume)
+    self.controls.changeMuting.connect(engine.setMuted)
+    self.controls.changeRate.connect(engine.setPlaybackRate)
+    self.controls.stepBackward.connect(lambda: engine.stepFrame(-1))
+    self.controls.stepForward.connect(lambda: engine.stepFrame(1))
+    self.controls.markLoop.connect(engine.frame_stepper.markLoop)
+
+    engine.stateChanged.connect(self.controls.setState)
+    engine.volumeChanged.connect(self.controls.setVolume)
+    engine.mutedChanged.connect(self.controls.setMuted)
+    engine.playbackRateChanged.connect(self.controls.setPlaybackRate)
+    engine.frame_stepper.loopChanged.connect(self.controls.setLoop)
+    engine.frame_stepper.frameShown.connect(slot(self.frameShown))
 
     self.full_screen_button = QtWidgets.QPushButton("FullScreen", self)
     self.full_screen_button.setCheckable(True)
 
     self.display_layout = QtWidgets.QHBoxLayout()
-    self.display_layout.addWidget(self.video_widget, 2)
-    self.display_layout.addWidget(self.play_list_view)
+    self.display_layout.addWidget(self.video_placeholder, 2)
+    self.play_list_layout = QtWidgets.QVBoxLayout()
+    self.play_list_layout.addWidget(self.search_edit)
+    self.play_list_layout.addWidget(self.play_list_view)
+    self.display_layout.addLayout(self.play_list_layout)
 
     self.control_layout = QtWidgets.QHBoxLayout()
     self.control_layout.setContentsMargins(0,0,0,0)
     self.control_layout.addWidget(self.open_button)
+    self.control_layout.addWidget(self.open_folder_button)
+    self.control_layout.addWidget(self.save_button)
+    self.control_layout.addWidget(self.library_button)
+    self.control_layout.addWidget(self.cancel_add_button)
     self.control_layout.addStretch(1)
     self.control_layout.addWidget(self.controls)
     self.control_layout.addStretch(1)
@@ -100,25 +236,82 @@ class Player(QtWidgets.QWidget):
 
     self.setLayout(self.main_layout)
 
-    if not self.player.isAvailable():
-      QtWidgets.QMessageBox.warning(
-        self, "Service not available",
-        "The QMediaPlayer object does not have a valid service. \n \
-         Please check the media service plugins are installed."
-      )
-      self.controls.setEnabled(False)
-      self.play_list_view.setEnabled(False)
-      self.open_button.setEnabled(False)
-      self.full_screen_button.setEnabled(False)
-
-    self.metaDataChanged()
-  
     self.ConnectDebugSignals()
 
+    if self.profiler.enabled:
+      self.profiler_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+P"), self)
+      self.profiler_shortcut.activated.connect(self.showProfilerPanel)
+
+  def showProfilerPanel(self):
+    if self.profiler_panel is None:
+      self.profiler_panel = ProfilerPanel(self.profiler, self)
+    self.profiler_panel.show()
+    self.profiler_panel.raise_()
+
+  def backendCreated(self):
+    # the engine created its media player, the video output replaces
+    # the placeholder before anything gets loaded
+    if self.software_video:
+      from PyQt5 import QtMultimedia
+      from widget.stats_video_widget import StatsVideoWidget
+      self.video_widget = StatsVideoWidget(self, overlay=self.frame_stats)
+      surface = self.video_widget.surface
+      self.video_widget.frame_ring = self.engine.frame_stepper.ring
+      self.engine.frame_stepper.setSurface(surface)
+      if self.engine.qoe is not None:
+        self.engine.qoe.setSurface(surface)
+      # the gap over a pause isn't a stall
+      def stateChanged(state: int):
+        if state != QtMultimedia.QMediaPlayer.PlayingState:
+          surface.resetTiming()
+      self.engine.stateChanged.connect(stateChanged)
+      self.engine.playbackRateChanged.connect(surface.setPlaybackRate)
+      output = surface
+    else:
+      from widget.video_widget import VideoWidget
+      self.video_widget = VideoWidget(self)
+      output = self.video_widget
+    self.display_layout.replaceWidget(self.video_placeholder, self.video_widget)
+    self.video_placeholder.deleteLater()
+    self.video_placeholder = None
+    self.engine.setVideoOutput(output)
+
+  def backendUnavailable(self):
+    QtWidgets.QMessageBox.warning(
+      self, "Service not available",
+      "The QMediaPlayer object does not have a valid service. \n \
+       Please check the media service plugins are installed."
+    )
+    self.controls.setEnabled(False)
+    self.play_list_view.setEnabled(False)
+    self.open_button.setEnabled(False)
+    self.open_folder_button.setEnabled(False)
+    self.full_screen_button.setEnabled(False)
+
+  def updateVideo(self):
+    if self.video_widget is not None:
+      self.video_widget.update()
+
+  def paintEvent(self, event: QtGui.QPaintEvent):
+    super().paintEvent(event)
+    if self.first_paint_pending:
+      self.first_paint_pending = False
+      # the children paint in this same pass, the frame is on screen
+      # by the next event loop iteration
+      QtCore.QTimer.singleShot(0, self.reportFirstPaint)
+
+  def reportFirstPaint(self):
+    elapsed = (time.perf_counter() - self.started_at) * 1000
+    logger.info("first paint after %.1f ms", elapsed)
+    self.firstPaint.emit(elapsed)
+
   def ConnectDebugSignals(self):
-    self.play_list.loaded.connect(lambda: print("loaded"))
-    self.play_list.loadFailed.connect(lambda: print("load failed"))
-  
+    playlist_loader = self.engine.playlist_loader
+    playlist_loader.playlistLoaded.connect(lambda path: logger.debug("loaded %s", path))
+    playlist_loader.playlistLoadFailed.connect(lambda path: logger.warning("load failed %s", path))
+    playlist_loader.playlistLineError.connect(
+      lambda path, line, message: logger.warning("%s:%d: %s", path, line, message))
+
   def open(self):
     file_dialog = QtWidgets.QFileDialog(self)
     file_dialog.setAcceptMode(QtWidgets.QFileDialog.AcceptOpen)
@@ -127,96 +320,191 @@ class Player(QtWidgets.QWidget):
     # if len(supported_mime_types) == 0:
     #   supported_mime_types.append("audio/x-m3u")
     #   file_dialog.setMimeTypeFilters(supported_mime_types)
-    # file_dialog.setDirectory(QtCore.QStandardPaths.standardLocations(
-    #   QtCore.QStandardPaths.MoviesLocation)[0])
-    file_dialog.setDirectory(r"E:\A10\All")
+    file_dialog.setDirectory(self.openDirectory())
 
     if file_dialog.exec() == QtWidgets.QDialog.Accepted:
+      self.last_open_directory = file_dialog.directory().absolutePath()
       self.addToPlaylist(file_dialog.selectedUrls())
-    
-  def isPlaylist(self, url: QtCore.QUrl):
-    if not url.isLocalFile():
-      return False
-    file_info = url.toLocalFile()
-    return os.path.exists(file_info) and file_info.split(".")[-1].lower() == "m3u"
-  
+
+  def openDirectory(self) -> str:
+    # where the last dialog was left, else the library, else the movies folder
+    if self.last_open_directory is not None:
+      return self.last_open_directory
+    roots = self.engine.library.roots() if self.engine.library is not None else []
+    if len(roots) != 0:
+      return roots[0]
+    locations = QtCore.QStandardPaths.standardLocations(QtCore.QStandardPaths.MoviesLocation)
+    return locations[0] if len(locations) != 0 else QtCore.QDir.homePath()
+
+  def openFolder(self):
+    path = QtWidgets.QFileDialog.getExistingDirectory(self, "Open Folder")
+    if len(path) != 0:
+      self.addToPlaylist([QtCore.QUrl.fromLocalFile(path)])
+
+  def savePlaylist(self):
+    path, _ = QtWidgets.QFileDialog.getSaveFileName(
+      self, "Save Playlist", "", "Playlists (*.m3u8 *.m3u)")
+    if len(path) == 0:
+      return
+
+    def entries():
+      for row in range(self.play_list.mediaCount()):
+        url = self.play_list.media(row)
+        location = url.toLocalFile() if url.isLocalFile() else url.toString()
+        yield location, self.play_list.title(row), self.play_list.duration(row)
+
+    try:
+      writeM3U(path, entries())
+    except OSError as e:
+      self.setStatusInfo("Save failed: {}".format(e.strerror))
+
+  def addLibraryFolder(self):
+    path = QtWidgets.QFileDialog.getExistingDirectory(self, "Add Library Folder", self.openDirectory())
+    if len(path) != 0:
+      self.engine.library.addRoot(path)
+
   def addToPlaylist(self, urls: typing.List[QtCore.QUrl]):
-    for url in urls:
-      if self.isPlaylist(url):
-        self.play_list.load(url)
-      else:
-        self.play_list.addMedia(QtMultimedia.QMediaContent(url))
-  
+    self.engine.addToPlaylist(urls)
+
+  def addToPlaylistProgress(self, added: int, done: int, total: int):
+    self.setStatusInfo("Adding {} ({}/{})".format(added, done, total))
+
+  def addToPlaylistFinished(self):
+    self.cancel_add_button.setVisible(False)
+    self.setStatusInfo("")
+
+  def scanInsertedMedia(self, start: int, end: int):
+    self.metadata_scanner.scan(self.play_list.urls.copyRange(start, end))
+
+  def setSearchQuery(self, query: str):
+    self.filter_model.setQuery(query)
+    # unfiltered, the view talks to the playlist model directly so
+    # inserts and scrolling never go through the proxy
+    model = self.filter_model if len(query.strip()) != 0 else self.play_list_model
+    if self.play_list_view.model() is not model:
+      self.play_list_view.setModel(model)
+    self.play_list_view.setCurrentIndex(self.viewIndex(self.play_list.currentIndex()))
+    self.visible_rows_timer.start()
+
+  def sourceRow(self, index: QtCore.QModelIndex) -> int:
+    if index.model() is self.filter_model:
+      return self.filter_model.sourceRow(index.row())
+    return index.row()
+
+  def viewIndex(self, row: int) -> QtCore.QModelIndex:
+    if self.play_list_view.model() is self.filter_model:
+      return self.filter_model.index(self.filter_model.proxyRow(row), 0)
+    # the model exposes rows as the view scrolls, the current one may be
+    # further down
+    self.play_list_model.fetchUpTo(row)
+    return self.play_list_model.index(row, 0)
+
+  def visibleRows(self) -> typing.Tuple[int, int]:
+    count = self.play_list_view.model().rowCount(QtCore.QModelIndex())
+    if count == 0:
+      return 0, -1
+    viewport = self.play_list_view.viewport()
+    first = self.play_list_view.indexAt(QtCore.QPoint(0, 0)).row()
+    last = self.play_list_view.indexAt(QtCore.QPoint(0, viewport.height() - 1)).row()
+    first = max(first, 0)
+    last = last if last != -1 else count - 1
+    return first, last
+
+  def requestVisibleThumbnails(self):
+    first, last = self.visibleRows()
+    model = self.play_list_view.model()
+    rows = [self.sourceRow(model.index(row, 0)) for row in range(first, last + 1)]
+    self.thumbnail_provider.setVisibleUrls([self.play_list.url(row) for row in rows])
+    # a screen above and below is ready before scrolling gets there
+    margin = last - first + 1
+    count = model.rowCount(QtCore.QModelIndex())
+    self.play_list_model.prefetch(
+      [self.sourceRow(model.index(row, 0)) for row in range(max(first - margin, 0), min(last + margin + 1, count))])
+
+  def resizeEvent(self, event: QtGui.QResizeEvent):
+    super().resizeEvent(event)
+    self.visible_rows_timer.start()
+
+  def rescanSelectedMetadata(self):
+    rows = {self.sourceRow(index) for index in self.play_list_view.selectionModel().selectedIndexes()}
+    self.metadata_scanner.rescan([self.play_list.url(row) for row in sorted(rows)])
+
+  def closeEvent(self, event: QtGui.QCloseEvent):
+    self.metadata_scanner.cancel()
+    self.metadata_scanner.wait()
+    self.thumbnail_provider.cancel()
+    self.thumbnail_provider.wait()
+    self.engine.shutdown()
+    if self.profiler.enabled and self.profile_dump is not None:
+      self.profiler.dump(self.profile_dump)
+    if self.frame_log is not None and self.video_widget is not None:
+      self.video_widget.surface.dump(self.frame_log)
+    super().closeEvent(event)
+
   def durationChanged(self, duration: int):
-    print("duration changed {}".format(duration))
+    logger.debug("duration changed %d", duration)
     self.duration = duration // 1000
-    self.slider.setMaximum(duration // 1000)
+    self.slider.setMaximum(duration)
 
   def positionChanged(self, progress: int):
-    print("position changed {}".format(progress))
-    if not self.slider.isSliderDown():
-      self.slider.setValue(progress // 1000)
+    logger.debug("position changed %d", progress)
+    if self.engine.frame_stepper.isHolding():
+      # the player isn't where the frame on screen is
+      return
+    # positionChanged can fire far more often than the screen refreshes
+    self.update_scheduler.schedule("position", self.apply_position, progress)
+
+  def applyPosition(self, progress: int):
+    # positions from before a seek landed would make the slider jump back
+    if not self.slider.isSliderDown() and not self.engine.seek_controller.isSeeking():
+      self.slider.setValue(progress)
     self.updateDurationInfo(progress // 1000)
 
-  def metaDataChanged(self):
-    if self.player.isMetaDataAvailable():
-      self.setTrackInfo("{} - {}".format(
-        self.player.metaData(QtMultimedia.QMediaMetaData.AlbumArtist),
-        self.player.metaData(QtMultimedia.QMediaMetaData.Title),
-      ))
-
-  def previousClicked(self):
-    # Go to previous track if we are within the first 5 seconds of playback
-    # Otherwise, seek to the beginning.
-    if self.player.position() <= 5000:
-      self.play_list.previous()
-    else:
-      self.player.setPosition(0)
+  def frameShown(self, image: typing.Optional[QtGui.QImage], position: int):
+    # a frame from memory, or back to the player's own output for None
+    if self.video_widget is not None and hasattr(self.video_widget, "showImage"):
+      self.video_widget.showImage(image)
+    if position >= 0:
+      self.applyPosition(position)
 
   def jump(self, index: QtCore.QModelIndex):
     if index.isValid():
-      self.play_list.setCurrentIndex(index.row())
-      self.player.play()
+      self.engine.jump(self.sourceRow(index))
 
   def playlistPositionChanged(self, current_item: int):
-    self.play_list_view.setCurrentIndex(self.play_list_model.index(current_item, 0))
-
-  def seek(self, seconds: int):
-    self.player.setPosition(seconds * 1000)
-
-  def statusChanged(self, status: QtMultimedia.QMediaPlayer.MediaStatus):
-    self.handleCursor(status)
-
-    if status == QtMultimedia.QMediaPlayer.UnknownMediaStatus or \
-       status == QtMultimedia.QMediaPlayer.NoMedia or \
-       status == QtMultimedia.QMediaPlayer.LoadedMedia or \
-       status == QtMultimedia.QMediaPlayer.BufferingMedia or \
-       status == QtMultimedia.QMediaPlayer.BufferedMedia:
-      self.setStatusInfo("")
-    elif status == QtMultimedia.QMediaPlayer.LoadingMedia:
-      self.setStatusInfo("Loading")
-    elif status == QtMultimedia.QMediaPlayer.StalledMedia:
-      self.setStatusInfo("Media Stalled")
-    elif status == QtMultimedia.QMediaPlayer.EndOfMedia:
-      QtWidgets.QApplication.alert(self)
-    elif status == QtMultimedia.QMediaPlayer.InvalidMedia:
-      self.displayErrorMessage()
-  
-  def stateChanged(self, state: QtMultimedia.QMediaPlayer.State):
-    pass # since no histogram
-
-  def handleCursor(self, status: QtMultimedia.QMediaPlayer.MediaStatus):
-    if status == QtMultimedia.QMediaPlayer.LoadingMedia or \
-       status == QtMultimedia.QMediaPlayer.BufferingMedia or \
-       status == QtMultimedia.QMediaPlayer.StalledMedia:
+    self.play_list_view.setCurrentIndex(self.viewIndex(current_item))
+
+  def seek(self, position: int):
+    self.engine.seek(position)
+
+  def previewSeek(self, position: int):
+    self.seek_dragged = True
+    self.engine.seek_controller.preview(position)
+    self.updateDurationInfo(position // 1000)
+
+  def commitSeek(self):
+    if self.seek_dragged:
+      self.seek_dragged = False
+      self.seek(self.slider.value())
+
+  def sliderAction(self, action: int):
+    # clicks on the groove and keys, drags go through previewSeek
+    if action != QtWidgets.QAbstractSlider.SliderMove and action != QtWidgets.QAbstractSlider.SliderNoAction:
+      self.seek(self.slider.sliderPosition())
+
+  def mediaFinished(self):
+    QtWidgets.QApplication.alert(self)
+
+  def handleCursor(self, busy: bool):
+    if busy:
       self.setCursor(QtGui.QCursor(QtCore.Qt.BusyCursor))
     else:
       self.unsetCursor()
 
-  def bufferingProgress(self, progress: int):
-    self.setStatusInfo("Buffering {}%".format(progress))
-
   def videoAvailableChanged(self, available: bool):
+    if available == self.video_available:
+      return
+    self.video_available = available
     if not available:
       self.full_screen_button.clicked.disconnect(self.video_widget.setFullScreen)
       self.video_widget.fullScreenChanged.disconnect(self.full_screen_button.setChecked)
@@ -226,25 +514,28 @@ class Player(QtWidgets.QWidget):
       self.video_widget.fullScreenChanged.connect(self.full_screen_button.setChecked)
       if self.full_screen_button.isChecked():
         self.video_widget.setFullScreen(True)
-    
+
   def setTrackInfo(self, info: str):
     self.track_info = info
-    if len(self.status_info) != 0:
-      self.setWindowTitle("{} - {}".format(self.track_info, self.status_info))
-    else:
-      self.setWindowTitle(self.track_info)
+    self.update_scheduler.schedule("title", self.update_title)
 
   def setStatusInfo(self, info: str):
     self.status_info = info
+    self.update_scheduler.schedule("title", self.update_title)
+
+  def updateWindowTitle(self):
     if len(self.status_info) != 0:
-      self.setWindowTitle("{} - {}".format(self.track_info, self.status_info))
+      title = "{} - {}".format(self.track_info, self.status_info)
     else:
-      self.setWindowTitle(self.track_info)
-
-  def displayErrorMessage(self):
-    self.setStatusInfo(self.player.errorString())
+      title = self.track_info
+    if title != self.windowTitle():
+      self.setWindowTitle(title)
 
   def updateDurationInfo(self, current_info: int):
+    # the label only shows whole seconds, most ticks change nothing
+    if self.duration_info_key == (current_info, self.duration):
+      return
+    self.duration_info_key = (current_info, self.duration)
     t_str = ""
     if current_info or self.duration:
       current_time = QtCore.QTime(
@@ -260,10 +551,89 @@ class Player(QtWidgets.QWidget):
     self.label_duration.setText(t_str)
 
 if __name__ == "__main__":
-  import sys
-  app = QtWidgets.QApplication(sys.argv)
-
-  player = Player()
+  import sys, os, argparse, json
+  from model.session import defaultSessionPath
+  from model.media_library import defaultLibraryPath
+  from model.qoe_store import defaultQoePath
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--debug", action="store_true", default=os.environ.get("PLAYER_DEBUG", "") not in ("", "0"),
+                      help="log player events, same as PLAYER_DEBUG=1")
+  parser.add_argument("--update-fps", type=int, default=30,
+                      help="max ui refreshes per second for position/status, 0 disables coalescing")
+  parser.add_argument("--preload", type=int, default=1,
+                      help="number of upcoming playlist items to preload, 0 disables preloading")
+  parser.add_argument("--profile", action="store_true", default=os.environ.get("PLAYER_PROFILE", "") not in ("", "0"),
+                      help="time every player slot and the event loop lag, Ctrl+Shift+P shows them")
+  parser.add_argument("--profile-dump", default=None,
+                      help="write the profile as json to this file on exit, implies --profile")
+  parser.add_argument("--eager", action="store_true",
+                      help="create the media backend and video output before showing the window")
+  parser.add_argument("--startup-report", action="store_true",
+                      help="print the time to first paint (and first frame, when media is given) as json and exit")
+  parser.add_argument("--seek-interval", type=int, default=150,
+                      help="min ms between preview seeks while dragging the slider, 0 seeks on every move")
+  parser.add_argument("--session", default=None,
+                      help="session file the playlist and position are kept in between runs")
+  parser.add_argument("--no-session", action="store_true", help="start empty and don't save the session")
+  parser.add_argument("--library", action="append", default=[], metavar="FOLDER",
+                      help="watch this folder and keep its media in the playlist, can be repeated")
+  parser.add_argument("--no-library", action="store_true", help="don't load or watch the library folders")
+  parser.add_argument("--no-normalize", action="store_true",
+                      help="play audio tracks at their own loudness instead of a common level")
+  parser.add_argument("--stream-cache-mb", type=int, default=512,
+                      help="disk cache for http(s) media with read-ahead, 0 lets the backend stream it")
+  parser.add_argument("--qoe", default=None,
+                      help="file playback metrics are kept in, see bench/qoe_report.py")
+  parser.add_argument("--no-qoe", action="store_true", help="don't record playback metrics")
+  parser.add_argument("--frame-cache-mb", type=int, default=0,
+                      help="keep this much decoded video for frame steps and A/B loops, draws video in software")
+  parser.add_argument("--frame-stats", action="store_true",
+                      help="draw video in software and count late and dropped frames, Ctrl+Shift+F shows them")
+  parser.add_argument("--frame-log", default=None,
+                      help="write every frame's timing as json to this file on exit, implies --frame-stats")
+  parser.add_argument("media", nargs="*", help="files, folders or playlists to add and start playing")
+  args, qt_args = parser.parse_known_args()
+  logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+
+  app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+
+  player = Player(update_fps=args.update_fps, preload_horizon=args.preload,
+                  profile=args.profile or args.profile_dump is not None, profile_dump=args.profile_dump,
+                  lazy_backend=not args.eager, started_at=LOAD_STARTED,
+                  session_path=None if args.no_session else args.session or defaultSessionPath(),
+                  seek_interval=args.seek_interval,
+                  loudness_target=None if args.no_normalize else REFERENCE_LOUDNESS,
+                  library_path=None if args.no_library else defaultLibraryPath(),
+                  frame_stats=args.frame_stats, frame_log=args.frame_log,
+                  stream_cache_bytes=args.stream_cache_mb * 1024 * 1024,
+                  frame_cache_bytes=args.frame_cache_mb * 1024 * 1024,
+                  qoe_path=None if args.no_qoe else args.qoe or defaultQoePath())
+  for folder in args.library:
+    if player.engine.library is not None:
+      player.engine.library.addRoot(folder)
   player.show()
 
-  exit(app.exec_())
\ No newline at end of file
+  if len(args.media) != 0:
+    def playFirst():
+      player.engine.playlist_loader.finished.disconnect(playFirst)
+      if player.play_list.mediaCount() != 0:
+        player.engine.jump(0)
+    player.engine.playlist_loader.finished.connect(playFirst)
+    player.addToPlaylist([QtCore.QUrl.fromUserInput(path, os.getcwd()) for path in args.media])
+
+  if args.startup_report:
+    report = {"lazy_backend": not args.eager}
+    def reportStartup(key: str, elapsed: float):
+      report[key] = elapsed
+      if key == "first_frame_ms" or len(args.media) == 0:
+        app.quit()
+    player.firstPaint.connect(lambda elapsed: reportStartup("first_paint_ms", elapsed))
+    player.engine.firstFrame.connect(lambda elapsed: reportStartup("first_frame_ms", elapsed))
+    # media that never plays should still end the run
+    QtCore.QTimer.singleShot(30000, app.quit)
+    app.exec_()
+    player.close()
+    print(json.dumps(report))
+    exit(0)
+
+  exit(app.exec_())
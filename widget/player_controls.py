@@ -1,6 +1,27 @@
 
-from PyQt5 import QtCore, QtGui, QtWidgets, QtMultimedia, QtMultimediaWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 import typing
+import enum
+import math
+
+class PlayerState(enum.IntEnum):
+  # same values as QMediaPlayer.State, so the controls can be built
+  # before QtMultimedia is loaded
+  StoppedState = 0
+  PlayingState = 1
+  PausedState = 2
+
+# the slider uses the same logarithmic curve as QAudio.convertVolume,
+# without having to load QtMultimedia for it
+LOG100 = math.log(100)
+
+def logarithmicToLinear(volume: float) -> float:
+  volume = max(0.0, volume)
+  return 1.0 if volume > 0.99 else -math.log(1 - volume) / LOG100
+
+def linearToLogarithmic(volume: float) -> float:
+  volume = max(0.0, volume)
+  return 1 - math.exp(-volume * LOG100)
 
 class PlayerControls(QtWidgets.QWidget):
   play = QtCore.pyqtSignal()
@@ -11,15 +32,21 @@ class PlayerControls(QtWidgets.QWidget):
   changeVolume = QtCore.pyqtSignal(int)
   changeMuting = QtCore.pyqtSignal(bool)
   changeRate = QtCore.pyqtSignal(float)
+  stepBackward = QtCore.pyqtSignal()
+  stepForward = QtCore.pyqtSignal()
+  markLoop = QtCore.pyqtSignal()
 
   def __init__(self, parent: QtWidgets.QWidget) -> None:
     super().__init__(parent=parent)
-    self.player_state = QtMultimedia.QMediaPlayer.StoppedState
+    self.player_state = PlayerState.StoppedState
     self.player_muted = False
     self.play_button = None
     self.stop_button = None
     self.next_button = None
     self.previous_button = None
+    self.step_backward_button = None
+    self.step_forward_button = None
+    self.loop_button = None
     self.mute_button = None
     self.volume_slider = None
     self.rate_box = None
@@ -48,6 +75,28 @@ class PlayerControls(QtWidgets.QWidget):
 
     self.previous_button.clicked.connect(self.previous)
 
+    self.step_backward_button = QtWidgets.QToolButton(self)
+    self.step_backward_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaSeekBackward))
+    self.step_backward_button.setToolTip("Previous frame (,)")
+    self.step_backward_button.setShortcut(QtGui.QKeySequence(","))
+    self.step_backward_button.setAutoRepeat(True)
+
+    self.step_backward_button.clicked.connect(self.stepBackward)
+
+    self.step_forward_button = QtWidgets.QToolButton(self)
+    self.step_forward_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaSeekForward))
+    self.step_forward_button.setToolTip("Next frame (.)")
+    self.step_forward_button.setShortcut(QtGui.QKeySequence("."))
+    self.step_forward_button.setAutoRepeat(True)
+
+    self.step_forward_button.clicked.connect(self.stepForward)
+
+    self.loop_button = QtWidgets.QToolButton(self)
+    self.loop_button.setShortcut(QtGui.QKeySequence("L"))
+    self.setLoop(-1, -1)
+
+    self.loop_button.clicked.connect(self.markLoop)
+
     self.mute_button = QtWidgets.QToolButton(self)
     self.mute_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaVolume))
 
@@ -55,6 +104,8 @@ class PlayerControls(QtWidgets.QWidget):
 
     self.volume_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
     self.volume_slider.setRange(0, 100)
+    # QMediaPlayer starts at full volume
+    self.volume_slider.setValue(100)
 
     self.volume_slider.valueChanged.connect(self.onVolumeSliderValueChanged)
 
@@ -72,6 +123,9 @@ class PlayerControls(QtWidgets.QWidget):
     self.box_layout.addWidget(self.previous_button)
     self.box_layout.addWidget(self.play_button)
     self.box_layout.addWidget(self.next_button)
+    self.box_layout.addWidget(self.step_backward_button)
+    self.box_layout.addWidget(self.step_forward_button)
+    self.box_layout.addWidget(self.loop_button)
     self.box_layout.addWidget(self.mute_button)
     self.box_layout.addWidget(self.volume_slider)
     self.box_layout.addWidget(self.rate_box)
@@ -80,35 +134,28 @@ class PlayerControls(QtWidgets.QWidget):
   def state(self):
     return self.player_state
 
-  @QtCore.pyqtSlot(QtMultimedia.QMediaPlayer.State)
-  def setState(self, state: QtMultimedia.QMediaPlayer.State):
+  def setState(self, state: int):
     if state != self.player_state:
       self.player_state = state
 
-      if (state == QtMultimedia.QMediaPlayer.StoppedState):
+      if (state == PlayerState.StoppedState):
         self.stop_button.setEnabled(False)
         self.play_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaPlay))
-      elif (state == QtMultimedia.QMediaPlayer.PlayingState):
+      elif (state == PlayerState.PlayingState):
         self.stop_button.setEnabled(True)
         self.play_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaPause))
-      elif (state == QtMultimedia.QMediaPlayer.PausedState):
+      elif (state == PlayerState.PausedState):
         self.stop_button.setEnabled(True)
         self.play_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaPlay))
 
   def volume(self):
-    linear_volume = QtMultimedia.QAudio.convertVolume(self.volume_slider.value() / 100,
-                                                      QtMultimedia.QAudio.LogarithmicVolumeScale,
-                                                      QtMultimedia.QAudio.LinearVolumeScale)
+    linear_volume = logarithmicToLinear(self.volume_slider.value() / 100)
 
     return round(linear_volume * 100)
 
   @QtCore.pyqtSlot(int)
   def setVolume(self, volume: int):
-    logarithmic_volume = QtMultimedia.QAudio.convertVolume(
-      volume / 100,
-      QtMultimedia.QAudio.LinearVolumeScale,
-      QtMultimedia.QAudio.LogarithmicVolumeScale
-    )
+    logarithmic_volume = linearToLogarithmic(volume / 100)
     self.volume_slider.setValue(round(logarithmic_volume * 100))
 
   def isMuted(self):
@@ -124,10 +171,10 @@ class PlayerControls(QtWidgets.QWidget):
         self.mute_button.setIcon(self.style().standardIcon(QtWidgets.QStyle.SP_MediaVolume))
 
   def playClicked(self):
-    if self.player_state == QtMultimedia.QMediaPlayer.StoppedState or \
-       self.player_state == QtMultimedia.QMediaPlayer.PausedState:
+    if self.player_state == PlayerState.StoppedState or \
+       self.player_state == PlayerState.PausedState:
       self.play.emit()
-    elif self.player_state == QtMultimedia.QMediaPlayer.PlayingState:
+    elif self.player_state == PlayerState.PlayingState:
       self.pause.emit()
 
   def muteClicked(self):
@@ -135,18 +182,30 @@ class PlayerControls(QtWidgets.QWidget):
     self.changeMuting.emit(self.player_muted)
 
   def playbackRate(self):
-    return self.rate_box.itemData(self.rate_box.currentIndex()).toDouble()
+    return float(self.rate_box.itemData(self.rate_box.currentIndex()))
 
   @QtCore.pyqtSlot(float)
   def setPlaybackRate(self, rate: float):
     for i in range(self.rate_box.count()):
-      if QtCore.qFuzzyCompare(rate, float(self.rate_box.itemData(i).toDouble())):
+      if QtCore.qFuzzyCompare(rate, float(self.rate_box.itemData(i))):
         self.rate_box.setCurrentIndex(i)
         return
     
     self.rate_box.addItem("{:.1f}x".format(rate), rate)
     self.rate_box.setCurrentIndex(self.rate_box.count() - 1)
 
+  @QtCore.pyqtSlot(int, int)
+  def setLoop(self, begin: int, end: int):
+    if begin < 0:
+      self.loop_button.setText("A-B")
+      self.loop_button.setToolTip("Set loop start (L)")
+    elif end < 0:
+      self.loop_button.setText("A-")
+      self.loop_button.setToolTip("Set loop end (L)")
+    else:
+      self.loop_button.setText("A-B \u21BA")
+      self.loop_button.setToolTip("Looping {:.2f}s - {:.2f}s, L clears".format(begin / 1000, end / 1000))
+
   def updateRate(self):
     self.changeRate.emit(self.playbackRate())
   
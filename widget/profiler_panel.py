@@ -0,0 +1,79 @@
+from widget.slot_profiler import SlotProfiler
+from PyQt5 import QtCore, QtWidgets
+import typing
+
+class ProfilerPanel(QtWidgets.QWidget):
+  # live view of a SlotProfiler, slowest slots by total time first
+  COLUMNS = ("Slot", "Calls", "Total ms", "Mean us", "Max ms")
+
+  def __init__(self, profiler: SlotProfiler, parent: typing.Optional[QtWidgets.QWidget] = None) -> None:
+    super().__init__(parent=parent, flags=QtCore.Qt.Window)
+    self.profiler = profiler
+    self.setWindowTitle("Profiler")
+
+    self.lag_label = QtWidgets.QLabel(self)
+
+    self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS), self)
+    self.table.setHorizontalHeaderLabels(self.COLUMNS)
+    self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+    self.table.verticalHeader().setVisible(False)
+    self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+
+    self.reset_button = QtWidgets.QPushButton("Reset", self)
+    self.reset_button.clicked.connect(self.reset)
+    self.dump_button = QtWidgets.QPushButton("Dump JSON", self)
+    self.dump_button.clicked.connect(self.dump)
+
+    self.button_layout = QtWidgets.QHBoxLayout()
+    self.button_layout.addWidget(self.lag_label, 1)
+    self.button_layout.addWidget(self.reset_button)
+    self.button_layout.addWidget(self.dump_button)
+
+    self.main_layout = QtWidgets.QVBoxLayout()
+    self.main_layout.addLayout(self.button_layout)
+    self.main_layout.addWidget(self.table)
+    self.setLayout(self.main_layout)
+    self.resize(560, 420)
+
+    # only refreshes while shown, a hidden panel costs nothing
+    self.refresh_timer = QtCore.QTimer(self)
+    self.refresh_timer.setInterval(500)
+    self.refresh_timer.timeout.connect(self.refresh)
+
+  def showEvent(self, event):
+    super().showEvent(event)
+    self.refresh()
+    self.refresh_timer.start()
+
+  def hideEvent(self, event):
+    self.refresh_timer.stop()
+    super().hideEvent(event)
+
+  def refresh(self):
+    snapshot = self.profiler.snapshot()
+    lag = snapshot["event_loop_lag"]
+    self.lag_label.setText("Event loop lag: p50 {:.1f} ms, p95 {:.1f} ms, max {:.1f} ms".format(
+      lag["p50_ms"], lag["p95_ms"], lag["max_ms"]))
+
+    slots = sorted(snapshot["slots"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    self.table.setRowCount(len(slots))
+    for row, (name, stats) in enumerate(slots):
+      values = (name, str(stats["calls"]), "{:.1f}".format(stats["total_ms"]),
+                "{:.1f}".format(stats["mean_us"]), "{:.2f}".format(stats["max_ms"]))
+      for column, value in enumerate(values):
+        item = self.table.item(row, column)
+        if item is None:
+          item = QtWidgets.QTableWidgetItem()
+          if column != 0:
+            item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+          self.table.setItem(row, column, item)
+        item.setText(value)
+
+  def reset(self):
+    self.profiler.reset()
+    self.refresh()
+
+  def dump(self):
+    path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Dump Profile", "profile.json", "JSON (*.json)")
+    if len(path) != 0:
+      self.profiler.dump(path)
@@ -0,0 +1,119 @@
+from PyQt5 import QtCore
+import typing
+import collections
+import inspect
+import json
+import time
+
+class SlotStats(object):
+  __slots__ = ("calls", "total", "max")
+
+  def __init__(self) -> None:
+    self.calls = 0
+    self.total = 0.0
+    self.max = 0.0
+
+class SlotProfiler(QtCore.QObject):
+  # counts calls and time spent (inclusive, in seconds) per slot, and
+  # measures event loop lag with a heartbeat timer: a timer that fires
+  # late by x ms means the gui thread was busy for x ms.
+  # Slots are wrapped when they get connected. Disabled, slot() hands
+  # back the function itself, so nothing is measured or paid for
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None, enabled: bool = False,
+               heartbeat_ms: int = 20, lag_samples: int = 3000) -> None:
+    super().__init__(parent=parent)
+    self.enabled = enabled
+    self.stats = collections.defaultdict(SlotStats)
+    self.wrappers = {}
+    self.heartbeat_ms = heartbeat_ms
+    self.lags = collections.deque(maxlen=lag_samples)
+    self.last_beat = None
+    self.heartbeat = QtCore.QTimer(self)
+    self.heartbeat.setTimerType(QtCore.Qt.PreciseTimer)
+    self.heartbeat.setInterval(heartbeat_ms)
+    self.heartbeat.timeout.connect(self.beat)
+    if enabled:
+      self.heartbeat.start()
+
+  def slot(self, func: typing.Callable, name: typing.Optional[str] = None) -> typing.Callable:
+    if not self.enabled:
+      return func
+    # the same wrapper has to come back for a later disconnect
+    wrapper = self.wrappers.get(func, None)
+    if wrapper is None:
+      wrapper = self.wrap(func, name or getattr(func, "__qualname__", repr(func)))
+      self.wrappers[func] = wrapper
+    return wrapper
+
+  def wrap(self, func: typing.Callable, name: str) -> typing.Callable:
+    stats = self.stats[name]
+    # PyQt passes a slot only as many signal arguments as it takes, the
+    # wrapper accepts anything so it has to trim them itself
+    try:
+      parameters = inspect.signature(func).parameters.values()
+      if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        arg_count = None
+      else:
+        arg_count = sum(1 for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+    except (TypeError, ValueError):
+      arg_count = None
+    perf_counter = time.perf_counter
+
+    def wrapper(*args):
+      begin = perf_counter()
+      try:
+        return func(*args[:arg_count])
+      finally:
+        elapsed = perf_counter() - begin
+        stats.calls += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+          stats.max = elapsed
+    return wrapper
+
+  def beat(self):
+    now = time.perf_counter()
+    if self.last_beat is not None:
+      self.lags.append(max(0.0, now - self.last_beat - self.heartbeat_ms / 1000))
+    self.last_beat = now
+
+  def reset(self):
+    for stats in self.stats.values():
+      stats.calls = 0
+      stats.total = 0.0
+      stats.max = 0.0
+    self.lags.clear()
+    self.last_beat = None
+
+  def lagSummary(self) -> typing.Dict[str, float]:
+    lags = sorted(self.lags)
+    if len(lags) == 0:
+      return {"samples": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    def percentile(p: float) -> float:
+      return lags[min(len(lags) - 1, int(p * len(lags)))] * 1000
+    return {
+      "samples": len(lags),
+      "mean_ms": sum(lags) / len(lags) * 1000,
+      "p50_ms": percentile(0.50),
+      "p95_ms": percentile(0.95),
+      "p99_ms": percentile(0.99),
+      "max_ms": lags[-1] * 1000,
+    }
+
+  def snapshot(self) -> typing.Dict[str, typing.Any]:
+    slots = {}
+    for name, stats in self.stats.items():
+      if stats.calls == 0:
+        continue
+      slots[name] = {
+        "calls": stats.calls,
+        "total_ms": stats.total * 1000,
+        "mean_us": stats.total / stats.calls * 1e6,
+        "max_ms": stats.max * 1000,
+      }
+    return {"enabled": self.enabled, "heartbeat_ms": self.heartbeat_ms,
+            "event_loop_lag": self.lagSummary(), "slots": slots}
+
+  def dump(self, path: str):
+    with open(path, "w") as f:
+      json.dump(self.snapshot(), f, indent=2, sort_keys=True)
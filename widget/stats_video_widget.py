@@ -0,0 +1,143 @@
+
+from PyQt5 import QtCore, QtGui, QtWidgets, QtMultimedia
+from engine.frame_stats import FrameStatsSurface
+import typing
+
+class StatsVideoWidget(QtWidgets.QWidget):
+  # draws the frames of a FrameStatsSurface in software, with the frame
+  # statistics on top. Stands in for VideoWidget, so it has the same
+  # full screen handling
+  fullScreenChanged = QtCore.pyqtSignal(bool)
+
+  def __init__(self, parent: typing.Optional[QtWidgets.QWidget], overlay: bool = True) -> None:
+    super().__init__(parent=parent)
+    self.setSizePolicy(QtWidgets.QSizePolicy(
+      QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Ignored))
+    self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+    self.setFocusPolicy(QtCore.Qt.StrongFocus)
+
+    self.surface = FrameStatsSurface(self)
+    self.surface.frameReady.connect(self.update)
+    self.overlay = overlay
+    # a frame from elsewhere (a FrameRing) shown instead of the surface's
+    self.held_image = None
+    # its numbers go in the overlay when set
+    self.frame_ring = None
+
+    self.overlay_action = QtWidgets.QAction("Show Frame Statistics", self)
+    self.overlay_action.setCheckable(True)
+    self.overlay_action.setChecked(overlay)
+    self.overlay_action.setShortcut(QtGui.QKeySequence("Ctrl+Shift+F"))
+    self.overlay_action.setShortcutContext(QtCore.Qt.WindowShortcut)
+    self.overlay_action.toggled.connect(self.setOverlay)
+    self.addAction(self.overlay_action)
+    self.reset_action = QtWidgets.QAction("Reset Frame Statistics", self)
+    self.reset_action.triggered.connect(self.surface.reset)
+    self.addAction(self.reset_action)
+    self.export_action = QtWidgets.QAction("Export Frame Timings...", self)
+    self.export_action.triggered.connect(self.exportLog)
+    self.addAction(self.export_action)
+    self.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
+
+    # the overlay text changes every frame, it is redrawn at most this often
+    self.overlay_timer = QtCore.QTimer(self)
+    self.overlay_timer.setInterval(250)
+    self.overlay_timer.timeout.connect(self.updateOverlayText)
+    self.overlay_text = ""
+    if overlay:
+      self.overlay_timer.start()
+
+  def setOverlay(self, overlay: bool):
+    self.overlay = overlay
+    if overlay:
+      self.updateOverlayText()
+      self.overlay_timer.start()
+    else:
+      self.overlay_timer.stop()
+    self.update()
+
+  def updateOverlayText(self):
+    # also repaints while paused, when no frames come in
+    summary = self.surface.summary()
+    self.overlay_text = "{:.1f} fps  presented {}  late {}  dropped {}  stalls {}\n" \
+                        "jitter p50 {:.1f} ms  p95 {:.1f} ms  max {:.1f} ms".format(
+      summary["fps"], summary["presented"], summary["late"], summary["dropped"], summary["stalls"],
+      summary["jitter_p50_ms"], summary["jitter_p95_ms"], summary["jitter_max_ms"])
+    if self.frame_ring is not None and self.frame_ring.isEnabled():
+      stats = self.frame_ring.stats()
+      self.overlay_text += "\nframe cache {} frames  {:.0f}/{:.0f} MiB  hits {}  misses {}".format(
+        stats["frames"], stats["used_bytes"] / 2 ** 20, stats["max_bytes"] / 2 ** 20, stats["hits"], stats["misses"])
+    self.update()
+
+  def showImage(self, image: typing.Optional[QtGui.QImage]):
+    # None goes back to the surface's frames
+    self.held_image = image
+    self.update()
+
+  def exportLog(self):
+    path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Frame Timings", "frames.json", "JSON (*.json)")
+    if len(path) != 0:
+      self.surface.dump(path)
+
+  def setFullScreen(self, full_screen: bool):
+    if full_screen == self.isFullScreen():
+      return
+    if full_screen:
+      self.setWindowFlags(self.windowFlags() | QtCore.Qt.Window)
+      self.showFullScreen()
+    else:
+      self.setWindowFlags(self.windowFlags() & ~QtCore.Qt.Window)
+      self.showNormal()
+    self.fullScreenChanged.emit(full_screen)
+
+  def frameRect(self, size: QtCore.QSize) -> QtCore.QRect:
+    # the frame scaled to fit, centered, like QVideoWidget's KeepAspectRatio
+    scaled = size.scaled(self.size(), QtCore.Qt.KeepAspectRatio)
+    rect = QtCore.QRect(QtCore.QPoint(0, 0), scaled)
+    rect.moveCenter(self.rect().center())
+    return rect
+
+  def paintEvent(self, event: QtGui.QPaintEvent):
+    painter = QtGui.QPainter(self)
+    frame = self.surface.current_frame
+    if self.held_image is not None:
+      painter.fillRect(self.rect(), QtCore.Qt.black)
+      painter.drawImage(self.frameRect(self.held_image.size()), self.held_image)
+    elif frame is not None and frame.map(QtMultimedia.QAbstractVideoBuffer.ReadOnly):
+      try:
+        # the image wraps the mapped frame, drawn before it is unmapped
+        image = QtGui.QImage(frame.bits(), frame.width(), frame.height(), frame.bytesPerLine(),
+                             QtMultimedia.QVideoFrame.imageFormatFromPixelFormat(frame.pixelFormat()))
+        target = self.frameRect(image.size())
+        painter.fillRect(self.rect(), QtCore.Qt.black)
+        painter.drawImage(target, image)
+      finally:
+        frame.unmap()
+    else:
+      painter.fillRect(self.rect(), QtCore.Qt.black)
+
+    if self.overlay:
+      font = painter.font()
+      font.setStyleHint(QtGui.QFont.Monospace)
+      font.setFamily("monospace")
+      painter.setFont(font)
+      text_rect = painter.boundingRect(self.rect().adjusted(8, 8, -8, -8),
+                                       QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop, self.overlay_text)
+      painter.fillRect(text_rect.adjusted(-4, -4, 4, 4), QtGui.QColor(0, 0, 0, 160))
+      painter.setPen(QtCore.Qt.white)
+      painter.drawText(text_rect, QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop, self.overlay_text)
+
+  def keyPressEvent(self, event: QtGui.QKeyEvent):
+    if event.key() == QtCore.Qt.Key_Escape and self.isFullScreen():
+      self.setFullScreen(False)
+      event.accept()
+    elif event.key() == QtCore.Qt.Key_Enter and \
+         (event.modifiers() & QtCore.Qt.AltModifier):
+      self.setFullScreen(not self.isFullScreen())
+      event.accept()
+    else:
+      super().keyPressEvent(event)
+
+  def mouseDoubleClickEvent(self, event: QtGui.QMouseEvent) -> None:
+    self.setFullScreen(not self.isFullScreen())
+    event.accept()
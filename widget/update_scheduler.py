@@ -0,0 +1,35 @@
+from PyQt5 import QtCore
+import typing
+
+class UpdateScheduler(QtCore.QObject):
+  # collects ui updates keyed by what they touch and applies only the
+  # latest one per key, at most fps times a second. fps <= 0 applies
+  # every update right away, which is the old behaviour
+  def __init__(self, parent: typing.Optional[QtCore.QObject] = None, fps: int = 30) -> None:
+    super().__init__(parent=parent)
+    self.fps = fps
+    self.pending = {}
+    self.timer = QtCore.QTimer(self)
+    self.timer.setSingleShot(True)
+    self.timer.setTimerType(QtCore.Qt.CoarseTimer)
+    self.timer.timeout.connect(self.flush)
+    if fps > 0:
+      self.timer.setInterval(1000 // fps)
+
+  def schedule(self, key: str, func: typing.Callable, *args):
+    if self.fps <= 0:
+      func(*args)
+      return
+    # the timer runs exactly while something is pending, no need to ask it
+    if len(self.pending) == 0:
+      self.timer.start()
+    self.pending[key] = (func, args)
+
+  def cancel(self, key: str):
+    self.pending.pop(key, None)
+
+  def flush(self):
+    pending = self.pending
+    self.pending = {}
+    for func, args in pending.values():
+      func(*args)
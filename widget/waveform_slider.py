@@ -0,0 +1,57 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+import typing
+
+class WaveformSlider(QtWidgets.QSlider):
+  # a slider with the track's waveform envelope drawn behind the groove.
+  # The envelope is drawn once per size into a pixmap, repaints while
+  # playing only blit it
+  def __init__(self, orientation: QtCore.Qt.Orientation, parent: typing.Optional[QtWidgets.QWidget] = None) -> None:
+    super().__init__(orientation, parent)
+    self.envelope = b""
+    self.envelope_pixmap = None
+
+  def setEnvelope(self, envelope: typing.Optional[bytes]):
+    envelope = envelope if envelope is not None else b""
+    if envelope == self.envelope:
+      return
+    self.envelope = envelope
+    self.envelope_pixmap = None
+    self.update()
+
+  def grooveRect(self) -> QtCore.QRect:
+    option = QtWidgets.QStyleOptionSlider()
+    self.initStyleOption(option)
+    groove = self.style().subControlRect(QtWidgets.QStyle.CC_Slider, option, QtWidgets.QStyle.SC_SliderGroove, self)
+    # the envelope spans the height of the widget, not of the thin groove
+    return QtCore.QRect(groove.left(), 0, groove.width(), self.height())
+
+  def renderEnvelope(self, size: QtCore.QSize) -> QtGui.QPixmap:
+    pixmap = QtGui.QPixmap(size)
+    pixmap.fill(QtCore.Qt.transparent)
+    count = len(self.envelope)
+    width = size.width()
+    height = size.height()
+    painter = QtGui.QPainter(pixmap)
+    color = self.palette().color(QtGui.QPalette.Highlight)
+    color.setAlpha(90)
+    painter.setPen(color)
+    middle = height / 2
+    # one vertical line per pixel column, the loudest bucket under it wins
+    for x in range(width):
+      first = x * count // width
+      last = max(first + 1, (x + 1) * count // width)
+      half = max(self.envelope[first:last]) / 255 * middle
+      painter.drawLine(QtCore.QLineF(x + 0.5, middle - half, x + 0.5, middle + half))
+    painter.end()
+    return pixmap
+
+  def paintEvent(self, event: QtGui.QPaintEvent):
+    if len(self.envelope) != 0 and self.orientation() == QtCore.Qt.Horizontal:
+      rect = self.grooveRect()
+      if rect.width() > 0 and rect.height() > 0:
+        if self.envelope_pixmap is None or self.envelope_pixmap.size() != rect.size():
+          self.envelope_pixmap = self.renderEnvelope(rect.size())
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(rect.topLeft(), self.envelope_pixmap)
+        painter.end()
+    super().paintEvent(event)